@@ -1,6 +1,7 @@
 from src.environment import MusicEnvironment
 from src.agent import QLearningAgent
 from src.train import train_agent, generate_melody
+from src.cache import MelodyCache
 from src.utils import (
     save_melody_as_midi, 
     format_melody_for_display, 
@@ -8,10 +9,17 @@ from src.utils import (
     print_melody_analysis,
     visualize_rhythm_pattern
 )
-import matplotlib.pyplot as plt
+import argparse
+import os
+from typing import Optional
+
+CHECKPOINT_PATH = 'outputs/checkpoints/agent'
 
 
 def plot_rewards(rewards):
+    # Deferred so runs that reuse a checkpoint skip the matplotlib import
+    import matplotlib.pyplot as plt
+    
     plt.figure(figsize=(10, 5))
     plt.plot(rewards)
     plt.title('Training Rewards over Episodes')
@@ -21,38 +29,51 @@ def plot_rewards(rewards):
     plt.close()
 
 
-def main():
+def main(seed: Optional[int] = None):
     env = MusicEnvironment()
-    agent = QLearningAgent(n_actions=env.n_actions)
     
-    # Train agent
-    rewards = train_agent(env, agent, n_episodes=100)
-    plot_rewards(rewards)
+    # Reuse a trained agent if one was checkpointed, otherwise train one
+    if os.path.exists(CHECKPOINT_PATH):
+        agent = QLearningAgent.load(CHECKPOINT_PATH)
+        print(f"Loaded agent from {CHECKPOINT_PATH}")
+    else:
+        agent = QLearningAgent(n_actions=env.n_actions, n_states=env.n_states)
+        rewards = train_agent(env, agent, n_episodes=100)
+        plot_rewards(rewards)
+        agent.save(CHECKPOINT_PATH)
+        print(f"Saved agent to {CHECKPOINT_PATH}")
+    
+    # A seeded melody depends only on the agent and seed, so it and its MIDI
+    # and analysis come from the cache after the first run
+    cache = MelodyCache(env, agent) if seed is not None else None
     
     # Generate melody
-    melody = generate_melody(env, agent)
+    melody = cache.melody(seed) if cache else generate_melody(env, agent)
     print(format_melody_for_display(melody))
     
+    beats_per_phrase = env.measures_per_phrase * env.beats_per_measure
+    
     # Rhythm pattern for phrase
     for i in range(env.num_phrases):
-        start_idx = i * (env.measures_per_phrase * env.beats_per_measure)
-        end_idx = start_idx + (env.measures_per_phrase * env.beats_per_measure)
-        phrase_melody = melody[start_idx:end_idx]
+        phrase_melody = melody.phrase(i, beats_per_phrase)
         print(f"\nPhrase {i+1}:")
         print(visualize_rhythm_pattern(phrase_melody))
     
     midi_filename = "outputs/melodies/melody.mid"
-    save_melody_as_midi(melody, midi_filename, tempo=100)
+    os.makedirs(os.path.dirname(midi_filename), exist_ok=True)
+    if cache:
+        with open(midi_filename, 'wb') as f:
+            f.write(cache.midi(seed, tempo=100, midi_seed=seed))
+    else:
+        save_melody_as_midi(melody, midi_filename, tempo=100)
     print(f"\nSaved as {midi_filename}")
     
-    analysis = analyze_melody(melody)
+    analysis = cache.analysis(seed) if cache else analyze_melody(melody)
     print_melody_analysis(analysis)
     
     # Phrase analysis
     for i in range(env.num_phrases):
-        start_idx = i * (env.measures_per_phrase * env.beats_per_measure)
-        end_idx = start_idx + (env.measures_per_phrase * env.beats_per_measure)
-        phrase_melody = melody[start_idx:end_idx]
+        phrase_melody = melody.phrase(i, beats_per_phrase)
         phrase_analysis = analyze_melody(phrase_melody)
         print(f"\nPhrase {i+1}:")
         print(f"- Total beats: {phrase_analysis['total_beats']}")
@@ -60,4 +81,7 @@ def main():
         print(f"- Average interval: {phrase_analysis['avg_interval']:.2f} semitones")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=None,
+                        help='fixed melody seed; cached under outputs/cache')
+    main(parser.parse_args().seed)
\ No newline at end of file
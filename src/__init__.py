@@ -1,17 +1,30 @@
-from .environment import MusicEnvironment, Note, Duration
-from .agent import QLearningAgent
-from .train import train_agent, generate_melody
-from .utils import save_melody_as_midi
+# Exports resolve on first access (PEP 562), so `import src` stays cheap and
+# submodules load only when used
+_EXPORTS = {
+    'MusicEnvironment': '.environment',
+    'Note': '.environment',
+    'Duration': '.environment',
+    'Melody': '.melody',
+    'VecMusicEnvironment': '.vec_environment',
+    'QLearningAgent': '.agent',
+    'train_agent': '.train',
+    'generate_melody': '.train',
+    'save_melody_as_midi': '.utils'
+}
 
-__all__ = [
-    'MusicEnvironment',
-    'QLearningAgent',
-    'train_agent',
-    'generate_melody',
-    'save_melody_as_midi',
-    'Note',
-    'Duration'
-]
+__all__ = ['MusicEnvironment', 'VecMusicEnvironment', 'QLearningAgent', 'train_agent', 
+           'generate_melody', 'save_melody_as_midi', 'Note', 'Duration', 'Melody']
 
-__all__ = ['MusicEnvironment', 'QLearningAgent', 'train_agent', 
-           'generate_melody', 'save_melody_as_midi']
\ No newline at end of file
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
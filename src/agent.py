@@ -1,63 +1,129 @@
+import json
+import os
 import numpy as np
-import random
-from typing import Dict, List, Tuple
+from typing import Dict, Optional, Union
+from .environment import Duration
+from .patterns import PatternStore
+from .schedules import Schedule, Constant, RandomDecay, schedule_from_config
+from .qtable import SparseQTable
+
+State = Union[int, str]
 
 class QLearningAgent:
     def __init__(self, n_actions: int, learning_rate: float = 0.1, 
-                 gamma: float = 0.99, epsilon_start: float = 0.3):
-        self.q_table: Dict[str, np.ndarray] = {}
+                 gamma: float = 0.99, epsilon_start: float = 0.3,
+                 n_states: Optional[int] = None, pattern_capacity: Optional[int] = 10000,
+                 pattern_eviction: str = 'reward', pattern_weighted: bool = False,
+                 epsilon_schedule: Optional[Schedule] = None,
+                 lr_schedule: Optional[Schedule] = None,
+                 q_dtype=np.float64, max_q_table_bytes: Optional[int] = None):
+        # Table indexed by MusicEnvironment.encode_state(); defaults to the
+        # 3-action window encoding without beat position. Dense unless
+        # max_q_table_bytes bounds it, in which case only visited states are
+        # stored and rarely used ones are evicted.
+        if n_states is None:
+            n_states = (n_actions + 1) ** 3
+        if max_q_table_bytes is None:
+            self.q_table = np.zeros((n_states, n_actions), dtype=q_dtype)
+        else:
+            self.q_table = SparseQTable(n_states, n_actions, max_q_table_bytes, dtype=q_dtype)
+        self.n_states = n_states
+        
+        # Compatibility shim for string states (str(env.state))
+        self.legacy_q_table: Dict[str, np.ndarray] = {}
+        
         self.n_actions = n_actions
         self.lr = learning_rate
         self.gamma = gamma
         self.epsilon = epsilon_start
         
-        self.good_patterns: List[List[Tuple[int, Duration]]] = []
+        # Applied once per finished episode; episodes_trained survives save/load
+        # so resumed runs continue the same schedules
+        self.epsilon_schedule = epsilon_schedule or RandomDecay()
+        self.lr_schedule = lr_schedule or Constant()
+        self.episodes_trained = 0
+        
+        # Exploration RNG: the global np.random state unless a Generator is set
+        self.rng = np.random
+        
+        # Patterns are replayed uniformly unless pattern_weighted favours the
+        # ones with the most accumulated reward
+        self.good_patterns = PatternStore(capacity=pattern_capacity, eviction=pattern_eviction,
+                                          weighted=pattern_weighted)
         self.min_pattern_reward = 5
         
         self.current_measure_actions = []
         self.measure_rewards = []
     
 
-    def get_action(self, state: str, env_info: Dict) -> int:
-        if state not in self.q_table:
-            self.q_table[state] = np.zeros(self.n_actions)
+    def q_values(self, state: State) -> np.ndarray:
+        if isinstance(state, str):
+            if state not in self.legacy_q_table:
+                self.legacy_q_table[state] = np.zeros(self.n_actions)
+            return self.legacy_q_table[state]
+        
+        return self.q_table[state]
+    
+
+    def _q_row(self, state: State) -> np.ndarray:
+        # Writable row, allocated on first write for a sparse table
+        if isinstance(self.q_table, SparseQTable) and not isinstance(state, str):
+            return self.q_table.row(state)
+        return self.q_values(state)
+    
+
+    def q_table_size(self) -> int:
+        # States with at least one learned Q-value (stored states when sparse)
+        if isinstance(self.q_table, SparseQTable):
+            return len(self.q_table) + len(self.legacy_q_table)
+        return int(np.count_nonzero(self.q_table.any(axis=1))) + len(self.legacy_q_table)
+    
+
+    def get_action(self, state: State, env_info: Dict) -> int:
+        q_row = self.q_values(state)
         
         current_beat = env_info['current_beat']
-        beat_in_measure = current_beat % 4
+        beat_in_measure = current_beat % env_info.get('beats_per_measure', 4)
+        
+        if beat_in_measure == 0 and self.good_patterns and self.rng.random() > self.epsilon:
+            return self.good_patterns.sample(self.rng)[0][0]
         
-        if beat_in_measure == 0 and self.good_patterns and np.random.random() > self.epsilon:
-            pattern = np.random.choice(len(self.good_patterns))
-            return self.good_patterns[pattern][0][0]
+        valid_mask = env_info.get('valid_actions')
+        if valid_mask is None:
+            valid_mask = np.array([
+                env_info['is_valid_duration'](action) for action in range(self.n_actions)
+            ])
         
         # Epsilon-greedy selection w/ rhythm constraints
-        if np.random.random() < self.epsilon:
-            valid_actions = [
-                action for action in range(self.n_actions)
-                if env_info['is_valid_duration'](action)
-            ]
+        if self.rng.random() < self.epsilon:
+            valid_actions = np.flatnonzero(valid_mask)
 
-            return np.random.choice(valid_actions) if valid_actions else 0
+            return self.rng.choice(valid_actions) if len(valid_actions) else 0
         
         else:
-            q_values = self.q_table[state].copy()
-
-            for action in range(self.n_actions):
-                if not env_info['is_valid_duration'](action):
-                    q_values[action] = -np.inf
+            return np.argmax(np.where(valid_mask, q_row, -np.inf))
+    
 
-            return np.argmax(q_values)
+    def get_actions(self, states: np.ndarray, valid_masks: np.ndarray) -> np.ndarray:
+        # Batched epsilon-greedy over a (n_envs, n_actions) validity mask; the
+        # good-pattern replay of get_action is per-episode and not used here
+        explore = self.rng.random(len(states)) < self.epsilon
+        random_keys = np.where(valid_masks, self.rng.random(valid_masks.shape), -1.0)
+        q_values = np.where(valid_masks, self.q_table[states], -np.inf)
+        
+        return np.where(explore, random_keys.argmax(axis=1), q_values.argmax(axis=1))
     
 
-    def update(self, state: str, action: int, reward: float, 
-               next_state: str, done: bool, env_info: Dict):
+    def update(self, state: State, action: int, reward: float, 
+               next_state: State, done: bool, env_info: Dict):
 
-        if next_state not in self.q_table:
-            self.q_table[next_state] = np.zeros(self.n_actions)
+        q_row = self._q_row(state)
+        next_q_row = self.q_values(next_state)
         
-        current_q = self.q_table[state][action]
-        next_max_q = np.max(self.q_table[next_state]) if not done else 0
+        current_q = q_row[action]
+        next_max_q = np.max(next_q_row) if not done else 0
         new_q = current_q + self.lr * (reward + self.gamma * next_max_q - current_q)
-        self.q_table[state][action] = new_q
+        q_row[action] = new_q
         
         self.current_measure_actions.append((action, env_info['current_duration']))
         self.measure_rewards.append(reward)
@@ -66,12 +132,106 @@ class QLearningAgent:
             measure_reward = sum(self.measure_rewards)
 
             if measure_reward > self.min_pattern_reward:
-                if self.current_measure_actions not in self.good_patterns:
-                    self.good_patterns.append(self.current_measure_actions.copy())
+                self.good_patterns.add(self.current_measure_actions, measure_reward)
             
             self.current_measure_actions = []
             self.measure_rewards = []
     
     
+    def update_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                     next_states: np.ndarray, dones: np.ndarray):
+        # One backup per transition; duplicate (state, action) pairs within a
+        # tick resolve to the last write
+        next_max_q = np.where(dones, 0.0, self.q_table[next_states].max(axis=1))
+        current_q = self.q_table[states, actions]
+        self.q_table[states, actions] = current_q + self.lr * (
+            rewards + self.gamma * next_max_q - current_q)
+    
+    
     def decay_epsilon(self):
-        self.epsilon = max(0.01, self.epsilon * random.uniform(0.995, 0.999))
\ No newline at end of file
+        self.epsilon = self.epsilon_schedule(self.episodes_trained, self.epsilon)
+    
+    
+    def end_episode(self):
+        self.episodes_trained += 1
+        self.decay_epsilon()
+        self.lr = self.lr_schedule(self.episodes_trained, self.lr)
+    
+    
+    def save(self, path: str):
+        # Checkpoint directory: raw q_table.npy (memory-mappable) plus agent.json
+        # (a sparse table saves its stored states and rows instead)
+        os.makedirs(path, exist_ok=True)
+        sparse = isinstance(self.q_table, SparseQTable)
+        if sparse:
+            states, values = self.q_table.items()
+            np.save(os.path.join(path, 'q_states.npy'), states)
+            np.save(os.path.join(path, 'q_values.npy'), values)
+        else:
+            np.save(os.path.join(path, 'q_table.npy'), self.q_table)
+        
+        metadata = {
+            'n_actions': self.n_actions,
+            'n_states': self.n_states,
+            'q_dtype': np.dtype(self.q_table.dtype).name,
+            'max_q_table_bytes': self.q_table.max_bytes if sparse else None,
+            'learning_rate': self.lr,
+            'gamma': self.gamma,
+            'epsilon': self.epsilon,
+            'episodes_trained': self.episodes_trained,
+            'epsilon_schedule': self.epsilon_schedule.config(),
+            'lr_schedule': self.lr_schedule.config(),
+            'min_pattern_reward': self.min_pattern_reward,
+            'pattern_capacity': self.good_patterns.capacity,
+            'pattern_eviction': self.good_patterns.eviction,
+            'pattern_weighted': self.good_patterns.weighted,
+            'good_patterns': [
+                [[int(action), duration.name if duration is not None else None]
+                 for action, duration in pattern]
+                for pattern, _ in self.good_patterns.to_list()
+            ],
+            'pattern_rewards': self.good_patterns.rewards().tolist(),
+            'legacy_q_table': {state: q.tolist() for state, q in self.legacy_q_table.items()}
+        }
+        with open(os.path.join(path, 'agent.json'), 'w') as f:
+            json.dump(metadata, f)
+    
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'r') -> 'QLearningAgent':
+        # mmap_mode='r' shares read-only pages for generation, 'c' gives
+        # private copy-on-write pages, None loads a writable copy for training
+        with open(os.path.join(path, 'agent.json')) as f:
+            metadata = json.load(f)
+        
+        agent = cls(metadata['n_actions'], learning_rate=metadata['learning_rate'],
+                    gamma=metadata['gamma'], epsilon_start=metadata['epsilon'], n_states=0,
+                    q_dtype=np.dtype(metadata.get('q_dtype', 'float64')),
+                    pattern_capacity=metadata.get('pattern_capacity', 10000),
+                    pattern_eviction=metadata.get('pattern_eviction', 'reward'),
+                    pattern_weighted=metadata.get('pattern_weighted', False))
+        if 'epsilon_schedule' in metadata:
+            agent.epsilon_schedule = schedule_from_config(metadata['epsilon_schedule'])
+            agent.lr_schedule = schedule_from_config(metadata['lr_schedule'])
+        agent.episodes_trained = metadata.get('episodes_trained', 0)
+        if metadata.get('max_q_table_bytes') is not None:
+            agent.q_table = SparseQTable.from_items(
+                metadata['n_states'], metadata['n_actions'], metadata['max_q_table_bytes'],
+                np.load(os.path.join(path, 'q_states.npy')),
+                np.load(os.path.join(path, 'q_values.npy')), dtype=agent.q_table.dtype)
+        else:
+            agent.q_table = np.load(os.path.join(path, 'q_table.npy'), mmap_mode=mmap_mode)
+        agent.n_states = metadata['n_states']
+        agent.min_pattern_reward = metadata['min_pattern_reward']
+        # Checkpoints without pattern rewards weight every pattern equally
+        pattern_rewards = metadata.get('pattern_rewards', [1.0] * len(metadata['good_patterns']))
+        for pattern, reward in zip(metadata['good_patterns'], pattern_rewards):
+            agent.good_patterns.add(
+                [(action, Duration[duration] if duration is not None else None)
+                 for action, duration in pattern],
+                reward)
+        agent.legacy_q_table = {
+            state: np.array(q) for state, q in metadata['legacy_q_table'].items()
+        }
+        
+        return agent
\ No newline at end of file
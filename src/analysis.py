@@ -0,0 +1,138 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .environment import Note, midi_to_pitch
+from .melody import Melody, DURATIONS, DURATION_BEATS
+
+N_MIDI = 128
+
+
+def melodies_to_arrays(melodies: Sequence[Union[Melody, List[Note]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Right-padded (n_melodies, max_length) MIDI pitch and duration-code
+    # arrays plus lengths. START notes are dropped, as analyze_melody skips them.
+    rows = [Melody.from_notes(melody).without_start() for melody in melodies]
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    width = int(lengths.max()) if len(rows) else 0
+
+    pitches = np.zeros((len(rows), width), dtype=np.uint8)
+    durations = np.zeros((len(rows), width), dtype=np.uint8)
+    for i, row in enumerate(rows):
+        pitches[i, :len(row)] = row.pitches
+        durations[i, :len(row)] = row.durations
+
+    return pitches, durations, lengths
+
+
+def _histograms(values: np.ndarray, valid: np.ndarray, n_bins: int) -> np.ndarray:
+    rows = np.broadcast_to(np.arange(len(values))[:, None], values.shape)
+    return np.bincount((rows * n_bins + values.astype(np.int64))[valid],
+                       minlength=len(values) * n_bins).reshape(len(values), n_bins)
+
+
+def analyze_arrays(pitches: np.ndarray, durations: np.ndarray, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+    # Per-melody statistics as arrays over the padded batch
+    n, width = pitches.shape
+    valid = np.arange(width)[None, :] < lengths[:, None]
+
+    beats = np.where(valid, DURATION_BEATS[durations], 0.0)
+    intervals = np.abs(np.diff(pitches.astype(np.int64), axis=1))
+    interval_valid = valid[:, 1:]
+    interval_counts = interval_valid.sum(axis=1)
+    interval_sums = np.where(interval_valid, intervals, 0).sum(axis=1)
+
+    return {
+        'total_beats': beats.sum(axis=1),
+        'note_count': lengths,
+        'duration_counts': _histograms(durations, valid, len(DURATIONS)),
+        'pitch_counts': _histograms(pitches, valid, N_MIDI),
+        'intervals': intervals,
+        'interval_counts': interval_counts,
+        'avg_interval': np.divide(interval_sums, interval_counts,
+                                  out=np.zeros(n), where=interval_counts > 0),
+        'onsets': np.cumsum(beats, axis=1) - beats
+    }
+
+
+def analyze_melodies(melodies: Sequence[Union[Melody, List[Note]]]) -> List[Dict]:
+    # Same dict as analyze_melody for each melody
+    return arrays_to_analyses(*melodies_to_arrays(melodies))
+
+
+def arrays_to_analyses(pitches: np.ndarray, durations: np.ndarray, lengths: np.ndarray) -> List[Dict]:
+    stats = analyze_arrays(pitches, durations, lengths)
+    analyses = []
+
+    for i in range(len(lengths)):
+        length = int(lengths[i])
+        present = np.flatnonzero(stats['pitch_counts'][i])
+        analyses.append({
+            'total_beats': float(stats['total_beats'][i]) if length else 0,
+            'note_count': length,
+            'duration_distribution': {
+                duration: int(count) for duration, count in zip(DURATIONS, stats['duration_counts'][i])
+            },
+            'pitch_distribution': {
+                midi_to_pitch(int(midi)): int(stats['pitch_counts'][i, midi]) for midi in present
+            },
+            'avg_interval': float(stats['avg_interval'][i]) if length > 1 else 0,
+            'intervals': stats['intervals'][i, :max(length - 1, 0)].tolist()
+        })
+
+    return analyses
+
+
+def phrase_breakdown(pitches: np.ndarray, durations: np.ndarray, lengths: np.ndarray,
+                     beats_per_phrase: float = 16, n_phrases: Optional[int] = None) -> Dict[str, np.ndarray]:
+    # (n_melodies, n_phrases) totals, grouping notes by the phrase their onset
+    # falls in; intervals count only between notes of the same phrase
+    stats = analyze_arrays(pitches, durations, lengths)
+    n, width = pitches.shape
+    valid = np.arange(width)[None, :] < lengths[:, None]
+
+    phrase = (stats['onsets'] // beats_per_phrase).astype(np.int64)
+    if n_phrases is None:
+        n_phrases = int(phrase[valid].max()) + 1 if valid.any() else 0
+    phrase = np.minimum(phrase, n_phrases - 1) if n_phrases else phrase
+    rows = np.broadcast_to(np.arange(n)[:, None], phrase.shape)
+    flat = (rows * n_phrases + phrase)[valid]
+
+    size = n * n_phrases
+    beats = DURATION_BEATS[durations][valid]
+    total_beats = np.bincount(flat, weights=beats, minlength=size)
+    note_count = np.bincount(flat, minlength=size)
+
+    same_phrase = valid[:, 1:] & (phrase[:, 1:] == phrase[:, :-1])
+    interval_flat = (rows[:, 1:] * n_phrases + phrase[:, 1:])[same_phrase]
+    interval_sums = np.bincount(interval_flat, weights=stats['intervals'][same_phrase], minlength=size)
+    interval_counts = np.bincount(interval_flat, minlength=size)
+
+    shape = (n, n_phrases)
+    return {
+        'total_beats': total_beats.reshape(shape),
+        'note_count': note_count.reshape(shape),
+        'avg_interval': np.divide(interval_sums, interval_counts, out=np.zeros(size),
+                                  where=interval_counts > 0).reshape(shape)
+    }
+
+
+def corpus_summary(pitches: np.ndarray, durations: np.ndarray, lengths: np.ndarray) -> Dict:
+    stats = analyze_arrays(pitches, durations, lengths)
+    width = pitches.shape[1]
+    interval_valid = (np.arange(width)[None, :] < lengths[:, None])[:, 1:]
+
+    duration_totals = stats['duration_counts'].sum(axis=0)
+    pitch_totals = stats['pitch_counts'].sum(axis=0)
+    interval_histogram = np.bincount(stats['intervals'][interval_valid], minlength=N_MIDI)
+    n_intervals = int(interval_valid.sum())
+
+    return {
+        'melodies': len(lengths),
+        'notes': int(lengths.sum()),
+        'mean_note_count': float(lengths.mean()) if len(lengths) else 0.0,
+        'mean_total_beats': float(stats['total_beats'].mean()) if len(lengths) else 0.0,
+        'duration_distribution': {d: int(c) for d, c in zip(DURATIONS, duration_totals)},
+        'pitch_distribution': {midi_to_pitch(int(m)): int(pitch_totals[m]) for m in np.flatnonzero(pitch_totals)},
+        'avg_interval': float(stats['intervals'][interval_valid].sum() / n_intervals) if n_intervals else 0.0,
+        'avg_interval_mean': float(stats['avg_interval'].mean()) if len(lengths) else 0.0,
+        'avg_interval_std': float(stats['avg_interval'].std()) if len(lengths) else 0.0,
+        'interval_histogram': interval_histogram[:int(np.flatnonzero(interval_histogram).max(initial=-1)) + 1]
+    }
@@ -0,0 +1,283 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from .environment import MusicEnvironment, Note, Duration
+from .agent import QLearningAgent
+from .train import train_agent, generate_melody, generate_melodies
+from .utils import save_melody_as_midi, analyze_melody
+
+DEFAULT_BASELINE = 'outputs/benchmarks/baseline.json'
+
+
+def _seed(seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def _best_time(fn: Callable[[], None], repeats: int) -> float:
+    # Minimum over repeats is the least noisy estimate of the true cost
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _metric(value: float, unit: str, higher_is_better: bool) -> Dict:
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def _trained_agent(env: MusicEnvironment, n_episodes: int, seed: int) -> QLearningAgent:
+    _seed(seed)
+    agent = QLearningAgent(n_actions=env.n_actions, n_states=env.n_states)
+    train_agent(env, agent, n_episodes=n_episodes, verbose=False)
+    return agent
+
+
+def _action_trace(env: MusicEnvironment, agent: QLearningAgent, seed: int) -> List[int]:
+    melody = generate_melody(env, agent, rng=np.random.default_rng(seed))
+    return [env.note_to_action[str(note)] for note in melody]
+
+
+def bench_env_step(env: MusicEnvironment, trace: List[int], n_episodes: int,
+                   repeats: int) -> Dict:
+    def run():
+        for _ in range(n_episodes):
+            env.reset()
+            for action in trace:
+                env.step(action)
+
+    elapsed = _best_time(run, repeats)
+    return _metric(n_episodes * len(trace) / elapsed, 'steps/s', True)
+
+
+def rhythm_library(n_patterns: int, seed: int, max_length: int = 8) -> Dict[str, List[str]]:
+    # Random duration motifs standing in for a corpus-sized pattern library
+    rng = np.random.default_rng(seed)
+    names = [d.name for d in Duration]
+    return {f"motif_{i}": [names[c] for c in rng.integers(0, len(names), rng.integers(1, max_length + 1))]
+            for i in range(n_patterns)}
+
+
+def bench_train(n_episodes: int, repeats: int, seed: int) -> Dict:
+    def run():
+        env = MusicEnvironment()
+        _seed(seed)
+        agent = QLearningAgent(n_actions=env.n_actions, n_states=env.n_states)
+        train_agent(env, agent, n_episodes=n_episodes, verbose=False)
+
+    elapsed = _best_time(run, repeats)
+    return _metric(n_episodes / elapsed, 'episodes/s', True)
+
+
+def bench_get_action(env: MusicEnvironment, agent: QLearningAgent, trace: List[int],
+                     repeats: int) -> Dict:
+    # Replays the trace to collect realistic (state, env_info) pairs
+    samples = []
+    env.reset()
+    state = env.encode_state()
+    for action in trace:
+        samples.append((state, {
+            'current_beat': env.current_beat,
+            'current_measure': env.current_measure,
+            'beats_per_measure': env.beats_per_measure,
+            'valid_actions': env.valid_actions(),
+            'current_duration': None,
+            'measure_complete': env._is_measure_complete()
+        }))
+        state, _, _, _ = env.step(action)
+
+    def run():
+        for state, env_info in samples:
+            agent.get_action(state, env_info)
+
+    elapsed = _best_time(run, repeats)
+    return _metric(elapsed / len(samples) * 1e6, 'us', False)
+
+
+def bench_generate(env: MusicEnvironment, agent: QLearningAgent, repeats: int) -> Dict:
+    elapsed = _best_time(lambda: generate_melody(env, agent, rng=np.random.default_rng(0)), repeats)
+    return _metric(elapsed * 1e3, 'ms', False)
+
+
+def bench_midi(melodies: List[List[Note]], repeats: int) -> Dict:
+    def run():
+        for i, melody in enumerate(melodies):
+            save_melody_as_midi(melody, io.BytesIO(), tempo=100, seed=i)
+
+    elapsed = _best_time(run, repeats)
+    return _metric(len(melodies) / elapsed, 'melodies/s', True)
+
+
+def bench_analyze(melodies: List[List[Note]], repeats: int) -> Dict:
+    def run():
+        for melody in melodies:
+            analyze_melody(melody)
+
+    elapsed = _best_time(run, repeats)
+    return _metric(len(melodies) / elapsed, 'melodies/s', True)
+
+
+# Each startup probe runs in a fresh interpreter from the project root
+STARTUP_COMMANDS = {
+    'cli_startup': ['-m', 'src', '--help'],
+    'generate_import': ['-c', 'import src.cli, src.train, src.utils, src.agent']
+}
+
+
+def bench_startup(args: List[str], repeats: int) -> Dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable] + args
+    elapsed = _best_time(lambda: subprocess.run(command, cwd=root, check=True,
+                                                stdout=subprocess.DEVNULL), repeats)
+    return _metric(elapsed * 1e3, 'ms', False)
+
+
+def q_table_bytes(agent: QLearningAgent) -> int:
+    # Size of the table after training; a sparse or legacy table may have
+    # been larger on the way
+    legacy = sum(q.nbytes for q in agent.legacy_q_table.values())
+    return int(agent.q_table.nbytes + legacy)
+
+
+def bench_train_peak_bytes(n_episodes: int, seed: int) -> Dict:
+    # Peak traced allocation while building and training an agent: the
+    # Q-table at its largest plus everything training allocates around it
+    env = MusicEnvironment()
+    _seed(seed)
+    tracemalloc.start()
+    try:
+        agent = QLearningAgent(n_actions=env.n_actions, n_states=env.n_states)
+        train_agent(env, agent, n_episodes=n_episodes, verbose=False)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return _metric(peak, 'bytes', False)
+
+
+def run_benchmarks(quick: bool = False, seed: int = 0) -> Dict:
+    repeats = 2 if quick else 5
+    train_episodes = 10 if quick else 30
+    batch = 20 if quick else 100
+
+    env = MusicEnvironment()
+    agent = _trained_agent(env, train_episodes, seed)
+    trace = _action_trace(env, agent, seed)
+    melodies = [melody for _, melody in generate_melodies(env, agent, batch, seed=seed)]
+
+    metrics = {
+        'env_step': bench_env_step(env, trace, 5 if quick else 20, repeats),
+        'env_step_512_rhythms': bench_env_step(MusicEnvironment(rhythm_patterns=rhythm_library(512, seed)),
+                                               trace, 5 if quick else 20, repeats),
+        'train_episodes': bench_train(train_episodes, repeats, seed),
+        'get_action_latency': bench_get_action(env, agent, trace, repeats),
+        'generate_melody_latency': bench_generate(env, agent, repeats),
+        'save_midi_throughput': bench_midi(melodies, repeats),
+        'analyze_throughput': bench_analyze(melodies, repeats),
+        'q_table_bytes': _metric(q_table_bytes(agent), 'bytes', False),
+        'train_peak_bytes': bench_train_peak_bytes(train_episodes, seed)
+    }
+    for name, args in STARTUP_COMMANDS.items():
+        metrics[name] = bench_startup(args, repeats)
+
+    return {
+        'metrics': metrics,
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': quick,
+            'seed': seed,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.2) -> List[str]:
+    # A metric regresses when it is worse than baseline by more than threshold
+    regressions = []
+
+    for name, metric in current['metrics'].items():
+        if name not in baseline['metrics']:
+            continue
+        base = baseline['metrics'][name]['value']
+        value = metric['value']
+        if base == 0:
+            continue
+
+        if metric['higher_is_better']:
+            change = (base - value) / base
+        else:
+            change = (value - base) / base
+
+        if change > threshold:
+            regressions.append(f"{name}: {value:.4g} {metric['unit']} vs baseline "
+                               f"{base:.4g} ({change * 100:.1f}% worse)")
+
+    return regressions
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    print("\nBenchmarks:")
+    for name, metric in results['metrics'].items():
+        line = f"{name:26s} {metric['value']:14.4g} {metric['unit']}"
+        if baseline and name in baseline['metrics']:
+            base = baseline['metrics'][name]['value']
+            if base:
+                line += f"  ({(metric['value'] - base) / base * 100:+.1f}% vs baseline)"
+        print(line)
+
+
+def save_results(results: Dict, filename: str):
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(filename: str) -> Dict:
+    with open(filename) as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark training, generation, reward, MIDI and startup hot paths')
+    parser.add_argument('--quick', action='store_true', help='fewer repeats and smaller batches')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, help='write results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fractional slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(quick=args.quick, seed=args.seed)
+    baseline = load_results(args.compare) if args.compare else None
+    print_results(results, baseline)
+
+    if args.save:
+        save_results(results, args.save)
+        print(f"\nSaved results to {args.save}")
+
+    if baseline:
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"- {regression}")
+            return 1
+        print("\nNo regressions")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
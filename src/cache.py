@@ -0,0 +1,238 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Callable, Dict, Optional
+from .environment import MusicEnvironment, Duration
+from .melody import Melody
+from .agent import QLearningAgent
+from .qtable import SparseQTable
+
+DEFAULT_CACHE_DIR = 'outputs/cache'
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+# Eviction trims the cache to this fraction of max_bytes, so a full cache is
+# not rescanned on every write
+EVICT_TO = 0.9
+
+
+def _update_digest(digest, part):
+    # Arrays hash their dtype, shape and raw bytes; everything else as
+    # canonical JSON
+    if isinstance(part, np.ndarray):
+        part = np.ascontiguousarray(part)
+        digest.update(f"ndarray:{part.dtype.str}:{part.shape}\0".encode())
+        digest.update(memoryview(part).cast('B'))
+    elif isinstance(part, bytes):
+        digest.update(b'bytes\0' + part)
+    else:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode() + b'\0')
+
+
+def fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        _update_digest(digest, part)
+    return digest.hexdigest()
+
+
+def agent_fingerprint(agent: QLearningAgent) -> str:
+    # Everything generation reads: Q-values, exploration rate and patterns
+    if isinstance(agent.q_table, SparseQTable):
+        q_parts = agent.q_table.items()
+    else:
+        q_parts = (agent.q_table,)
+    patterns = [[[int(action), getattr(duration, 'name', None)] for action, duration in pattern]
+                for pattern, _ in agent.good_patterns.to_list()]
+    return fingerprint(*q_parts, agent.epsilon, patterns, agent.good_patterns.rewards())
+
+
+class ArtifactCache:
+    # Content-addressed files under root/<key[:2]>/<key>.<kind>. Writes go to
+    # a temporary file in the same directory and are renamed into place, so
+    # concurrent readers and writers only ever see whole artifacts. Reads
+    # refresh the file's mtime, and once the cache outgrows max_bytes the
+    # least recently used files are deleted.
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{kind}")
+
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        path = self._path(key, kind)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing, or evicted by another process between open and utime
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+
+    def put(self, key: str, kind: str, data: bytes):
+        path = self._path(key, kind)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # A racing writer or a re-put may already have stored this
+            # artifact; only the difference in size is new
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(data) - replaced
+        if self._size > self.max_bytes:
+            self.evict()
+
+
+    def get_or_create(self, key: str, kind: str, create: Callable[[], bytes]) -> bytes:
+        data = self.get(key, kind)
+        if data is None:
+            data = create()
+            self.put(key, kind, data)
+        return data
+
+
+    def _entries(self):
+        # (mtime, size, path) of every finished artifact
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        # Deletes least recently used artifacts until the total fits;
+        # returns the number removed
+        limit = int((self.max_bytes if max_bytes is None else max_bytes) * EVICT_TO)
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._size = total
+        return removed
+
+
+    def clear(self):
+        self.evict(0)
+
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes': self.size(),
+            'max_bytes': self.max_bytes
+        }
+
+
+def _encode_analysis(analysis: Dict) -> bytes:
+    analysis = dict(analysis)
+    analysis['duration_distribution'] = {
+        duration.name: count for duration, count in analysis['duration_distribution'].items()}
+    return json.dumps(analysis).encode()
+
+
+def _decode_analysis(data: bytes) -> Dict:
+    analysis = json.loads(data)
+    analysis['duration_distribution'] = {
+        Duration[name]: count for name, count in analysis['duration_distribution'].items()}
+    return analysis
+
+
+class MelodyCache:
+    # Melodies, MIDI bytes and analyses for one agent and environment, keyed
+    # by the agent's fingerprint, env.config(), the generation seed and
+    # index (as in generate_melodies) and the output options. Hashing the
+    # Q-table happens once, here.
+    def __init__(self, env: MusicEnvironment, agent: QLearningAgent,
+                 cache: Optional[ArtifactCache] = None):
+        self.env = env
+        self.agent = agent
+        self.cache = cache if cache is not None else ArtifactCache()
+        self.base_key = fingerprint(agent_fingerprint(agent), env.config())
+
+
+    def key(self, *parts) -> str:
+        return fingerprint(self.base_key, *parts)
+
+
+    def melody(self, seed: int, index: int = 0) -> Melody:
+        from .train import generate_melody, melody_rng
+
+        def create() -> bytes:
+            melody = generate_melody(self.env, self.agent, rng=melody_rng(seed, index))
+            buffer = io.BytesIO()
+            np.save(buffer, np.stack([melody.pitches, melody.durations]), allow_pickle=False)
+            return buffer.getvalue()
+
+        data = self.cache.get_or_create(self.key('melody', seed, index), 'npy', create)
+        pitches, durations = np.load(io.BytesIO(data), allow_pickle=False)
+        return Melody(pitches, durations)
+
+
+    def midi(self, seed: int, index: int = 0, tempo: int = 100, midi_seed: Optional[int] = None) -> bytes:
+        from .midi import encode_melody_midi
+
+        return self.cache.get_or_create(
+            self.key('midi', seed, index, tempo, midi_seed), 'mid',
+            lambda: encode_melody_midi(self.melody(seed, index), tempo, midi_seed))
+
+
+    def analysis(self, seed: int, index: int = 0) -> Dict:
+        from .utils import analyze_melody
+
+        return _decode_analysis(self.cache.get_or_create(
+            self.key('analysis', seed, index), 'json',
+            lambda: _encode_analysis(analyze_melody(self.melody(seed, index)))))
@@ -0,0 +1,204 @@
+import csv
+import json
+import os
+from collections import deque
+from typing import Dict, List, Optional, TextIO
+
+
+class TrainingCallback:
+    # Setting stop_training ends the run after the current episode (or batch).
+    # Callbacks that only need step counts set timed = False; when no callback
+    # is timed, episode metrics report zero times and the per-step clock
+    # reads are skipped.
+    stop_training = False
+    timed = True
+
+    def on_train_begin(self, env, agent):
+        pass
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        pass
+
+
+    def on_train_end(self, episode_rewards: List[float]):
+        pass
+
+
+class JSONLSink:
+    def __init__(self, filename: str):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.file: TextIO = open(filename, 'w')
+
+
+    def write(self, record: Dict):
+        self.file.write(json.dumps(record) + '\n')
+
+
+    def close(self):
+        self.file.close()
+
+
+class CSVSink:
+    def __init__(self, filename: str):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.file: TextIO = open(filename, 'w', newline='')
+        self.writer: Optional[csv.DictWriter] = None
+
+
+    def write(self, record: Dict):
+        # Columns are fixed by the first record
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(record), extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow(record)
+
+
+    def close(self):
+        self.file.close()
+
+
+class MetricsRecorder(TrainingCallback):
+    # Adds rolling aggregates and Q-table/pattern sizes to each episode's
+    # metrics, keeps them in memory and streams them to an optional sink.
+    # Counting visited Q-table states scans the table, so it is refreshed
+    # only every size_every episodes.
+    def __init__(self, sink=None, window: int = 100, size_every: int = 10,
+                 keep_records: bool = True):
+        self.sink = sink
+        self.window = window
+        self.size_every = size_every
+        self.keep_records = keep_records
+        self.records: List[Dict] = []
+
+        self._rewards = deque(maxlen=window)
+        self._steps = deque(maxlen=window)
+        self._times = deque(maxlen=window)
+        self._agent = None
+        self._q_table_states = 0
+
+
+    def on_train_begin(self, env, agent):
+        self._agent = agent
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        self._rewards.append(metrics['reward'])
+        self._steps.append(metrics['steps'])
+        self._times.append(metrics['episode_time'])
+
+        if self._agent is not None:
+            if episode % self.size_every == 0:
+                self._q_table_states = self._agent.q_table_size()
+            metrics['q_table_states'] = self._q_table_states
+            metrics['good_patterns'] = len(self._agent.good_patterns)
+            # Sparse Q-tables report their lookup hit rate
+            hit_rate = getattr(self._agent.q_table, 'hit_rate', None)
+            if hit_rate is not None:
+                metrics['q_hit_rate'] = hit_rate
+
+        total_time = sum(self._times)
+        metrics['reward_mean'] = sum(self._rewards) / len(self._rewards)
+        metrics['reward_max'] = max(self._rewards)
+        metrics['steps_per_sec_mean'] = sum(self._steps) / total_time if total_time else 0.0
+
+        if self.keep_records:
+            self.records.append(metrics)
+        if self.sink is not None:
+            self.sink.write(metrics)
+
+
+    def on_train_end(self, episode_rewards: List[float]):
+        if self.sink is not None:
+            self.sink.close()
+
+
+    def time_split(self) -> Dict[str, float]:
+        # Share of step time spent in each phase over the recorded episodes
+        totals = {key: sum(r[key] for r in self.records)
+                  for key in ('action_time', 'step_time', 'update_time')}
+        total = sum(totals.values()) or 1.0
+        return {key: value / total for key, value in totals.items()}
+
+
+class EarlyStopping(TrainingCallback):
+    # Stops once the rolling mean reward over the last window episodes has not
+    # beaten its best by more than tolerance for patience episodes
+    def __init__(self, window: int = 100, patience: int = 200, tolerance: float = 0.0,
+                 verbose: bool = True):
+        self.window = window
+        self.patience = patience
+        self.tolerance = tolerance
+        self.verbose = verbose
+
+        self.best_mean = float('-inf')
+        self.best_episode: Optional[int] = None
+        self.stopped_episode: Optional[int] = None
+        self.stop_reason: Optional[str] = None
+
+        self._rewards = deque(maxlen=window)
+        self._sum = 0.0
+        self._wait = 0
+        self._last_episode: Optional[int] = None
+
+
+    def on_train_begin(self, env, agent):
+        self.stop_training = False
+        self.stopped_episode = None
+        self.stop_reason = None
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        self._last_episode = episode
+        if len(self._rewards) == self.window:
+            self._sum -= self._rewards[0]
+        self._rewards.append(metrics['reward'])
+        self._sum += metrics['reward']
+        if len(self._rewards) < self.window:
+            return
+
+        mean = self._sum / self.window
+        if mean > self.best_mean + self.tolerance:
+            self.best_mean = mean
+            self.best_episode = episode
+            self._wait = 0
+            return
+
+        self._wait += 1
+        if self._wait >= self.patience and not self.stop_training:
+            self.stop_training = True
+            self.stopped_episode = episode
+            self.stop_reason = (f"rolling mean reward over {self.window} episodes did not improve "
+                                f"by more than {self.tolerance} for {self.patience} episodes "
+                                f"(best {self.best_mean:.2f} at episode {self.best_episode})")
+            if self.verbose:
+                print(f"Early stopping at episode {episode}: {self.stop_reason}")
+
+
+    def on_train_end(self, episode_rewards: List[float]):
+        if not self.stop_training:
+            self.stopped_episode = self._last_episode
+            self.stop_reason = 'reached n_episodes'
+
+
+class Checkpoint(TrainingCallback):
+    # Saves the agent every `every` episodes and when training ends, so an
+    # interrupted run can resume from QLearningAgent.load(path, mmap_mode=None)
+    def __init__(self, path: str, every: int = 100):
+        self.path = path
+        self.every = every
+        self._agent = None
+
+
+    def on_train_begin(self, env, agent):
+        self._agent = agent
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        if (episode + 1) % self.every == 0:
+            self._agent.save(self.path)
+
+
+    def on_train_end(self, episode_rewards: List[float]):
+        if self._agent is not None:
+            self._agent.save(self.path)
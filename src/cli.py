@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+# Subcommands import what they need when they run, so `--help` and the light
+# commands do not pay for NumPy, MIDI or plotting imports they never use
+
+DEFAULT_CHECKPOINT = 'outputs/checkpoints/agent'
+ENV_CONFIG_FILE = 'env.json'
+
+
+def _make_env(args):
+    from .environment import MusicEnvironment
+
+    # --env wins, then the settings saved next to the checkpoint
+    if args.env:
+        return MusicEnvironment(**json.loads(args.env))
+    path = os.path.join(args.checkpoint, ENV_CONFIG_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return MusicEnvironment(**json.load(f))
+    return MusicEnvironment()
+
+
+def _load_agent(args):
+    from .agent import QLearningAgent
+
+    if not os.path.exists(args.checkpoint):
+        sys.exit(f"No checkpoint at {args.checkpoint}; run `python -m src train` first")
+    return QLearningAgent.load(args.checkpoint)
+
+
+def _melody_cache(args, env, agent):
+    if args.cache is None:
+        return None
+    from .cache import ArtifactCache, MelodyCache
+    return MelodyCache(env, agent, ArtifactCache(args.cache, max_bytes=args.cache_mb * 2**20))
+
+
+def cmd_train(args) -> int:
+    import random
+    import numpy as np
+    from .agent import QLearningAgent
+    from .train import train_agent
+    from .callbacks import Checkpoint, EarlyStopping
+
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+    env = _make_env(args)
+    if args.resume and os.path.exists(args.checkpoint):
+        agent = QLearningAgent.load(args.checkpoint, mmap_mode=None)
+        print(f"Resuming from {args.checkpoint} after {agent.episodes_trained} episodes")
+    else:
+        # --max-q-table-mb stores only visited states, evicting past the budget
+        max_q_table_bytes = None
+        if args.max_q_table_mb is not None:
+            max_q_table_bytes = int(args.max_q_table_mb * 2**20)
+        agent = QLearningAgent(n_actions=env.n_actions, n_states=env.n_states,
+                               learning_rate=args.learning_rate, gamma=args.gamma,
+                               epsilon_start=args.epsilon, q_dtype=np.dtype(args.q_dtype),
+                               max_q_table_bytes=max_q_table_bytes)
+
+    if args.corpus:
+        from .corpus import load_corpus, warm_start
+        corpus = load_corpus(args.corpus, env)
+        mean_reward = warm_start(env, agent, corpus, passes=args.corpus_passes)
+        print(f"Warm-started from {len(corpus)} corpus episodes (mean reward {mean_reward:.1f})")
+
+    stopper = None
+    if args.workers > 1:
+        # Workers train side by side on one shared Q-table; callbacks such as
+        # periodic checkpoints and early stopping run within a process only
+        if args.early_stopping:
+            sys.exit("--early-stopping is not supported with --workers")
+        if not isinstance(agent.q_table, np.ndarray):
+            sys.exit("--workers needs a dense Q-table; drop --max-q-table-mb")
+        from .parallel import train_parallel
+        stats = train_parallel(env, agent, n_episodes=args.episodes, n_workers=args.workers,
+                               n_envs=args.n_envs, seed=args.seed or 0)
+        agent.save(args.checkpoint)
+        rewards = [reward for worker in stats['worker_rewards'] for reward in worker]
+        print(f"{stats['workers']} workers, {stats['steps']} steps in {stats['seconds']:.1f}s "
+              f"({stats['steps_per_sec']:,.0f} steps/s)")
+    else:
+        callbacks = [Checkpoint(args.checkpoint, every=args.checkpoint_every)]
+        if args.early_stopping:
+            stopper = EarlyStopping(window=args.window, patience=args.patience, tolerance=args.tolerance)
+            callbacks.append(stopper)
+
+        rewards = train_agent(env, agent, n_episodes=args.episodes, n_envs=args.n_envs,
+                              verbose=not args.quiet, callbacks=callbacks)
+    with open(os.path.join(args.checkpoint, ENV_CONFIG_FILE), 'w') as f:
+        json.dump(env.config(), f)
+
+    print(f"Trained {len(rewards)} episodes ({agent.episodes_trained} total), saved to {args.checkpoint}")
+    if stopper is not None:
+        print(f"Stopped at episode {stopper.stopped_episode}: {stopper.stop_reason}")
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        os.makedirs(os.path.dirname(args.plot) or '.', exist_ok=True)
+        plt.figure(figsize=(10, 5))
+        plt.plot(rewards)
+        plt.title('Training Rewards over Episodes')
+        plt.xlabel('Episode')
+        plt.ylabel('Total Reward')
+        plt.savefig(args.plot)
+        plt.close()
+        print(f"Saved reward curve to {args.plot}")
+
+    return 0
+
+
+def cmd_generate(args) -> int:
+    from .train import generate_melodies, generate_melody_beam, generate_melody_lookahead, melody_rng
+    from .utils import export_melodies, format_melody_for_display, melody_filename, save_melody_as_midi
+
+    env = _make_env(args)
+    agent = _load_agent(args)
+    cache = _melody_cache(args, env, agent)
+    if args.beam:
+        # The top --count melodies of one beam search, best first
+        ranked = generate_melody_beam(env, agent, beam_width=max(args.beam, args.count), k=args.count)
+        melodies = iter([(index, melody) for index, (melody, _) in enumerate(ranked)])
+    elif args.lookahead is not None:
+        melodies = ((index, generate_melody_lookahead(env, agent, rng=melody_rng(args.seed, index),
+                                                      budget_ms=args.lookahead))
+                    for index in range(args.count))
+    elif cache is not None:
+        melodies = ((index, cache.melody(args.seed, index)) for index in range(args.count))
+    else:
+        melodies = generate_melodies(env, agent, args.count, seed=args.seed)
+
+    if args.out is None:
+        for index, melody in melodies:
+            print(f"Melody {index}:")
+            print(format_melody_for_display(melody, env.beats_per_measure))
+        return 0
+
+    if cache is not None and not args.beam and args.lookahead is None:
+        # Cached MIDI bytes are copied out; only misses are encoded
+        os.makedirs(args.out, exist_ok=True)
+        paths = []
+        for index in range(args.count):
+            paths.append(melody_filename(args.out, index, args.prefix))
+            with open(paths[-1], 'wb') as f:
+                f.write(cache.midi(args.seed, index, tempo=args.tempo, midi_seed=args.seed + index))
+    elif args.count == 1:
+        index, melody = next(melodies)
+        path = melody_filename(args.out, index, args.prefix)
+        os.makedirs(args.out, exist_ok=True)
+        save_melody_as_midi(melody, path, tempo=args.tempo, seed=args.seed + index)
+        paths = [path]
+    else:
+        paths = list(export_melodies(melodies, args.out, tempo=args.tempo, n_workers=args.workers,
+                                     seed=args.seed, prefix=args.prefix))
+
+    print(f"Wrote {len(paths)} MIDI files to {args.out}")
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    from .train import generate_melodies
+    from .utils import analyze_melody, print_melody_analysis
+    from .analysis import melodies_to_arrays, corpus_summary
+
+    env = _make_env(args)
+    agent = _load_agent(args)
+    cache = _melody_cache(args, env, agent)
+    if cache is not None:
+        melodies = [cache.melody(args.seed, index) for index in range(args.count)]
+    else:
+        melodies = [melody for _, melody in generate_melodies(env, agent, args.count, seed=args.seed)]
+
+    if args.count == 1:
+        analysis = cache.analysis(args.seed) if cache is not None else analyze_melody(melodies[0])
+        if args.json:
+            analysis['duration_distribution'] = {
+                d.name: c for d, c in analysis['duration_distribution'].items()}
+            print(json.dumps(analysis))
+        else:
+            print_melody_analysis(analysis)
+        return 0
+
+    summary = corpus_summary(*melodies_to_arrays(melodies))
+    if args.json:
+        summary['duration_distribution'] = {d.name: c for d, c in summary['duration_distribution'].items()}
+        summary['interval_histogram'] = summary['interval_histogram'].tolist()
+        print(json.dumps(summary))
+        return 0
+
+    print(f"\n{summary['melodies']} melodies, {summary['notes']} notes "
+          f"({summary['mean_note_count']:.1f} per melody, {summary['mean_total_beats']:.1f} beats)")
+    print("\nDuration Distribution:")
+    for duration, count in summary['duration_distribution'].items():
+        print(f"{duration.name}: {count} notes ({count / max(summary['notes'], 1) * 100:.1f}%)")
+    print("\nPitch Distribution:")
+    for pitch, count in summary['pitch_distribution'].items():
+        print(f"{pitch}: {count} times ({count / max(summary['notes'], 1) * 100:.1f}%)")
+    print(f"\nAverage interval size: {summary['avg_interval']:.2f} semitones "
+          f"(per-melody mean {summary['avg_interval_mean']:.2f}, std {summary['avg_interval_std']:.2f})")
+    return 0
+
+
+def cmd_render(args) -> int:
+    from .render import main as render_main
+    return render_main(args.args)
+
+
+def cmd_sweep(args) -> int:
+    from .sweep import main as sweep_main
+    sweep_main(args.args)
+    return 0
+
+
+def _add_model_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--env', default=None, help='MusicEnvironment settings as JSON (env.config())')
+
+
+def _add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--cache', nargs='?', const='outputs/cache', default=None,
+                        help='reuse melodies, MIDI and analyses for the same agent and seed')
+    parser.add_argument('--cache-mb', type=int, default=512)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m src', description='Train, generate, analyze and render melodies')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='train an agent and checkpoint it')
+    _add_model_arguments(train)
+    train.add_argument('--episodes', type=int, default=2000)
+    train.add_argument('--n-envs', type=int, default=1, help='episodes stepped side by side')
+    train.add_argument('--workers', type=int, default=1, help='processes sharing one Q-table')
+    train.add_argument('--resume', action='store_true', help='continue from the checkpoint if it exists')
+    train.add_argument('--checkpoint-every', type=int, default=100)
+    train.add_argument('--learning-rate', type=float, default=0.1)
+    train.add_argument('--gamma', type=float, default=0.99)
+    train.add_argument('--epsilon', type=float, default=0.3)
+    train.add_argument('--q-dtype', choices=['float16', 'float32', 'float64'], default='float64',
+                       help='Q-table precision for a new agent')
+    train.add_argument('--max-q-table-mb', type=float, default=None, metavar='MB',
+                       help='bound the Q-table to MB, keeping only visited states')
+    train.add_argument('--corpus', default=None, help='directory of MIDI files to warm-start from')
+    train.add_argument('--corpus-passes', type=int, default=1)
+    train.add_argument('--early-stopping', action='store_true')
+    train.add_argument('--window', type=int, default=100)
+    train.add_argument('--patience', type=int, default=200)
+    train.add_argument('--tolerance', type=float, default=0.0)
+    train.add_argument('--seed', type=int, default=None)
+    train.add_argument('--plot', nargs='?', const='outputs/training_rewards.png', default=None,
+                       help='save the reward curve')
+    train.add_argument('--quiet', action='store_true')
+    train.set_defaults(func=cmd_train)
+
+    generate = commands.add_parser('generate', help='generate melodies from a checkpoint')
+    _add_model_arguments(generate)
+    _add_cache_arguments(generate)
+    generate.add_argument('--count', type=int, default=1)
+    generate.add_argument('--seed', type=int, default=0)
+    generate.add_argument('--out', default=None, help='write MIDI files here instead of printing')
+    generate.add_argument('--prefix', default='melody')
+    generate.add_argument('--tempo', type=int, default=100)
+    generate.add_argument('--workers', type=int, default=None)
+    generate.add_argument('--beam', type=int, default=None, metavar='WIDTH',
+                          help='beam search instead of sampling; ignores --seed')
+    generate.add_argument('--lookahead', type=float, default=None, metavar='MS',
+                          help='choose each note by short rollouts, capped at MS milliseconds per note')
+    generate.set_defaults(func=cmd_generate)
+
+    analyze = commands.add_parser('analyze', help='analyze generated melodies')
+    _add_model_arguments(analyze)
+    _add_cache_arguments(analyze)
+    analyze.add_argument('--count', type=int, default=1)
+    analyze.add_argument('--seed', type=int, default=0)
+    analyze.add_argument('--json', action='store_true')
+    analyze.set_defaults(func=cmd_analyze)
+
+    # render and sweep forward their arguments to the module CLIs
+    render = commands.add_parser('render', help='render MIDI files to WAV', add_help=False)
+    render.add_argument('args', nargs=argparse.REMAINDER)
+    render.set_defaults(func=cmd_render, forward=True)
+
+    sweep = commands.add_parser('sweep', help='hyperparameter sweep', add_help=False)
+    sweep.add_argument('args', nargs=argparse.REMAINDER)
+    sweep.set_defaults(func=cmd_sweep, forward=True)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+
+    # Arguments that start with an option (e.g. `sweep --help`) are not
+    # captured by REMAINDER, so forwarded commands take the leftovers too
+    if getattr(args, 'forward', False):
+        args.args = extra + args.args
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .environment import MusicEnvironment
+from .agent import QLearningAgent
+from .midi import DRUM_CHANNEL
+
+DEFAULT_CACHE = 'outputs/corpus/corpus.npz'
+MIDI_SUFFIXES = ('.mid', '.midi')
+
+
+def midi_file_notes(filename: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (pitch, start, duration) in beats for every non-drum note of a MIDI
+    # file; note-offs close the earliest open note of their channel and key
+    import mido
+
+    midi = mido.MidiFile(filename)
+    notes = []
+    open_notes: Dict[Tuple[int, int], List[int]] = {}
+    tick = 0
+
+    for message in mido.merge_tracks(midi.tracks):
+        tick += message.time
+        if message.type not in ('note_on', 'note_off') or message.channel == DRUM_CHANNEL:
+            continue
+        key = (message.channel, message.note)
+        if message.type == 'note_on' and message.velocity > 0:
+            open_notes.setdefault(key, []).append(tick)
+        elif open_notes.get(key):
+            started = open_notes[key].pop(0)
+            notes.append((message.note, started, tick - started))
+
+    if not notes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    pitch, start, duration = map(np.array, zip(*notes))
+    return pitch, start / midi.ticks_per_beat, duration / midi.ticks_per_beat
+
+
+def _transpose(pitch: np.ndarray, scale_midi: np.ndarray) -> np.ndarray:
+    # Shifts the line to put the most notes on the environment's scale and
+    # range (the smallest shift on ties), then snaps the rest to the nearest
+    # scale note
+    shifts = np.arange(-36, 37)
+    hits = np.isin(pitch[None, :] + shifts[:, None], scale_midi).sum(axis=1)
+    shift = shifts[np.lexsort((np.abs(shifts), -hits))[0]]
+    return np.abs((pitch + shift)[:, None] - scale_midi[None, :]).argmin(axis=1)
+
+
+def quantize_notes(env: MusicEnvironment, pitch: np.ndarray, start: np.ndarray,
+                   duration: np.ndarray) -> List[np.ndarray]:
+    # Maps notes onto env's action space as whole episodes of actions. The
+    # top note of each sixteenth-note onset is the melody (skyline), held
+    # until the next onset; notes are split into the longest durations that
+    # fit the measure. Before a rest longer than a measure the note is held
+    # to the end of its measure instead. Episodes are cut at env's length; a
+    # final partial episode is kept, trimmed to whole measures.
+    if not len(pitch):
+        return []
+
+    onset = np.round(start * 4).astype(np.int64)
+    order = np.lexsort((-pitch, onset))
+    onset, pitch, duration = onset[order], pitch[order], duration[order]
+    first = np.r_[True, onset[1:] != onset[:-1]]
+    onset, pitch, duration = onset[first], pitch[first], duration[first]
+
+    scale_midi = env.action_midi[:env.n_actions:len(env.durations)]
+    pitch_index = _transpose(pitch, scale_midi)
+
+    measure = env.beat_positions
+    episode_length = int(env.total_beats * 4)
+    held = np.r_[np.diff(onset), np.round(duration[-1] * 4)]
+    gaps = np.r_[np.diff(onset), 0] > measure
+    held = np.maximum(np.where(gaps, np.round(duration * 4), held), 1).astype(np.int64)
+
+    # Durations longest first, in sixteenths, with their action offsets
+    lengths = sorted(((int(d.value * 4), i) for i, d in enumerate(env.durations)), reverse=True)
+
+    episodes, actions, position = [], [], 0
+    for note, length, gap in zip(pitch_index.tolist(), held.tolist(), gaps.tolist()):
+        if gap:
+            length += -(position + length) % measure
+        while length > 0:
+            room = measure - position % measure
+            size, code = next((s, c) for s, c in lengths if s <= min(length, room))
+            actions.append(note * len(env.durations) + code)
+            length -= size
+            position += size
+            if position == episode_length:
+                episodes.append(np.array(actions, dtype=np.int32))
+                actions, position = [], 0
+
+    if position >= measure:
+        episodes.append(np.array(_trim_to_measure(actions, env, measure), dtype=np.int32))
+    return episodes
+
+
+def _trim_to_measure(actions: List[int], env: MusicEnvironment, measure: int) -> List[int]:
+    beats = (env.action_beats[actions] * 4).astype(np.int64)
+    ends = np.cumsum(beats)
+    return actions[:int(np.searchsorted(ends, ends[-1] - ends[-1] % measure, side='right'))]
+
+
+def _import_file(path: str, env_config: Dict) -> Tuple[str, List[np.ndarray]]:
+    # Unreadable files yield no episodes rather than failing the import
+    env = MusicEnvironment(**env_config)
+    try:
+        notes = midi_file_notes(path)
+    except (OSError, EOFError, ValueError, KeyError, IndexError):
+        return path, []
+    return path, quantize_notes(env, *notes)
+
+
+def midi_paths(midi_dir: str) -> List[str]:
+    return sorted(str(path) for path in Path(midi_dir).rglob('*')
+                  if path.suffix.lower() in MIDI_SUFFIXES and path.is_file())
+
+
+def iter_midi_directory(midi_dir: str, env: MusicEnvironment,
+                        n_workers: Optional[int] = None) -> Iterator[Tuple[str, List[np.ndarray]]]:
+    # Streams (path, episodes) in file order, parsing across worker processes
+    paths = midi_paths(midi_dir)
+    if not paths:
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        yield from executor.map(_import_file, paths, [env.config()] * len(paths),
+                                chunksize=max(1, len(paths) // (4 * (n_workers or os.cpu_count() or 1))))
+
+
+class Corpus:
+    # Quantized episodes stored flat: episode i is actions[offsets[i]:offsets[i + 1]]
+    def __init__(self, actions: np.ndarray, offsets: np.ndarray, episode_sources: np.ndarray,
+                 sources: List[str], key: str = ''):
+        self.actions = actions
+        self.offsets = offsets
+        self.episode_sources = episode_sources
+        self.sources = sources
+        self.key = key
+
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.actions[self.offsets[index]:self.offsets[index + 1]]
+
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return (self[i] for i in range(len(self)))
+
+
+    @classmethod
+    def from_episodes(cls, imported: List[Tuple[str, List[np.ndarray]]], key: str = '') -> 'Corpus':
+        episodes = [episode for _, file_episodes in imported for episode in file_episodes]
+        lengths = [len(episode) for episode in episodes]
+        return cls(
+            np.concatenate(episodes) if episodes else np.zeros(0, dtype=np.int32),
+            np.r_[0, np.cumsum(lengths, dtype=np.int64)],
+            np.repeat(np.arange(len(imported)), [len(file_episodes) for _, file_episodes in imported]),
+            [path for path, _ in imported], key)
+
+
+    def save(self, filename: str):
+        # Written to a temporary file and renamed, so readers never see half a cache
+        directory = os.path.dirname(filename) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, actions=self.actions, offsets=self.offsets,
+                         episode_sources=self.episode_sources, sources=np.array(self.sources, dtype=str),
+                         key=np.array(self.key))
+            os.replace(temp_path, filename)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+    @classmethod
+    def load(cls, filename: str) -> 'Corpus':
+        with np.load(filename) as data:
+            return cls(data['actions'], data['offsets'], data['episode_sources'],
+                       data['sources'].tolist(), str(data['key']))
+
+
+def corpus_key(midi_dir: str, env: MusicEnvironment) -> str:
+    # Changes when a file is added, removed or modified, or the action space does
+    digest = hashlib.sha256(json.dumps(env.config(), sort_keys=True).encode())
+    for path in midi_paths(midi_dir):
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, midi_dir)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def load_corpus(midi_dir: str, env: MusicEnvironment, cache: Optional[str] = DEFAULT_CACHE,
+                n_workers: Optional[int] = None) -> Corpus:
+    # Reuses the cached corpus while the directory and environment are unchanged
+    key = corpus_key(midi_dir, env)
+    if cache is not None and os.path.exists(cache):
+        corpus = Corpus.load(cache)
+        if corpus.key == key:
+            return corpus
+
+    corpus = Corpus.from_episodes(list(iter_midi_directory(midi_dir, env, n_workers)), key)
+    if cache is not None:
+        corpus.save(cache)
+    return corpus
+
+
+def warm_start(env: MusicEnvironment, agent: QLearningAgent, corpus: Corpus, passes: int = 1) -> float:
+    # Replays corpus episodes through env.step and agent.update as if the agent
+    # had played them, seeding Q-values and good measure patterns. Episode
+    # counts and schedules are left alone. Returns the mean episode reward.
+    totals = []
+    for _ in range(passes):
+        for episode in corpus:
+            state = env.reset()
+            total_reward = 0.0
+            previous = None
+            for action in episode.tolist():
+                env_info = {
+                    'current_duration': env.action_to_note[previous].duration if previous is not None else None
+                }
+                next_state, reward, done, _ = env.step(action)
+                env_info['measure_complete'] = env._is_measure_complete()
+                agent.update(state, action, reward, next_state, done, env_info)
+                state, previous = next_state, action
+                total_reward += reward
+            totals.append(total_reward)
+    return float(np.mean(totals)) if totals else 0.0
+
+
+def compare_warm_start(corpus: Corpus, n_episodes: int = 400, threshold: float = 650.0,
+                       window: int = 50, passes: int = 1, seeds: List[int] = (0, 1, 2)) -> Dict[str, Dict]:
+    # Episodes-to-threshold and mean reward over the first window, for cold
+    # agents and agents warm-started from corpus
+    from .planning import episodes_to_threshold
+    from .train import train_agent
+
+    results = {}
+    for name in ('cold', 'warm'):
+        reached, first = [], []
+        for seed in seeds:
+            random.seed(seed)
+            np.random.seed(seed)
+            env = MusicEnvironment()
+            agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+            if name == 'warm':
+                warm_start(env, agent, corpus, passes)
+            rewards = train_agent(env, agent, n_episodes=n_episodes, verbose=False)
+            reached.append(episodes_to_threshold(rewards, threshold, window))
+            first.append(float(np.mean(rewards[:window])))
+        results[name] = {'episodes_to_threshold': reached, 'first_window_mean': first}
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Import a MIDI corpus and measure warm-starting from it')
+    parser.add_argument('midi_dir')
+    parser.add_argument('--cache', default=DEFAULT_CACHE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--compare', action='store_true', help='train cold and warm agents')
+    parser.add_argument('--episodes', type=int, default=400)
+    parser.add_argument('--threshold', type=float, default=650.0)
+    parser.add_argument('--window', type=int, default=50)
+    parser.add_argument('--passes', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    env = MusicEnvironment()
+    start = time.perf_counter()
+    corpus = load_corpus(args.midi_dir, env, args.cache, args.workers)
+    print(f"{len(corpus)} episodes, {len(corpus.actions)} notes from {len(corpus.sources)} files "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    if args.compare:
+        results = compare_warm_start(corpus, args.episodes, args.threshold, args.window, args.passes)
+        print(f"\nEpisodes until the {args.window}-episode mean reward reaches {args.threshold}, "
+              f"and the mean reward of the first {args.window}:")
+        for name, result in results.items():
+            print(f"{name:6s} {result['episodes_to_threshold']}  {np.mean(result['first_window_mean']):.1f}")
+
+
+if __name__ == "__main__":
+    main()
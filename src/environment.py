@@ -1,6 +1,42 @@
-from typing import List, Tuple, Dict
+import numpy as np
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple, Dict, Optional, Sequence
 from dataclasses import dataclass
 from enum import Enum
+from .rhythm import RhythmAutomaton
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Pitch classes above the tonic
+SCALES = {
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+    'harmonic_minor': (0, 2, 3, 5, 7, 8, 11),
+    'dorian': (0, 2, 3, 5, 7, 9, 10),
+    'mixolydian': (0, 2, 4, 5, 7, 9, 10),
+    'major_pentatonic': (0, 2, 4, 7, 9),
+    'minor_pentatonic': (0, 3, 5, 7, 10),
+    'blues': (0, 3, 5, 6, 7, 10),
+    'chromatic': tuple(range(12))
+}
+
+
+@lru_cache(maxsize=None)
+def pitch_to_midi(pitch: str) -> int:
+    if pitch == 'START':
+        return 0
+
+    name = pitch.rstrip('-0123456789')
+    return PITCH_CLASSES.index(name) + (int(pitch[len(name):]) + 1) * 12
+
+
+@lru_cache(maxsize=None)
+def midi_to_pitch(midi: int) -> str:
+    if midi == 0:
+        return 'START'
+
+    return f"{PITCH_CLASSES[midi % 12]}{midi // 12 - 1}"
+
 
 class Duration(Enum):
     SIXTEENTH = 0.25  # 1/4 beat
@@ -17,10 +53,48 @@ class Note:
     def __str__(self):
         return f"{self.pitch}_{self.duration.name}"
 
+
+# Notes played so far, newest first, as nested (note, previous) pairs; step()
+# prepends in constant time and earlier heads stay valid
+NoteHistory = Optional[Tuple[Note, 'NoteHistory']]
+
+
+class EnvironmentSnapshot(NamedTuple):
+    # Everything step() reads or writes. The windows and note history are
+    # immutable and replaced rather than mutated, so taking and restoring a
+    # snapshot copies references only.
+    current_beat: float
+    current_measure: int
+    current_phrase: int
+    state: Tuple[Note, ...]
+    state_actions: Tuple[int, ...]
+    note_history: NoteHistory
+    measure_length: int
+    phrase_length: int
+    measure_history: int
+    phrase_history: int
+
 class MusicEnvironment:
-    def __init__(self):
-        # Notes in C major scale: C4 to C5
-        self.notes = ['C4', 'D4', 'E4', 'F4', 'G4', 'A4', 'B4', 'C5']
+    def __init__(self, state_includes_beat: bool = False, compiled_rewards: bool = True,
+                 scale: str = 'major', tonic: str = 'C', low: str = 'C4', high: str = 'C5',
+                 meter: Tuple[int, int] = (4, 4), measures_per_phrase: int = 4,
+                 num_phrases: int = 8, rhythm_patterns: Optional[Dict[str, Sequence]] = None):
+        # Scale notes from low to high inclusive; the default is C major, C4 to C5
+        if scale not in SCALES:
+            raise ValueError(f"Unknown scale: {scale}")
+        self.scale = scale
+        self.tonic = tonic
+        self.low = low
+        self.high = high
+        self.meter = tuple(meter)
+        
+        tonic_class = PITCH_CLASSES.index(tonic)
+        self.notes = [
+            midi_to_pitch(midi) for midi in range(pitch_to_midi(low), pitch_to_midi(high) + 1)
+            if (midi - tonic_class) % 12 in SCALES[scale]
+        ]
+        if not self.notes:
+            raise ValueError(f"No {tonic} {scale} notes between {low} and {high}")
         self.durations = list(Duration)
         
         self.n_actions = len(self.notes) * len(self.durations)
@@ -35,24 +109,82 @@ class MusicEnvironment:
                 self.note_to_action[str(note_obj)] = idx
                 idx += 1
         
-        self.beats_per_measure = 4
-        self.measures_per_phrase = 4    
-        self.num_phrases = 8     
+        # Beats are quarter notes, so 6/8 has 3 beats per measure
+        numerator, denominator = self.meter
+        self.beats_per_measure = numerator * 4 / denominator
+        if self.beats_per_measure * 4 != int(self.beats_per_measure * 4):
+            raise ValueError(f"Meter {numerator}/{denominator} is finer than a sixteenth note")
+        if self.beats_per_measure == int(self.beats_per_measure):
+            self.beats_per_measure = int(self.beats_per_measure)
+        self.measures_per_phrase = measures_per_phrase
+        self.num_phrases = num_phrases
         self.total_beats = self.beats_per_measure * self.measures_per_phrase * self.num_phrases
         
+        # Integer state encoding: last 3 actions in base (n_actions + 1), with
+        # n_actions standing in for START, optionally times the beat position
+        self.start_action = self.n_actions
+        self.window_size = 3
+        self.beat_positions = int(self.beats_per_measure * 4)
+        self.state_includes_beat = state_includes_beat
+        self.n_states = (self.n_actions + 1) ** self.window_size
+        if state_includes_beat:
+            self.n_states *= self.beat_positions
+        
+        # Valid actions for each sixteenth-note position within a measure
+        action_beats = np.array([self.action_to_note[a].duration.value for a in range(self.n_actions)])
+        offsets = np.arange(self.beat_positions) / 4
+        self.valid_action_masks = offsets[:, None] + action_beats[None, :] <= self.beats_per_measure
+        
         self.current_beat = 0.0
         self.current_measure = 0
         self.current_phrase = 0
-        self.state = [Note('START', Duration.QUARTER)] * 3
-        self.measure_notes = []
-        self.phrase_notes = []
+        self.state = (Note('START', Duration.QUARTER),) * 3
+        self.state_actions = (self.start_action,) * self.window_size
+        self.note_history: NoteHistory = None
+        self.measure_length = 0
+        self.phrase_length = 0
         
-        # Common rhythm patterns
+        # Common rhythm patterns, or a library given as Durations or their
+        # names, e.g. {'dotted': ['EIGHTH', 'SIXTEENTH', 'QUARTER']}
+        if rhythm_patterns is None:
+            rhythm_patterns = {
+                'basic': [Duration.QUARTER] * 4,
+                'waltz': [Duration.QUARTER, Duration.EIGHTH, Duration.EIGHTH],
+                'syncopated': [Duration.EIGHTH, Duration.QUARTER, Duration.EIGHTH],
+                'long_short': [Duration.HALF, Duration.QUARTER, Duration.QUARTER]
+            }
         self.rhythm_patterns = {
-            'basic': [Duration.QUARTER] * 4,
-            'waltz': [Duration.QUARTER, Duration.EIGHTH, Duration.EIGHTH],
-            'syncopated': [Duration.EIGHTH, Duration.QUARTER, Duration.EIGHTH],
-            'long_short': [Duration.HALF, Duration.QUARTER, Duration.QUARTER]
+            name: [d if isinstance(d, Duration) else Duration[d] for d in pattern]
+            for name, pattern in rhythm_patterns.items()
+        }
+        
+        # The final measure rewards the lowest tonic in range held for the
+        # longest duration that fits a measure (C4_WHOLE by default)
+        tonic_note = next((n for n in self.notes if n.rstrip('-0123456789') == tonic), self.notes[0])
+        cadence_duration = max((d for d in self.durations if d.value <= self.beats_per_measure),
+                               key=lambda d: d.value)
+        self.cadence_note = str(Note(tonic_note, cadence_duration))
+        
+        self.compiled_rewards = compiled_rewards
+        self._compile_reward_tables()
+        self.measure_history = self.empty_measure_history
+        self.phrase_history = self.empty_phrase_history
+    
+
+    def config(self) -> Dict:
+        # Constructor arguments; MusicEnvironment(**env.config()) rebuilds it
+        return {
+            'state_includes_beat': self.state_includes_beat,
+            'compiled_rewards': self.compiled_rewards,
+            'scale': self.scale,
+            'tonic': self.tonic,
+            'low': self.low,
+            'high': self.high,
+            'meter': list(self.meter),
+            'measures_per_phrase': self.measures_per_phrase,
+            'num_phrases': self.num_phrases,
+            'rhythm_patterns': {name: [d.name for d in pattern]
+                                for name, pattern in self.rhythm_patterns.items()}
         }
     
 
@@ -78,8 +210,8 @@ class MusicEnvironment:
             reward -= 5
             
         # Reward for rhythmic variety within measure
-        if self.measure_notes:
-            last_duration = self.measure_notes[-1].duration
+        if self.measure_length:
+            last_duration = self.note_history[0].duration
 
             if note.duration != last_duration:
                 reward += 0.5
@@ -115,8 +247,8 @@ class MusicEnvironment:
             if interval >= 4 and note.duration in [Duration.HALF, Duration.WHOLE]:
                 reward += 1
         
-        if len(self.phrase_notes) >= 2:
-            if note.pitch == self.phrase_notes[-1].pitch == self.phrase_notes[-2].pitch:
+        if self.phrase_length >= 2:
+            if note.pitch == self.note_history[0].pitch == self.note_history[1][0].pitch:
                 reward -= 8
                 
         return reward
@@ -129,54 +261,204 @@ class MusicEnvironment:
         reward = rhythm_reward + melodic_reward
         
         if self.current_beat >= self.total_beats - self.beats_per_measure:
-            if note.pitch == 'C4' and note.duration == Duration.WHOLE:
+            if str(note) == self.cadence_note:
                 reward += 5
         
         return reward
     
 
+    def _compile_reward_tables(self):
+        # Precomputes every term of _calculate_reward over its discrete context
+        # so a step is scored with a handful of table lookups. Rewards are sums
+        # of halves, so the compiled path matches the reference exactly.
+        n_durations = len(self.durations)
+        n_pitches = len(self.notes)
+        
+        notes = [self.action_to_note[a] for a in range(self.n_actions)]
+        self.action_pitch = np.array([self.notes.index(n.pitch) for n in notes])
+        self.action_duration = np.array([self.durations.index(n.duration) for n in notes])
+        self.action_beats = np.array([n.duration.value for n in notes])
+        # Indexed by action, with START at index n_actions
+        self.action_midi = np.array([self._note_to_midi(n.pitch) for n in notes] + [0])
+        
+        long_note = np.isin(self.action_duration, [
+            self.durations.index(Duration.HALF), self.durations.index(Duration.WHOLE)])
+        short_note = np.isin(self.action_duration, [
+            self.durations.index(Duration.EIGHTH), self.durations.index(Duration.SIXTEENTH)])
+        
+        # Measure timing, by beat position and action
+        self.timing_rewards = np.where(self.valid_action_masks, 1.0, -5.0)
+        
+        # Variety and pattern rewards, by the measure's rhythm automaton state
+        # and the new duration. The automaton restarts at its root each
+        # measure, so its size, not the pattern count, bounds the table.
+        self.rhythm_automaton = RhythmAutomaton(
+            {name: [self.durations.index(d) for d in pattern]
+             for name, pattern in self.rhythm_patterns.items()},
+            n_durations, weight=2.0)
+        self.rhythm_transitions = self.rhythm_automaton.transitions
+        self.empty_measure_history = self.rhythm_automaton.ROOT
+        
+        last_duration = self.rhythm_automaton.last_codes[:, None]
+        self.measure_rewards = (
+            np.where((last_duration >= 0) & (last_duration != np.arange(n_durations)[None, :]), 0.5, 0.0)
+            + self.rhythm_automaton.rewards[self.rhythm_transitions])
+        
+        self.phrase_end_rewards = np.where(long_note, 2.0, 0.0)
+        
+        # Interval rewards, by previous action (or START) and action
+        interval = np.abs(self.action_midi[:, None] - self.action_midi[None, :self.n_actions])
+        has_previous = (np.arange(self.n_actions + 1) != self.start_action)[:, None]
+        self.melodic_rewards = (
+            np.where(has_previous & (interval <= 2) & short_note[None, :], 1.0, 0.0)
+            + np.where(has_previous & (interval >= 4) & long_note[None, :], 1.0, 0.0))
+        
+        # Repeated-pitch penalty, by the last two phrase pitches and pitch
+        self.phrase_history_base = n_pitches + 1
+        self.empty_phrase_history = self.phrase_history_base ** 2 - 1
+        second_last, last = np.divmod(np.arange(self.phrase_history_base ** 2), self.phrase_history_base)
+        pitches = np.arange(n_pitches)[None, :]
+        self.repeat_rewards = np.where(
+            (second_last[:, None] == pitches) & (last[:, None] == pitches), -8.0, 0.0)
+        
+        self.cadence_rewards = np.zeros(self.n_actions)
+        self.cadence_rewards[self.note_to_action[self.cadence_note]] = 5.0
+        
+        # Nested-list copies for the scalar step path, where list indexing is
+        # several times cheaper than NumPy scalar indexing
+        self._action_duration = self.action_duration.tolist()
+        self._action_pitch = self.action_pitch.tolist()
+        self._timing_rewards = self.timing_rewards.tolist()
+        self._measure_rewards = self.measure_rewards.tolist()
+        self._rhythm_transitions = self.rhythm_transitions.tolist()
+        self._phrase_end_rewards = self.phrase_end_rewards.tolist()
+        self._melodic_rewards = self.melodic_rewards.tolist()
+        self._repeat_rewards = self.repeat_rewards.tolist()
+        self._cadence_rewards = self.cadence_rewards.tolist()
+    
+
+    def _compiled_reward(self, action: int) -> float:
+        reward = (self._timing_rewards[self._beat_position()][action]
+                  + self._measure_rewards[self.measure_history][self._action_duration[action]]
+                  + self._melodic_rewards[self.state_actions[-1]][action]
+                  + self._repeat_rewards[self.phrase_history][self._action_pitch[action]])
+        
+        if self._is_phrase_complete():
+            reward += self._phrase_end_rewards[action]
+        
+        if self.current_beat >= self.total_beats - self.beats_per_measure:
+            reward += self._cadence_rewards[action]
+        
+        return reward
+    
+
     def _note_to_midi(self, note: str) -> int:
-        if note == 'START':
-            return 0
+        return pitch_to_midi(note)
+    
+
+    def _beat_position(self) -> int:
+        return int((self.current_beat % self.beats_per_measure) * 4)
+    
+
+    def valid_actions(self) -> np.ndarray:
+        return self.valid_action_masks[self._beat_position()]
+    
+
+    def encode_state(self) -> int:
+        base = self.n_actions + 1
+        index = 0
+        for action in self.state_actions:
+            index = index * base + action
+        
+        if self.state_includes_beat:
+            index = index * self.beat_positions + self._beat_position()
         
-        base_notes = {'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71}
-        note_name = note[0]
-        octave = int(note[-1])
+        return index
+    
+
+    def state_key(self) -> str:
+        # Legacy string state, kept for QLearningAgent's string-keyed path;
+        # formatted as a list, as saved legacy tables were keyed
+        return str(list(self.state))
+    
+
+    def _recent_notes(self, count: int) -> Tuple[Note, ...]:
+        notes, cell = [], self.note_history
+        for _ in range(count):
+            note, cell = cell
+            notes.append(note)
+        return tuple(reversed(notes))
+    
 
-        return base_notes[note_name] + (octave - 4) * 12
+    @property
+    def measure_notes(self) -> Tuple[Note, ...]:
+        return self._recent_notes(self.measure_length)
     
+
+    @property
+    def phrase_notes(self) -> Tuple[Note, ...]:
+        return self._recent_notes(self.phrase_length)
     
-    def reset(self) -> str:
+
+    def snapshot(self) -> EnvironmentSnapshot:
+        return EnvironmentSnapshot(self.current_beat, self.current_measure, self.current_phrase,
+                                   self.state, self.state_actions, self.note_history, self.measure_length,
+                                   self.phrase_length, self.measure_history, self.phrase_history)
+    
+
+    def restore(self, snapshot: EnvironmentSnapshot) -> int:
+        (self.current_beat, self.current_measure, self.current_phrase, self.state,
+         self.state_actions, self.note_history, self.measure_length, self.phrase_length,
+         self.measure_history, self.phrase_history) = snapshot
+        
+        return self.encode_state()
+    
+    
+    def reset(self) -> int:
         self.current_beat = 0.0
         self.current_measure = 0
         self.current_phrase = 0
-        self.state = [Note('START', Duration.QUARTER)] * 3
-        self.measure_notes = []
-        self.phrase_notes = []
+        self.state = (Note('START', Duration.QUARTER),) * 3
+        self.state_actions = (self.start_action,) * self.window_size
+        self.note_history = None
+        self.measure_length = 0
+        self.phrase_length = 0
+        self.measure_history = self.empty_measure_history
+        self.phrase_history = self.empty_phrase_history
 
-        return str(self.state)
+        return self.encode_state()
     
 
-    def step(self, action: int) -> Tuple[str, float, bool, Dict]:
+    def step(self, action: int) -> Tuple[int, float, bool, Dict]:
         note = self.action_to_note[action]
         
-        reward = self._calculate_reward(note)
+        if self.compiled_rewards:
+            reward = self._compiled_reward(action)
+        else:
+            reward = self._calculate_reward(note)
         
         self.current_beat += note.duration.value
         if self._is_measure_complete():
             self.current_measure += 1
-            self.measure_notes = []
+            self.measure_length = 0
+            self.measure_history = self.empty_measure_history
         if self._is_phrase_complete():
             self.current_phrase += 1
-            self.phrase_notes = []
+            self.phrase_length = 0
+            self.phrase_history = self.empty_phrase_history
 
-        self.state = self.state[1:] + [note]
-        self.measure_notes.append(note)
-        self.phrase_notes.append(note)
+        self.state = self.state[1:] + (note,)
+        self.state_actions = self.state_actions[1:] + (int(action),)
+        self.note_history = (note, self.note_history)
+        self.measure_length += 1
+        self.phrase_length += 1
+        self.measure_history = self._rhythm_transitions[self.measure_history][self._action_duration[action]]
+        self.phrase_history = ((self.phrase_history % self.phrase_history_base)
+                               * self.phrase_history_base + self._action_pitch[action])
         
         done = self.current_beat >= self.total_beats
         
-        return str(self.state), reward, done, {
+        return self.encode_state(), reward, done, {
             'current_beat': self.current_beat,
             'current_measure': self.current_measure,
             'measure_complete': self._is_measure_complete()
@@ -0,0 +1,129 @@
+import numpy as np
+from typing import Iterator, List, Optional, Sequence, Union
+from .environment import Note, Duration, pitch_to_midi, midi_to_pitch
+
+DURATIONS = list(Duration)
+DURATION_CODES = {duration: code for code, duration in enumerate(DURATIONS)}
+DURATION_BEATS = np.array([duration.value for duration in DURATIONS])
+
+START_PITCH = 0
+
+
+class Melody:
+    # A melody as parallel uint8 arrays of MIDI pitch (0 for START) and
+    # duration code (index into Duration), with float32 onset beats. Behaves
+    # as a sequence of Note; slices and phrase/measure views share memory.
+    __slots__ = ('pitches', 'durations', 'onsets')
+
+    def __init__(self, pitches: np.ndarray, durations: np.ndarray,
+                 onsets: Optional[np.ndarray] = None):
+        self.pitches = np.asarray(pitches, dtype=np.uint8)
+        self.durations = np.asarray(durations, dtype=np.uint8)
+
+        if onsets is None:
+            beats = DURATION_BEATS[self.durations]
+            onsets = np.cumsum(beats) - beats
+        self.onsets = np.asarray(onsets, dtype=np.float32)
+
+
+    @classmethod
+    def from_notes(cls, notes: Sequence[Note]) -> 'Melody':
+        if isinstance(notes, Melody):
+            return notes
+
+        return cls(
+            np.fromiter((pitch_to_midi(note.pitch) for note in notes), dtype=np.uint8, count=len(notes)),
+            np.fromiter((DURATION_CODES[note.duration] for note in notes), dtype=np.uint8, count=len(notes))
+        )
+
+
+    @classmethod
+    def from_actions(cls, env, actions: Sequence[int]) -> 'Melody':
+        actions = np.asarray(actions, dtype=np.int64)
+        return cls(env.action_midi[actions], env.action_duration[actions])
+
+
+    def to_notes(self) -> List[Note]:
+        return [Note(midi_to_pitch(p), DURATIONS[d])
+                for p, d in zip(self.pitches.tolist(), self.durations.tolist())]
+
+
+    def beats(self) -> np.ndarray:
+        return DURATION_BEATS[self.durations]
+
+
+    def _end_beat(self) -> float:
+        # Absolute beat where the last note ends; slices keep their onsets
+        return float(self.onsets[-1]) + float(DURATION_BEATS[self.durations[-1]])
+
+
+    @property
+    def total_beats(self) -> float:
+        # Length of these notes, so a phrase or slice measures its own span
+        if not len(self):
+            return 0.0
+        return self._end_beat() - float(self.onsets[0])
+
+
+    def without_start(self) -> 'Melody':
+        keep = self.pitches != START_PITCH
+        if keep.all():
+            return self
+        return Melody(self.pitches[keep], self.durations[keep], self.onsets[keep])
+
+
+    def span(self, start_beat: float, end_beat: float) -> 'Melody':
+        # Zero-copy view of the notes whose onsets fall in [start_beat, end_beat)
+        start, end = np.searchsorted(self.onsets, [start_beat, end_beat], side='left')
+        return self[start:end]
+
+
+    def phrase(self, index: int, beats_per_phrase: float = 16) -> 'Melody':
+        return self.span(index * beats_per_phrase, (index + 1) * beats_per_phrase)
+
+
+    def measure(self, index: int, beats_per_measure: float = 4) -> 'Melody':
+        return self.span(index * beats_per_measure, (index + 1) * beats_per_measure)
+
+
+    def phrases(self, beats_per_phrase: float = 16) -> Iterator['Melody']:
+        end_beat = self._end_beat() if len(self) else 0.0
+        for index in range(int(np.ceil(end_beat / beats_per_phrase))):
+            yield self.phrase(index, beats_per_phrase)
+
+
+    def __len__(self) -> int:
+        return len(self.pitches)
+
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Note, 'Melody']:
+        if isinstance(index, slice):
+            return Melody(self.pitches[index], self.durations[index], self.onsets[index])
+        return Note(midi_to_pitch(int(self.pitches[index])), DURATIONS[self.durations[index]])
+
+
+    def __iter__(self) -> Iterator[Note]:
+        return iter(self.to_notes())
+
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Melody):
+            return (np.array_equal(self.pitches, other.pitches)
+                    and np.array_equal(self.durations, other.durations))
+        if isinstance(other, (list, tuple)):
+            return self.to_notes() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
+    def __repr__(self) -> str:
+        return f"Melody({len(self)} notes, {self.total_beats:g} beats)"
+
+
+    def __getstate__(self):
+        return self.pitches, self.durations, self.onsets
+
+
+    def __setstate__(self, state):
+        self.pitches, self.durations, self.onsets = state
@@ -0,0 +1,192 @@
+import os
+import random
+import struct
+import numpy as np
+from typing import BinaryIO, List, Optional, Tuple, Union
+from .environment import Note
+from .melody import Melody, DURATION_BEATS
+
+TICKS_PER_BEAT = 960
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+DRUM_CHANNEL = 9
+DRUM_VELOCITY = 25
+SWELL_STEPS = 8
+CHORD_TONES = (0, 4, 7)
+
+drum_to_midi = {
+    "kick": 36,
+    "snare": 38,  
+    "hihat_closed": 42, 
+    "hihat_open": 46    
+}
+
+drum_patt = {
+    "sync": [
+        ("kick", 0), ("hihat_closed", 0.5),
+        ("kick", 1), ("hihat_open", 1.25), ("snare", 1.75),
+        ("kick", 2), ("hihat_closed", 2.5), ("snare", 3.25)
+    ]
+}
+
+# (MIDI note, beat offset) for each hit of the pattern laid on every beat
+DRUM_HITS = np.array([(drum_to_midi[drum], offset) for drum, offset in drum_patt['sync']])
+
+
+def melody_note_events(melody: Union[Melody, List[Note]], seed: Optional[int] = None) -> Tuple[np.ndarray, ...]:
+    # The event model of save_melody_as_midi as parallel arrays in insertion
+    # order: (track, channel, pitch, start, duration, velocity), times in beats.
+    # Whole notes become 8-step swells on a major triad and, as in the original
+    # writer, do not advance time. One drum bar is laid on every beat.
+    rng = random.Random(seed) if seed is not None else random
+
+    notes = Melody.from_notes(melody).without_start()
+    pitches = notes.pitches.astype(np.int64)
+    durations = DURATION_BEATS[notes.durations].astype(np.float64)
+
+    swell = durations >= 4
+    advance = np.where(swell, 0.0, durations)
+    times = np.concatenate([[0.0], np.cumsum(advance)])
+    max_time = times[-1] if len(notes) else 0.0
+    times = times[:-1]
+
+    rising = np.zeros(len(notes), dtype=bool)
+    rising[swell] = [rng.random() < 0.3 for _ in range(int(swell.sum()))]
+
+    # Each melody note expands to 1 event, or 3 tones x 8 steps for a swell
+    sizes = np.where(swell, len(CHORD_TONES) * SWELL_STEPS, 1)
+    note_index = np.repeat(np.arange(len(notes)), sizes)
+    within = np.arange(len(note_index)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    is_swell = swell[note_index]
+    step = within % SWELL_STEPS
+
+    step_duration = durations[note_index] / SWELL_STEPS
+    start_velocity = np.where(rising[note_index], 60, 90)
+    velocity_step = (np.where(rising[note_index], 90, 30) - start_velocity) / SWELL_STEPS
+
+    melody_pitch = pitches[note_index] + np.where(
+        is_swell, np.array(CHORD_TONES)[within // SWELL_STEPS % len(CHORD_TONES)], 0)
+    melody_start = times[note_index] + np.where(is_swell, step * step_duration, 0.0)
+    melody_duration = np.where(is_swell, step_duration, durations[note_index])
+    melody_velocity = np.where(
+        is_swell,
+        (start_velocity + step * velocity_step).astype(np.int64),
+        np.where(durations[note_index] <= 1, 50, 100))
+
+    beats = np.arange(int(max_time), dtype=np.float64)
+    drum_pitch = np.tile(DRUM_HITS[:, 0].astype(np.int64), len(beats))
+    drum_start = (beats[:, None] + DRUM_HITS[None, :, 1]).ravel()
+
+    n_melody, n_drums = len(melody_pitch), len(drum_pitch)
+    return (
+        np.concatenate([np.zeros(n_melody, dtype=np.int64), np.ones(n_drums, dtype=np.int64)]),
+        np.concatenate([np.zeros(n_melody, dtype=np.int64), np.full(n_drums, DRUM_CHANNEL)]),
+        np.concatenate([melody_pitch, drum_pitch]),
+        np.concatenate([melody_start, drum_start]),
+        np.concatenate([melody_duration, np.full(n_drums, 0.25)]),
+        np.concatenate([melody_velocity, np.full(n_drums, DRUM_VELOCITY)])
+    )
+
+
+def _deinterleave(ticks: np.ndarray, is_on: np.ndarray, keys: np.ndarray, order: np.ndarray):
+    # midiutil's rule: a note-off arriving while more than one note-on of the
+    # same key is open is moved back to the most recent open note-on. Only
+    # keys whose nesting depth exceeds one need the stack walk.
+    by_key = order[np.argsort(keys[order], kind='stable')]
+    delta = np.where(is_on[by_key], 1, -1)
+    depth = np.cumsum(delta)
+    group_start = np.r_[True, keys[by_key][1:] != keys[by_key][:-1]]
+    group_offset = np.maximum.accumulate(np.where(group_start, np.arange(len(by_key)), 0))
+    depth_before = depth - delta - (depth[group_offset] - delta[group_offset])
+
+    nested = ~is_on[by_key] & (depth_before > 1)
+    for key in np.unique(keys[by_key][nested]):
+        stack = []
+        for event in order[keys[order] == key]:
+            if is_on[event]:
+                stack.append(ticks[event])
+            elif len(stack) > 1:
+                ticks[event] = stack.pop()
+            elif stack:
+                stack.pop()
+
+
+def _encode_track(status: np.ndarray, pitch: np.ndarray, velocity: np.ndarray,
+                  ticks: np.ndarray) -> bytes:
+    deltas = np.diff(ticks, prepend=0)
+    vlq_bytes = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    sizes = vlq_bytes + 3
+    offsets = np.cumsum(sizes) - sizes
+
+    buffer = np.zeros(int(sizes.sum()) + 4, dtype=np.uint8)
+    for byte in range(4):
+        has_byte = vlq_bytes > byte
+        shift = 7 * (vlq_bytes[has_byte] - 1 - byte)
+        continuation = np.where(byte < vlq_bytes[has_byte] - 1, 0x80, 0)
+        buffer[offsets[has_byte] + byte] = (deltas[has_byte] >> shift) & 0x7F | continuation
+    buffer[offsets + vlq_bytes] = status
+    buffer[offsets + vlq_bytes + 1] = pitch
+    buffer[offsets + vlq_bytes + 2] = velocity
+    buffer[-4:] = (0x00, 0xFF, 0x2F, 0x00)
+
+    return b'MTrk' + struct.pack('>L', len(buffer)) + buffer.tobytes()
+
+
+def _sort_keys(ticks: np.ndarray, is_on: np.ndarray, insertion: np.ndarray) -> np.ndarray:
+    return (ticks << 25) | (is_on.astype(np.int64) << 24) | insertion
+
+
+def _note_track(channel: np.ndarray, pitch: np.ndarray, start: np.ndarray,
+                duration: np.ndarray, velocity: np.ndarray) -> bytes:
+    # Matches midiutil's MIDITrack processing: note-on/off pairs, duplicate
+    # removal (first insertion wins), sorting by (tick, off-before-on,
+    # insertion order) and deinterleaving
+    n = len(pitch)
+    on_ticks = (start * TICKS_PER_BEAT).astype(np.int64)
+    off_ticks = on_ticks + (duration * TICKS_PER_BEAT).astype(np.int64)
+
+    ticks = np.concatenate([on_ticks, off_ticks])
+    is_on = np.r_[np.ones(n, dtype=bool), np.zeros(n, dtype=bool)]
+    insertion = np.tile(np.arange(n), 2)
+    channel, pitch, velocity = np.tile(channel, 2), np.tile(pitch, 2), np.tile(velocity, 2)
+    keys = pitch * 16 + channel
+
+    # Events are identified by (tick, on/off, key) and sorted by (tick,
+    # on/off, insertion); both pack into single int64 keys
+    _, first = np.unique((ticks << 12) | (is_on.astype(np.int64) << 11) | keys, return_index=True)
+
+    order = first[np.argsort(_sort_keys(ticks, is_on, insertion)[first])]
+    _deinterleave(ticks, is_on, keys, order)
+    order = order[np.argsort(_sort_keys(ticks, is_on, insertion)[order])]
+
+    status = np.where(is_on[order], NOTE_ON, NOTE_OFF) | channel[order]
+    return _encode_track(status, pitch[order], velocity[order], ticks[order])
+
+
+def encode_melody_midi(melody: List[Note], tempo: int = 120, seed: Optional[int] = None) -> bytes:
+    track, channel, pitch, start, duration, velocity = melody_note_events(melody, seed)
+
+    # Format 1 with a tempo track, as midiutil's MIDIFile(2) writes
+    header = b'MThd' + struct.pack('>LHHH', 6, 1, 3, TICKS_PER_BEAT)
+    tempo_track = (b'MTrk' + struct.pack('>L', 11) + b'\x00\xff\x51\x03'
+                   + struct.pack('>L', int(60000000 / tempo))[1:] + b'\x00\xff\x2f\x00')
+
+    tracks = [
+        _note_track(channel[track == i], pitch[track == i], start[track == i],
+                    duration[track == i], velocity[track == i])
+        for i in range(2)
+    ]
+
+    return header + tempo_track + b''.join(tracks)
+
+
+def write_melody_midi(melody: List[Note], file: Union[str, BinaryIO], tempo: int = 120,
+                      seed: Optional[int] = None):
+    data = encode_melody_midi(melody, tempo, seed)
+
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'wb') as f:
+            f.write(data)
+    else:
+        file.write(data)
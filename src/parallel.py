@@ -0,0 +1,189 @@
+import argparse
+import copy
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+from .environment import MusicEnvironment
+from .agent import QLearningAgent
+from .callbacks import TrainingCallback
+from .schedules import RandomDecay
+from .train import train_agent, _check_trainable
+
+
+class _StepCounter(TrainingCallback):
+    # Untimed, so counting does not add clock reads to the steps it counts
+    timed = False
+
+    def __init__(self):
+        self.steps = 0
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        self.steps += metrics['steps']
+
+
+def _train_worker(shm_name: str, shape: Tuple[int, int], dtype: str, env_config: Dict,
+                  template: QLearningAgent, n_episodes: int, n_envs: int,
+                  seed: np.random.SeedSequence, epsilon: Optional[float]) -> Dict:
+    # Runs in a worker process: its own environment and agent state (epsilon,
+    # schedules, patterns), with the Q-table rows read and written in place
+    # in shared memory without locks
+    shm = shared_memory.SharedMemory(name=shm_name)
+    agent = template
+    try:
+        env = MusicEnvironment(**env_config)
+        agent.q_table = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        rng_seed, *schedule_seeds = seed.spawn(3)
+        agent.rng = np.random.default_rng(rng_seed)
+        if epsilon is not None:
+            agent.epsilon = epsilon
+
+        # Random decays get a seed of their own so workers do not explore in
+        # lockstep; the caller's agent keeps its schedules for resuming
+        for name, schedule_seed in zip(('epsilon_schedule', 'lr_schedule'), schedule_seeds):
+            schedule = getattr(agent, name)
+            if isinstance(schedule, RandomDecay):
+                setattr(agent, name, RandomDecay(schedule.low, schedule.high, schedule.minimum,
+                                                 seed=int(schedule_seed.generate_state(1)[0])))
+
+        counter = _StepCounter()
+        start = time.perf_counter()
+        rewards = train_agent(env, agent, n_episodes=n_episodes, n_envs=n_envs,
+                              verbose=False, callbacks=[counter])
+        seconds = time.perf_counter() - start
+
+        return {
+            'rewards': rewards,
+            'steps': counter.steps,
+            'seconds': seconds,
+            'epsilon': agent.epsilon,
+            'learning_rate': agent.lr,
+            'patterns': agent.good_patterns.to_list()
+        }
+    finally:
+        # Views must go before close(); if a failed run's traceback still
+        # holds rows, the BufferError must not hide the original error
+        agent.q_table = None
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+def train_parallel(env: MusicEnvironment, agent: QLearningAgent, n_episodes: int = 2000,
+                   n_workers: Optional[int] = None, n_envs: int = 1, seed: int = 0,
+                   epsilons: Optional[Sequence[float]] = None) -> Dict:
+    # Hogwild training: n_workers processes each run their own environment
+    # and apply updates to one dense Q-table in shared memory, unlocked.
+    # Episodes are split evenly; each worker keeps its own epsilon (optionally
+    # a per-worker start from epsilons) and schedules. Afterwards the agent
+    # holds the shared table, every worker's patterns, the total episode
+    # count and the workers' mean epsilon and learning rate.
+    _check_trainable(agent)
+    if not isinstance(agent.q_table, np.ndarray):
+        raise ValueError("Parallel training needs a dense Q-table")
+    n_workers = n_workers or os.cpu_count() or 1
+    if epsilons is not None and len(epsilons) != n_workers:
+        raise ValueError(f"Expected {n_workers} epsilons, got {len(epsilons)}")
+
+    shape, dtype = agent.q_table.shape, agent.q_table.dtype
+    shm = shared_memory.SharedMemory(create=True, size=agent.q_table.nbytes)
+    try:
+        q_table = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        q_table[:] = agent.q_table
+
+        # Workers get the agent without its table or exploration RNG
+        template = copy.copy(agent)
+        template.q_table = None
+        template.rng = None
+
+        episodes = [n_episodes // n_workers + (w < n_episodes % n_workers) for w in range(n_workers)]
+        seeds = np.random.SeedSequence(seed).spawn(n_workers)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(
+                _train_worker, [shm.name] * n_workers, [shape] * n_workers, [dtype.name] * n_workers,
+                [env.config()] * n_workers, [template] * n_workers, episodes, [n_envs] * n_workers,
+                seeds, epsilons if epsilons is not None else [None] * n_workers))
+        seconds = time.perf_counter() - start
+
+        agent.q_table[:] = q_table
+    finally:
+        q_table = None
+        shm.close()
+        shm.unlink()
+
+    # Workers started from the agent's patterns, so only their gains are added
+    known = dict(agent.good_patterns.to_list())
+    for result in results:
+        for pattern, reward in result['patterns']:
+            gain = reward - known.get(pattern, 0.0)
+            if gain > 0:
+                agent.good_patterns.add(pattern, gain)
+    agent.episodes_trained += sum(episodes)
+    agent.epsilon = float(np.mean([result['epsilon'] for result in results]))
+    agent.lr = float(np.mean([result['learning_rate'] for result in results]))
+
+    steps = sum(result['steps'] for result in results)
+    return {
+        'workers': n_workers,
+        'episodes': sum(episodes),
+        'steps': steps,
+        'seconds': seconds,
+        'steps_per_sec': steps / seconds,
+        'worker_steps_per_sec': [result['steps'] / result['seconds'] for result in results],
+        'worker_rewards': [result['rewards'] for result in results],
+        'worker_epsilons': [result['epsilon'] for result in results]
+    }
+
+
+def scaling_report(worker_counts: Sequence[int], episodes_per_worker: int = 200, n_envs: int = 1,
+                   seed: int = 0, env_config: Optional[Dict] = None) -> List[Dict]:
+    # Weak scaling: every worker count trains a fresh agent for
+    # episodes_per_worker episodes per worker
+    report = []
+    for n_workers in worker_counts:
+        env = MusicEnvironment(**(env_config or {}))
+        agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+        stats = train_parallel(env, agent, n_episodes=episodes_per_worker * n_workers,
+                               n_workers=n_workers, n_envs=n_envs, seed=seed)
+        rewards = np.concatenate(stats['worker_rewards'])
+        report.append({
+            'workers': n_workers,
+            'steps_per_sec': stats['steps_per_sec'],
+            'speedup': stats['steps_per_sec'] / report[0]['steps_per_sec'] if report else 1.0,
+            'final_mean_reward': float(np.mean([np.mean(r[-max(1, len(r) // 10):])
+                                                for r in stats['worker_rewards']])),
+            'mean_reward': float(rewards.mean())
+        })
+    return report
+
+
+def print_scaling(report: List[Dict]):
+    base_workers = report[0]['workers']
+    print(f"\n{'workers':>8} {'steps/s':>12} {'speedup':>8} {'efficiency':>10} {'final reward':>13}")
+    for row in report:
+        efficiency = row['speedup'] * base_workers / row['workers']
+        print(f"{row['workers']:>8} {row['steps_per_sec']:>12,.0f} {row['speedup']:>7.2f}x "
+              f"{efficiency:>9.0%} {row['final_mean_reward']:>13.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Measure how shared-memory parallel training scales')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--episodes', type=int, default=200, help='episodes per worker')
+    parser.add_argument('--n-envs', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs")
+    print_scaling(scaling_report(args.workers, args.episodes, args.n_envs, args.seed))
+
+
+if __name__ == "__main__":
+    main()
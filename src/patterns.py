@@ -0,0 +1,185 @@
+import heapq
+import numpy as np
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+Pattern = Tuple[Tuple[int, object], ...]
+
+
+class _FenwickTree:
+    # Prefix sums over slot weights for O(log n) update and weighted lookup
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0.0] * (size + 1)
+
+
+    def add(self, index: int, delta: float):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+
+    def find(self, value: float) -> int:
+        # Smallest slot whose prefix sum exceeds value
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = index + step
+            if nxt <= self.size and self.tree[nxt] <= value:
+                index = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return index
+
+
+class PatternStore:
+    # Good measure patterns for replay: hashed O(1) dedup, a fixed capacity
+    # with O(log n) eviction by lowest accumulated reward ('reward') or least
+    # recently replayed ('lru'), and uniform or O(log n) reward-weighted
+    # sampling.
+    def __init__(self, capacity: Optional[int] = 10000, eviction: str = 'reward',
+                 weighted: bool = False):
+        if eviction not in ('reward', 'lru'):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Pattern capacity must be at least 1 or None, got {capacity}")
+
+        self.capacity = capacity
+        self.eviction = eviction
+        self.weighted = weighted
+
+        self._slots: Dict[Hashable, int] = {}
+        self._patterns: List[Pattern] = []
+        allocated = capacity if capacity is not None else 1024
+        self._rewards = np.zeros(allocated)
+        self._last_used = np.zeros(allocated, dtype=np.int64)
+        self._weights = _FenwickTree(allocated)
+        self._total = 0.0
+        self._clock = 0
+
+        # Lazy min-heap of (eviction key, slot, version); an entry is stale
+        # once its slot has been pushed again, and is dropped when it surfaces
+        self._heap: List[Tuple[float, int, int]] = []
+        self._versions: Dict[int, int] = {}
+
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+
+    def __bool__(self) -> bool:
+        return bool(self._patterns)
+
+
+    def __contains__(self, pattern: Sequence) -> bool:
+        return tuple(pattern) in self._slots
+
+
+    def __iter__(self) -> Iterator[Pattern]:
+        return iter(self._patterns)
+
+
+    def __getitem__(self, index: int) -> Pattern:
+        return self._patterns[index]
+
+
+    def reward(self, pattern: Sequence) -> float:
+        return float(self._rewards[self._slots[tuple(pattern)]])
+
+
+    def rewards(self) -> np.ndarray:
+        return self._rewards[:len(self._patterns)].copy()
+
+
+    def _grow(self):
+        allocated = len(self._rewards) * 2
+        self._rewards = np.resize(self._rewards, allocated)
+        self._last_used = np.resize(self._last_used, allocated)
+
+        weights = _FenwickTree(allocated)
+        for slot, reward in enumerate(self._rewards[:len(self._patterns)]):
+            weights.add(slot, float(reward))
+        self._weights = weights
+
+
+    def _eviction_key(self, slot: int) -> float:
+        if self.eviction == 'reward':
+            return float(self._rewards[slot])
+        return float(self._last_used[slot])
+
+
+    def _push(self, slot: int):
+        # Only bounded stores evict, so unbounded ones skip the bookkeeping
+        if self.capacity is None:
+            return
+        self._versions[slot] = version = self._versions.get(slot, 0) + 1
+        heapq.heappush(self._heap, (self._eviction_key(slot), slot, version))
+
+        # Rebuild once stale entries dominate so the heap stays O(capacity)
+        if len(self._heap) > 2 * len(self._patterns) + 64:
+            self._heap = [(self._eviction_key(slot), slot, self._versions[slot])
+                          for slot in range(len(self._patterns))]
+            heapq.heapify(self._heap)
+
+
+    def _victim(self) -> int:
+        # Ties go to the lowest slot, as np.argmin would
+        while True:
+            _, slot, version = self._heap[0]
+            if self._versions[slot] == version:
+                return slot
+            heapq.heappop(self._heap)
+
+
+    def add(self, pattern: Sequence, reward: float) -> bool:
+        # Returns True when the pattern is new; repeats accumulate reward
+        key = tuple(pattern)
+        reward = float(reward)
+        self._clock += 1
+
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._rewards[slot] += reward
+            self._weights.add(slot, reward)
+            self._total += reward
+            if self.eviction == 'reward':
+                self._push(slot)
+            return False
+
+        if self.capacity is not None and len(self._patterns) >= self.capacity:
+            slot = self._victim()
+            del self._slots[self._patterns[slot]]
+            self._weights.add(slot, -float(self._rewards[slot]))
+            self._total -= float(self._rewards[slot])
+            self._patterns[slot] = key
+        else:
+            if len(self._patterns) == len(self._rewards):
+                self._grow()
+            slot = len(self._patterns)
+            self._patterns.append(key)
+
+        self._slots[key] = slot
+        self._rewards[slot] = reward
+        self._last_used[slot] = self._clock
+        self._weights.add(slot, reward)
+        self._total += reward
+        self._push(slot)
+        return True
+
+
+    def sample(self, rng=np.random) -> Pattern:
+        # rng may be the np.random module or a Generator
+        if self.weighted:
+            slot = min(self._weights.find(rng.random() * self._total), len(self._patterns) - 1)
+        else:
+            slot = int(rng.random() * len(self._patterns))
+
+        self._clock += 1
+        self._last_used[slot] = self._clock
+        if self.eviction == 'lru':
+            self._push(slot)
+        return self._patterns[slot]
+
+
+    def to_list(self) -> List[Tuple[Pattern, float]]:
+        return [(pattern, float(self._rewards[slot])) for slot, pattern in enumerate(self._patterns)]
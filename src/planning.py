@@ -0,0 +1,267 @@
+import argparse
+import heapq
+import random
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from .environment import MusicEnvironment
+from .agent import QLearningAgent, State
+from .callbacks import TrainingCallback
+from .train import train_agent
+
+
+class TransitionModel:
+    # Observed transitions keyed by (state, action): summed reward, visit
+    # count, how often the step ended the episode, and the latest next state.
+    # Rewards depend on more history than the state holds, so the model keeps
+    # means rather than the last sample. Predecessor slots per state let
+    # prioritized sweeping walk backwards from a changed state.
+    def __init__(self, n_actions: int, initial_capacity: int = 1024):
+        self.n_actions = n_actions
+        self._slots: Dict[int, int] = {}
+        self._predecessors: Dict[int, List[int]] = {}
+
+        self.states = np.zeros(initial_capacity, dtype=np.int64)
+        self.actions = np.zeros(initial_capacity, dtype=np.int64)
+        self.next_states = np.zeros(initial_capacity, dtype=np.int64)
+        self.reward_sums = np.zeros(initial_capacity)
+        self.counts = np.zeros(initial_capacity, dtype=np.int64)
+        self.done_counts = np.zeros(initial_capacity, dtype=np.int64)
+
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.states, self.actions, self.next_states,
+                                      self.reward_sums, self.counts, self.done_counts))
+
+
+    def _grow(self):
+        size = len(self.states) * 2
+        for name in ('states', 'actions', 'next_states', 'reward_sums', 'counts', 'done_counts'):
+            setattr(self, name, np.resize(getattr(self, name), size))
+
+
+    def observe(self, state: int, action: int, reward: float, next_state: int, done: bool) -> int:
+        key = state * self.n_actions + action
+        slot = self._slots.get(key)
+
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self.states):
+                self._grow()
+            self._slots[key] = slot
+            self.states[slot] = state
+            self.actions[slot] = action
+            self.reward_sums[slot] = 0.0
+            self.counts[slot] = 0
+            self.done_counts[slot] = 0
+        elif self.next_states[slot] != next_state:
+            self._predecessors[int(self.next_states[slot])].remove(slot)
+
+        if self.counts[slot] == 0 or self.next_states[slot] != next_state:
+            self._predecessors.setdefault(next_state, []).append(slot)
+
+        self.next_states[slot] = next_state
+        self.reward_sums[slot] += reward
+        self.counts[slot] += 1
+        self.done_counts[slot] += done
+        return slot
+
+
+    def predecessors(self, state: int) -> np.ndarray:
+        return np.array(self._predecessors.get(state, ()), dtype=np.int64)
+
+
+    def expected_rewards(self, slots) -> np.ndarray:
+        return self.reward_sums[slots] / self.counts[slots]
+
+
+    def continue_probs(self, slots) -> np.ndarray:
+        return 1.0 - self.done_counts[slots] / self.counts[slots]
+
+
+class PlanningAgent(QLearningAgent):
+    # Q-learning plus model-based planning: after each real backup the
+    # transition is recorded and planning_steps simulated backups follow.
+    # 'prioritized' pops the (state, action) with the largest TD error and
+    # queues its predecessors whose error exceeds theta (prioritized
+    # sweeping); 'dyna' replays uniformly sampled observed pairs (Dyna-Q).
+    # Simulated backups use the expected model reward and continuation.
+    def __init__(self, n_actions: int, planning_steps: int = 10, mode: str = 'prioritized',
+                 theta: float = 1e-3, **kwargs):
+        if mode not in ('prioritized', 'dyna'):
+            raise ValueError(f"Unknown planning mode: {mode}")
+        super().__init__(n_actions, **kwargs)
+
+        self.planning_steps = planning_steps
+        self.mode = mode
+        self.theta = theta
+        self.model = TransitionModel(n_actions)
+        self.planning_backups = 0
+
+        self._queue: List = []
+        self._queued_priority: Dict[int, float] = {}
+        self._rng = np.random.default_rng(0)
+
+
+    def _targets(self, slots: np.ndarray) -> np.ndarray:
+        model = self.model
+        next_max_q = self.q_table[model.next_states[slots]].max(axis=1)
+        return model.expected_rewards(slots) + self.gamma * model.continue_probs(slots) * next_max_q
+
+
+    def _push(self, slots: np.ndarray):
+        if not len(slots):
+            return
+        priorities = np.abs(self._targets(slots) - self.q_table[self.model.states[slots],
+                                                               self.model.actions[slots]])
+        for slot, priority in zip(slots.tolist(), priorities.tolist()):
+            if priority > self.theta and priority > self._queued_priority.get(slot, 0.0):
+                self._queued_priority[slot] = priority
+                heapq.heappush(self._queue, (-priority, slot))
+
+
+    def _pop(self) -> Optional[int]:
+        while self._queue:
+            priority, slot = heapq.heappop(self._queue)
+            if self._queued_priority.get(slot) == -priority:
+                del self._queued_priority[slot]
+                return slot
+        return None
+
+
+    def _backup(self, slot: int):
+        model = self.model
+        count = model.counts[slot]
+        target = (model.reward_sums[slot] / count + self.gamma * (1.0 - model.done_counts[slot] / count)
+                  * self.q_table[model.next_states[slot]].max())
+        q_row = self._q_row(int(model.states[slot]))
+        action = int(model.actions[slot])
+        q_row[action] += self.lr * (target - q_row[action])
+        self.planning_backups += 1
+
+
+    def plan(self, slot: int):
+        if self.mode == 'dyna':
+            for sampled in self._rng.integers(0, len(self.model), size=self.planning_steps):
+                self._backup(int(sampled))
+            return
+
+        self._push(np.array([slot]))
+        for _ in range(self.planning_steps):
+            slot = self._pop()
+            if slot is None:
+                break
+            self._backup(slot)
+            self._push(self.model.predecessors(int(self.model.states[slot])))
+
+
+    def update(self, state: State, action: int, reward: float,
+               next_state: State, done: bool, env_info: Dict):
+        super().update(state, action, reward, next_state, done, env_info)
+        if not isinstance(state, str):
+            self.plan(self.model.observe(int(state), int(action), reward, int(next_state), done))
+
+
+    def update_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                     next_states: np.ndarray, dones: np.ndarray):
+        super().update_batch(states, actions, rewards, next_states, dones)
+        for transition in zip(states.tolist(), actions.tolist(), rewards.tolist(),
+                              next_states.tolist(), dones.tolist()):
+            self.plan(self.model.observe(*transition))
+
+
+class _EpisodeSteps(TrainingCallback):
+    # Real environment steps per episode, without per-step timing
+    timed = False
+
+    def __init__(self):
+        self.steps: List[int] = []
+
+
+    def on_episode_end(self, episode: int, metrics: Dict):
+        self.steps.append(metrics['steps'])
+
+
+def episodes_to_threshold(rewards: List[float], threshold: float, window: int = 20) -> Optional[int]:
+    # First episode (1-based count) whose trailing window mean reaches threshold
+    rewards = np.asarray(rewards, dtype=np.float64)
+    if len(rewards) < window:
+        return None
+    means = np.convolve(rewards, np.ones(window) / window, mode='valid')
+    reached = np.flatnonzero(means >= threshold)
+    return int(reached[0]) + window if len(reached) else None
+
+
+def compare_planning(n_episodes: int = 400, threshold: float = 650.0, window: int = 50,
+                     planning_steps: int = 10, mode: str = 'prioritized',
+                     seeds: List[int] = (0, 1, 2)) -> Dict[str, Dict]:
+    # Trains a plain and a planning agent from the same seeds and reports
+    # episodes and real environment steps needed to reach threshold
+    results = {}
+
+    for name in ('plain', mode):
+        reached, steps, seconds = [], [], []
+        for seed in seeds:
+            random.seed(seed)
+            np.random.seed(seed)
+            env = MusicEnvironment()
+            if name == 'plain':
+                agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+            else:
+                agent = PlanningAgent(env.n_actions, n_states=env.n_states,
+                                      planning_steps=planning_steps, mode=mode)
+
+            counter = _EpisodeSteps()
+            start = time.perf_counter()
+            rewards = train_agent(env, agent, n_episodes=n_episodes, verbose=False,
+                                  callbacks=[counter])
+            seconds.append(time.perf_counter() - start)
+
+            episodes = episodes_to_threshold(rewards, threshold, window)
+            reached.append(episodes)
+            # Real steps up to and including the episode that reached it
+            steps.append(sum(counter.steps[:episodes]) if episodes is not None else None)
+
+        results[name] = {'episodes_to_threshold': reached, 'env_steps_to_threshold': steps,
+                         'train_seconds': seconds}
+
+    return results
+
+
+def print_comparison(results: Dict[str, Dict], threshold: float, window: int):
+    # Means over the seeds that reached the threshold; planning trades wall
+    # time for fewer real environment steps, so both are shown
+    def mean(values):
+        hits = [value for value in values if value is not None]
+        return f"{np.mean(hits):,.0f}" if hits else "not reached"
+
+    print(f"\nUntil the {window}-episode mean reward reaches {threshold}:")
+    print(f"{'':12s} {'episodes':>12s} {'env steps':>12s} {'train time':>11s}  per seed (episodes)")
+    for name, result in results.items():
+        print(f"{name:12s} {mean(result['episodes_to_threshold']):>12s} "
+              f"{mean(result['env_steps_to_threshold']):>12s} "
+              f"{np.mean(result['train_seconds']):>10.1f}s  {result['episodes_to_threshold']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Compare plain Q-learning with model-based planning')
+    parser.add_argument('--episodes', type=int, default=400)
+    parser.add_argument('--threshold', type=float, default=650.0)
+    parser.add_argument('--window', type=int, default=50)
+    parser.add_argument('--planning-steps', type=int, default=10)
+    parser.add_argument('--mode', choices=['prioritized', 'dyna'], default='prioritized')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    args = parser.parse_args(argv)
+
+    results = compare_planning(args.episodes, args.threshold, args.window,
+                               args.planning_steps, args.mode, args.seeds)
+    print_comparison(results, args.threshold, args.window)
+
+
+if __name__ == "__main__":
+    main()
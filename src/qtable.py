@@ -0,0 +1,185 @@
+import numpy as np
+from typing import Dict, Tuple, Union
+
+# Estimated bookkeeping per stored state beyond its value row: the state id,
+# the access counter and the dict entry mapping state to slot
+ROW_OVERHEAD_BYTES = 8 + 4 + 100
+
+
+class SparseQTable:
+    # Q-values for visited states only, in a preallocated (capacity, n_actions)
+    # array of a compact dtype sized to fit max_bytes. Unvisited states read as
+    # zeros. When full, a new state evicts the least frequently used of
+    # sample_size randomly sampled states (approximate LFU); counters are
+    # halved every capacity insertions so old popularity fades.
+    def __init__(self, n_states: int, n_actions: int, max_bytes: int,
+                 dtype=np.float32, sample_size: int = 8, seed: int = 0):
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+
+        row_bytes = n_actions * self.dtype.itemsize + ROW_OVERHEAD_BYTES
+        self.capacity = max(1, min(max_bytes // row_bytes, n_states))
+
+        self.values = np.zeros((self.capacity, n_actions), dtype=self.dtype)
+        self.states = np.full(self.capacity, -1, dtype=np.int64)
+        self.counts = np.zeros(self.capacity, dtype=np.uint32)
+        self._slots: Dict[int, int] = {}
+        self._zeros = np.zeros(n_actions, dtype=self.dtype)
+        self._zeros.flags.writeable = False
+        self._rng = np.random.default_rng(seed)
+        self._inserts_since_aging = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.n_states, self.n_actions
+
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes + self.states.nbytes + self.counts.nbytes)
+
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+    def __contains__(self, state: int) -> bool:
+        return int(state) in self._slots
+
+
+    def _lookup(self, state: int) -> int:
+        slot = self._slots.get(state, -1)
+        if slot >= 0:
+            self.hits += 1
+            self.counts[slot] += 1
+        else:
+            self.misses += 1
+        return slot
+
+
+    def _victim(self) -> int:
+        candidates = self._rng.integers(0, self.capacity, size=self.sample_size)
+        return int(candidates[np.argmin(self.counts[candidates])])
+
+
+    def _insert(self, state: int) -> int:
+        if len(self._slots) < self.capacity:
+            slot = len(self._slots)
+        else:
+            slot = self._victim()
+            del self._slots[int(self.states[slot])]
+            self.evictions += 1
+
+            self._inserts_since_aging += 1
+            if self._inserts_since_aging >= self.capacity:
+                self.counts >>= 1
+                self._inserts_since_aging = 0
+
+        self._slots[state] = slot
+        self.states[slot] = state
+        self.values[slot] = 0
+        self.counts[slot] = 1
+        return slot
+
+
+    def row(self, state: int) -> np.ndarray:
+        # Writable view of a state's values, allocated on first use
+        state = int(state)
+        slot = self._lookup(state)
+        if slot < 0:
+            slot = self._insert(state)
+        return self.values[slot]
+
+
+    def _slots_for(self, states: np.ndarray) -> np.ndarray:
+        # Slot per state, -1 where unseen
+        return np.array([self._lookup(state) for state in np.asarray(states).tolist()],
+                        dtype=np.int64).reshape(np.shape(states))
+
+
+    def __getitem__(self, key) -> Union[np.ndarray, float]:
+        # table[state] -> row (read-only zeros if unseen), table[states] -> rows,
+        # table[states, actions] -> values; as for a dense (n_states, n_actions) array
+        if isinstance(key, tuple):
+            states, actions = key
+            if np.ndim(states) == 0:
+                return self[int(states)][actions]
+            slots = self._slots_for(states)
+            return np.where(slots >= 0, self.values[slots, actions], 0).astype(self.dtype)
+
+        if np.ndim(key) == 0:
+            slot = self._lookup(int(key))
+            return self.values[slot] if slot >= 0 else self._zeros
+
+        slots = self._slots_for(key)
+        return np.where((slots >= 0)[:, None], self.values[slots], 0).astype(self.dtype)
+
+
+    def __setitem__(self, key, value):
+        # Assignments apply in order, so duplicate indices keep the last write;
+        # each row is resolved as it is written so an eviction mid-batch
+        # cannot redirect a later write
+        if isinstance(key, tuple):
+            states, actions = key
+            if np.ndim(states) == 0:
+                self.row(states)[actions] = value
+                return
+            values = np.broadcast_to(np.asarray(value, dtype=self.dtype), np.shape(states))
+            for state, action, v in zip(np.asarray(states).tolist(), np.asarray(actions).tolist(),
+                                        values.tolist()):
+                self.row(state)[action] = v
+            return
+
+        if np.ndim(key) == 0:
+            self.row(key)[:] = value
+            return
+
+        values = np.broadcast_to(np.asarray(value, dtype=self.dtype), (len(key), self.n_actions))
+        for state, row in zip(np.asarray(key).tolist(), values):
+            self.row(state)[:] = row
+
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def stats(self) -> Dict:
+        return {
+            'states': len(self),
+            'capacity': self.capacity,
+            'nbytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evictions': self.evictions
+        }
+
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+    def items(self) -> Tuple[np.ndarray, np.ndarray]:
+        # (states, values) of the stored rows, for checkpoints
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        return self.states[slots], self.values[slots]
+
+
+    @classmethod
+    def from_items(cls, n_states: int, n_actions: int, max_bytes: int, states: np.ndarray,
+                   values: np.ndarray, dtype=None, **kwargs) -> 'SparseQTable':
+        table = cls(n_states, n_actions, max_bytes, dtype=dtype or values.dtype, **kwargs)
+        for state, row in zip(np.asarray(states).tolist(), values):
+            table.row(state)[:] = row
+        table.reset_stats()
+        return table
@@ -0,0 +1,227 @@
+import argparse
+import os
+import sys
+import time
+import wave
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from .environment import Note
+from .melody import Melody
+from .midi import melody_note_events, drum_to_midi, DRUM_CHANNEL
+
+SAMPLE_RATE = 22050
+
+# Melodic voice: harmonic amplitudes, attack, decay rate and release
+HARMONICS = (1.0, 0.3, 0.15)
+ATTACK_SECONDS = 0.01
+DECAY_RATE = 2.5
+RELEASE_SECONDS = 0.05
+VOICE_GAIN = 0.25
+DRUM_GAIN = 0.5
+
+# Largest (notes x samples) block synthesized at once
+MAX_BLOCK = 1 << 22
+
+Events = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+@lru_cache(maxsize=None)
+def drum_templates(sample_rate: int = SAMPLE_RATE) -> Dict[int, np.ndarray]:
+    # One-shot samples per General MIDI drum note; noise is seeded so renders
+    # are reproducible
+    rng = np.random.default_rng(0)
+
+    def t(seconds: float) -> np.ndarray:
+        return np.arange(int(seconds * sample_rate)) / sample_rate
+
+    kick_t = t(0.25)
+    kick_freq = 50 + 70 * np.exp(-kick_t * 30)
+    kick = np.sin(2 * np.pi * np.cumsum(kick_freq) / sample_rate) * np.exp(-kick_t * 12)
+
+    snare_t = t(0.2)
+    snare = (0.7 * rng.standard_normal(len(snare_t)) * np.exp(-snare_t * 25)
+             + 0.4 * np.sin(2 * np.pi * 180 * snare_t) * np.exp(-snare_t * 30))
+
+    def hat(seconds: float, decay: float) -> np.ndarray:
+        hat_t = t(seconds)
+        noise = np.diff(rng.standard_normal(len(hat_t) + 1))
+        return 0.35 * noise * np.exp(-hat_t * decay)
+
+    return {
+        drum_to_midi['kick']: kick.astype(np.float32),
+        drum_to_midi['snare']: snare.astype(np.float32),
+        drum_to_midi['hihat_closed']: hat(0.06, 80).astype(np.float32),
+        drum_to_midi['hihat_open']: hat(0.3, 12).astype(np.float32)
+    }
+
+
+def _scatter(out: np.ndarray, starts: np.ndarray, block: np.ndarray):
+    # Adds each row of block into out at its start sample, overlaps summing
+    index = starts[:, None] + np.arange(block.shape[1])[None, :]
+    inside = index < len(out)
+    out += np.bincount(index[inside], weights=block[inside], minlength=len(out))[:len(out)]
+
+
+def _render_voices(out: np.ndarray, pitch: np.ndarray, start: np.ndarray, length: np.ndarray,
+                   velocity: np.ndarray, sample_rate: int):
+    # Notes of equal length share one (notes x samples) oscillator block
+    release = int(RELEASE_SECONDS * sample_rate)
+    attack = max(int(ATTACK_SECONDS * sample_rate), 1)
+
+    for note_length in np.unique(length):
+        group = np.flatnonzero(length == note_length)
+        total = int(note_length) + release
+        t = np.arange(total) / sample_rate
+
+        envelope = np.minimum(np.arange(total) / attack, 1.0) * np.exp(-t * DECAY_RATE)
+        envelope *= np.clip((total - np.arange(total)) / release, 0.0, 1.0)
+        phase = 2 * np.pi * t
+
+        for chunk in np.array_split(group, max(1, len(group) * total // MAX_BLOCK + 1)):
+            if not len(chunk):
+                continue
+            freq = 440.0 * 2 ** ((pitch[chunk] - 69) / 12)
+            wave_block = sum(amp * np.sin(k * freq[:, None] * phase[None, :])
+                             for k, amp in enumerate(HARMONICS, start=1))
+            amplitude = VOICE_GAIN * velocity[chunk] / 127
+            _scatter(out, start[chunk], wave_block * envelope[None, :] * amplitude[:, None])
+
+
+def _render_drums(out: np.ndarray, pitch: np.ndarray, start: np.ndarray, velocity: np.ndarray,
+                  sample_rate: int):
+    templates = drum_templates(sample_rate)
+    fallback = templates[drum_to_midi['hihat_closed']]
+
+    for note in np.unique(pitch):
+        group = pitch == note
+        template = templates.get(int(note), fallback)
+        amplitude = DRUM_GAIN * velocity[group] / 127
+        _scatter(out, start[group], template[None, :] * amplitude[:, None])
+
+
+def render_events(channel: np.ndarray, pitch: np.ndarray, start: np.ndarray,
+                  duration: np.ndarray, velocity: np.ndarray,
+                  sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    # Mono float32 audio for note events with start and duration in seconds;
+    # channel 9 plays drum one-shots, every other channel the melodic voice
+    if not len(pitch):
+        return np.zeros(0, dtype=np.float32)
+
+    start_sample = np.round(np.asarray(start) * sample_rate).astype(np.int64)
+    length = np.maximum(np.round(np.asarray(duration) * sample_rate).astype(np.int64), 1)
+    velocity = np.asarray(velocity, dtype=np.float64)
+    pitch = np.asarray(pitch)
+    drums = np.asarray(channel) == DRUM_CHANNEL
+
+    tail = int(RELEASE_SECONDS * sample_rate)
+    if drums.any():
+        tail = max(tail, max(len(t) for t in drum_templates(sample_rate).values()))
+    out = np.zeros(int((start_sample + length).max()) + tail)
+
+    voices = ~drums
+    _render_voices(out, pitch[voices], start_sample[voices], length[voices], velocity[voices], sample_rate)
+    _render_drums(out, pitch[drums], start_sample[drums], velocity[drums], sample_rate)
+
+    return out.astype(np.float32)
+
+
+def render_melody(melody: Union[Melody, List[Note]], tempo: int = 120, seed: Optional[int] = None,
+                  sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    # Same notes, swells and drums as save_melody_as_midi with this seed
+    _, channel, pitch, start, duration, velocity = melody_note_events(melody, seed)
+    seconds_per_beat = 60.0 / tempo
+    return render_events(channel, pitch, start * seconds_per_beat, duration * seconds_per_beat,
+                         velocity, sample_rate)
+
+
+def midi_file_events(filename: Union[str, os.PathLike]) -> Events:
+    # (channel, pitch, start, duration, velocity) in seconds from a MIDI file;
+    # note-offs close the earliest open note of their channel and key
+    import mido
+
+    midi = mido.MidiFile(filename)
+    events = []
+    open_notes: Dict[Tuple[int, int], List[Tuple[float, int]]] = {}
+    now = 0.0
+
+    # Iterating a MidiFile merges its tracks and converts delta times to seconds
+    for message in midi:
+        now += message.time
+        if message.type == 'note_on' and message.velocity > 0:
+            open_notes.setdefault((message.channel, message.note), []).append((now, message.velocity))
+        elif message.type in ('note_on', 'note_off'):
+            pending = open_notes.get((message.channel, message.note))
+            if pending:
+                started, velocity = pending.pop(0)
+                events.append((message.channel, message.note, started, now - started, velocity))
+
+    if not events:
+        return tuple(np.zeros(0) for _ in range(5))
+    channel, pitch, start, duration, velocity = map(np.array, zip(*events))
+    return channel, pitch, start, duration, velocity
+
+
+def write_wav(filename: Union[str, os.PathLike], samples: np.ndarray,
+              sample_rate: int = SAMPLE_RATE, peak: float = 0.9):
+    # 16-bit mono PCM, scaled so the loudest sample reaches peak
+    loudest = float(np.abs(samples).max()) if len(samples) else 0.0
+    scale = peak / loudest if loudest > 0 else 1.0
+    pcm = np.clip(samples * scale * 32767, -32768, 32767).astype('<i2')
+
+    os.makedirs(os.path.dirname(os.fspath(filename)) or '.', exist_ok=True)
+    with wave.open(os.fspath(filename), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def render_midi_file(midi_path: str, wav_path: str, sample_rate: int = SAMPLE_RATE) -> float:
+    # Returns the rendered audio duration in seconds
+    samples = render_events(*midi_file_events(midi_path), sample_rate=sample_rate)
+    write_wav(wav_path, samples, sample_rate)
+    return len(samples) / sample_rate
+
+
+def render_directory(midi_dir: str, out_dir: Optional[str] = None, n_workers: Optional[int] = None,
+                     sample_rate: int = SAMPLE_RATE) -> List[Tuple[str, float]]:
+    # Renders every .mid in midi_dir to a .wav of the same name across worker
+    # processes; returns (wav path, audio seconds) in file name order
+    midi_paths = sorted(Path(midi_dir).glob('*.mid'))
+    out_dir = Path(out_dir) if out_dir is not None else Path(midi_dir)
+    wav_paths = [str(out_dir / (path.stem + '.wav')) for path in midi_paths]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        seconds = list(executor.map(render_midi_file, map(str, midi_paths), wav_paths,
+                                    [sample_rate] * len(midi_paths)))
+
+    return list(zip(wav_paths, seconds))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Render MIDI melodies to WAV without an audio device')
+    parser.add_argument('midi_dir', nargs='?', default='outputs/melodies')
+    parser.add_argument('--out', default='outputs/audio')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sample-rate', type=int, default=SAMPLE_RATE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rendered = render_directory(args.midi_dir, args.out, args.workers, args.sample_rate)
+    elapsed = time.perf_counter() - start
+
+    if not rendered:
+        print(f"No MIDI files found in {args.midi_dir}/")
+        return 1
+
+    audio_seconds = sum(seconds for _, seconds in rendered)
+    print(f"Rendered {len(rendered)} files ({audio_seconds:.1f}s of audio) to {args.out} "
+          f"in {elapsed:.2f}s, {audio_seconds / elapsed:.0f}x real time")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import numpy as np
+from collections import deque
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+class RhythmAutomaton:
+    # Aho-Corasick automaton over duration codes. transitions[state, code] is
+    # the full goto function with failure links folded in, so advancing by a
+    # note is one table lookup whatever the library size, and rewards[state]
+    # is the summed weight of every pattern that ends there. Every code gets
+    # a depth-one node, so any state past the root knows its last code.
+    ROOT = 0
+
+    def __init__(self, patterns: Dict[str, Sequence[int]], n_codes: int, weight: float = 2.0):
+        self.n_codes = n_codes
+        self.patterns = {name: tuple(int(c) for c in codes) for name, codes in patterns.items()}
+
+        children: List[Dict[int, int]] = [{}]
+        last_codes = [-1]
+        outputs: List[List[str]] = [[]]
+
+        def child(node: int, code: int) -> int:
+            if code not in children[node]:
+                children[node][code] = len(children)
+                children.append({})
+                last_codes.append(code)
+                outputs.append([])
+            return children[node][code]
+
+        for code in range(n_codes):
+            child(self.ROOT, code)
+        for name, codes in self.patterns.items():
+            if not codes:
+                raise ValueError(f"Rhythm pattern {name!r} is empty")
+            if min(codes) < 0 or max(codes) >= n_codes:
+                raise ValueError(f"Rhythm pattern {name!r} has codes outside 0..{n_codes - 1}")
+            node = self.ROOT
+            for code in codes:
+                node = child(node, code)
+            outputs[node].append(name)
+
+        n_states = len(children)
+        self.transitions = np.zeros((n_states, n_codes), dtype=np.int32)
+        self.fail = np.zeros(n_states, dtype=np.int32)
+        match_counts = np.array([len(names) for names in outputs], dtype=np.int64)
+
+        # Breadth-first, so a node's failure target is finished before it
+        queue = deque()
+        for code in range(n_codes):
+            node = children[self.ROOT][code]
+            self.transitions[self.ROOT, code] = node
+            queue.append(node)
+        while queue:
+            node = queue.popleft()
+            match_counts[node] += match_counts[self.fail[node]]
+            for code in range(n_codes):
+                target = children[node].get(code)
+                if target is None:
+                    self.transitions[node, code] = self.transitions[self.fail[node], code]
+                else:
+                    self.fail[target] = self.transitions[self.fail[node], code]
+                    self.transitions[node, code] = target
+                    queue.append(target)
+
+        self.last_codes = np.array(last_codes, dtype=np.int64)
+        self.match_counts = match_counts
+        self.rewards = weight * match_counts
+        self._outputs = outputs
+
+
+    def __len__(self) -> int:
+        return len(self.transitions)
+
+
+    def step(self, state: int, code: int) -> int:
+        return int(self.transitions[state, code])
+
+
+    def matches(self, state: int) -> List[str]:
+        # Names of every pattern ending at state, longest first
+        names = []
+        while state != self.ROOT:
+            names.extend(self._outputs[state])
+            state = int(self.fail[state])
+        return names
+
+
+    def find(self, codes: Sequence[int]) -> Iterator[Tuple[int, str]]:
+        # (index of the last code, pattern name) for each completion in codes
+        state = self.ROOT
+        for index, code in enumerate(codes):
+            state = self.step(state, code)
+            if self.match_counts[state]:
+                for name in self.matches(state):
+                    yield index, name
@@ -0,0 +1,113 @@
+import math
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class Schedule(ABC):
+    # Maps (episodes trained so far, current value) to the next value. Stateless,
+    # so a resumed run continues the same curve from the saved episode count.
+    name = 'schedule'
+
+    @abstractmethod
+    def __call__(self, episode: int, value: float) -> float:
+        pass
+
+
+    def config(self) -> Dict:
+        return {'name': self.name, **vars(self)}
+
+
+class Constant(Schedule):
+    name = 'constant'
+
+    def __call__(self, episode: int, value: float) -> float:
+        return value
+
+
+class RandomDecay(Schedule):
+    # The original epsilon decay: a random factor in [low, high) per episode.
+    # Each factor is drawn from (seed, episode) rather than the global random
+    # state, so a resumed run draws the same factors. Without a seed one is
+    # taken from the global random state and saved with the config.
+    name = 'random_decay'
+
+    def __init__(self, low: float = 0.995, high: float = 0.999, minimum: float = 0.01,
+                 seed: Optional[int] = None):
+        self.low = low
+        self.high = high
+        self.minimum = minimum
+        self.seed = seed if seed is not None else random.getrandbits(32)
+
+
+    def __call__(self, episode: int, value: float) -> float:
+        factor = random.Random((self.seed << 32) + episode).uniform(self.low, self.high)
+        return max(self.minimum, value * factor)
+
+
+class ExponentialDecay(Schedule):
+    name = 'exponential_decay'
+
+    def __init__(self, rate: float = 0.997, minimum: float = 0.01):
+        self.rate = rate
+        self.minimum = minimum
+
+
+    def __call__(self, episode: int, value: float) -> float:
+        return max(self.minimum, value * self.rate)
+
+
+class LinearDecay(Schedule):
+    # From start to end over n_episodes, then held at end
+    name = 'linear_decay'
+
+    def __init__(self, start: float, end: float, n_episodes: int):
+        self.start = start
+        self.end = end
+        self.n_episodes = n_episodes
+
+
+    def __call__(self, episode: int, value: float) -> float:
+        progress = min(episode / self.n_episodes, 1.0) if self.n_episodes else 1.0
+        return self.start + (self.end - self.start) * progress
+
+
+class InverseTimeDecay(Schedule):
+    # initial / (1 + rate * episode), a common learning-rate schedule
+    name = 'inverse_time_decay'
+
+    def __init__(self, initial: float, rate: float = 0.001, minimum: float = 0.0):
+        self.initial = initial
+        self.rate = rate
+        self.minimum = minimum
+
+
+    def __call__(self, episode: int, value: float) -> float:
+        return max(self.minimum, self.initial / (1 + self.rate * episode))
+
+
+class CosineDecay(Schedule):
+    # Half-cosine from start to end over n_episodes, then held at end
+    name = 'cosine_decay'
+
+    def __init__(self, start: float, end: float, n_episodes: int):
+        self.start = start
+        self.end = end
+        self.n_episodes = n_episodes
+
+
+    def __call__(self, episode: int, value: float) -> float:
+        progress = min(episode / self.n_episodes, 1.0) if self.n_episodes else 1.0
+        return self.end + (self.start - self.end) * 0.5 * (1 + math.cos(math.pi * progress))
+
+
+SCHEDULES = {
+    schedule.name: schedule
+    for schedule in (Constant, RandomDecay, ExponentialDecay, LinearDecay,
+                     InverseTimeDecay, CosineDecay)
+}
+
+
+def schedule_from_config(config: Dict) -> Schedule:
+    config = dict(config)
+    return SCHEDULES[config.pop('name')](**config)
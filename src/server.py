@@ -0,0 +1,446 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from .environment import MusicEnvironment, Note, Duration, pitch_to_midi
+from .agent import QLearningAgent
+from .cli import DEFAULT_CHECKPOINT, _make_env
+from .train import generate_melody_batch, melody_rng
+from .melody import Melody
+from .midi import encode_melody_midi
+from .utils import analyze_melody
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+Response = Tuple[int, str, bytes]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_notes(notes: List[str]) -> Melody:
+    # Notes as "C4_QUARTER", the str() of a Note
+    try:
+        parsed = [Note(pitch, Duration[duration])
+                  for pitch, duration in (note.rsplit('_', 1) for note in notes)]
+        for note in parsed:
+            # Melody stores MIDI numbers as uint8
+            if not 0 <= pitch_to_midi(note.pitch) <= 127:
+                raise ValueError(f"{note.pitch} is outside the MIDI range")
+        return Melody.from_notes(parsed)
+    except (KeyError, ValueError, AttributeError, TypeError) as e:
+        raise HTTPError(400, f"Invalid note: {e}")
+
+
+def int_field(body: Dict, name: str, default: Optional[int] = None, minimum: Optional[int] = None,
+              maximum: Optional[int] = None) -> Optional[int]:
+    # An integer request field: JSON integers, integral floats and numeric
+    # strings are accepted; anything else, or out of range, is a 400. A
+    # maximum needs a minimum.
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise HTTPError(400, f"{name} must be an integer")
+    try:
+        number = int(value)
+        if isinstance(value, float) and number != value:
+            raise ValueError
+    except (ValueError, OverflowError):
+        raise HTTPError(400, f"{name} must be an integer")
+    if maximum is not None and not minimum <= number <= maximum:
+        raise HTTPError(400, f"{name} must be between {minimum} and {maximum}")
+    if minimum is not None and number < minimum:
+        raise HTTPError(400, f"{name} must be at least {minimum}")
+    return number
+
+
+def analysis_to_json(analysis: Dict) -> Dict:
+    return {**analysis, 'duration_distribution': {
+        duration.name: count for duration, count in analysis['duration_distribution'].items()}}
+
+
+class LatencyTracker:
+    # Rolling window of request latencies per route
+    def __init__(self, window: int = 10000):
+        self.window = window
+        self.latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+
+    def record(self, route: str, seconds: float, ok: bool = True):
+        self.latencies[route].append(seconds)
+        self.counts[route] += 1
+        if not ok:
+            self.errors[route] += 1
+
+
+    def summary(self) -> Dict[str, Dict]:
+        summary = {}
+        for route, latencies in self.latencies.items():
+            ms = np.array(latencies) * 1e3
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            summary[route] = {
+                'requests': self.counts[route],
+                'errors': self.errors[route],
+                'p50_ms': float(p50),
+                'p90_ms': float(p90),
+                'p99_ms': float(p99),
+                'max_ms': float(ms.max())
+            }
+        return summary
+
+
+class GenerationBatcher:
+    # Coalesces concurrent generation requests: the first request opens a
+    # batch, which collects more for up to max_wait seconds or max_batch
+    # melodies and then runs as one generate_melody_batch call on a worker
+    # thread, so the event loop keeps accepting requests meanwhile. Each
+    # melody depends only on its (seed, index), not on its batch.
+    def __init__(self, env: MusicEnvironment, agent: QLearningAgent,
+                 max_batch: int = 64, max_wait: float = 0.005):
+        self.env = env
+        self.agent = agent
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batch_sizes: deque = deque(maxlen=10000)
+        self._task: Optional[asyncio.Task] = None
+
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+
+    async def generate(self, seed: int, index: int = 0) -> Melody:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((seed, index, future))
+        return await future
+
+
+    async def _collect(self) -> List:
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            self.batch_sizes.append(len(batch))
+
+            # A failure fails this batch's requests, never the loop itself
+            try:
+                rngs = [melody_rng(seed, index) for seed, index, _ in batch]
+                melodies = await loop.run_in_executor(
+                    self.executor, generate_melody_batch, self.env, self.agent, rngs)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, _, future), melody in zip(batch, melodies):
+                if not future.done():
+                    future.set_result(melody)
+
+
+    def stats(self) -> Dict:
+        sizes = np.array(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+        return {
+            'batches': len(self.batch_sizes),
+            'mean_batch_size': float(sizes.mean()),
+            'max_batch_size': int(sizes.max()),
+            'queued': self.queue.qsize() if self.queue is not None else 0
+        }
+
+
+class MelodyServer:
+    # Minimal HTTP/1.1 JSON API over a trained agent, loaded once:
+    #   GET  /health, GET /stats
+    #   POST /generate  {"seed", "count", "analyze"}  -> notes per melody
+    #   POST /analyze   {"notes"} or {"seed"}          -> analyze_melody
+    #   POST /midi      {"notes"} or {"seed"}, "tempo" -> audio/midi bytes
+    # Requests without a seed draw one from a server-side counter.
+    def __init__(self, env: MusicEnvironment, agent: QLearningAgent,
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 unix_socket: Optional[str] = None, max_batch: int = 64,
+                 max_wait_ms: float = 5.0, seed: int = 0, max_count: int = 256):
+        self.env = env
+        self.agent = agent
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.max_count = max_count
+
+        self.batcher = GenerationBatcher(env, agent, max_batch, max_wait_ms / 1e3)
+        self.latency = LatencyTracker()
+        self.started = time.time()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._seed = seed
+        self._next_index = 0
+
+        self.routes = {
+            ('GET', '/health'): self.handle_health,
+            ('GET', '/stats'): self.handle_stats,
+            ('POST', '/generate'): self.handle_generate,
+            ('POST', '/analyze'): self.handle_analyze,
+            ('POST', '/midi'): self.handle_midi
+        }
+
+
+    async def start(self):
+        self.batcher.start()
+        if self.unix_socket:
+            self.server = await asyncio.start_unix_server(self._serve_connection, path=self.unix_socket)
+        else:
+            self.server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.close()
+
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+
+    def _melody_key(self, body: Dict) -> Tuple[int, int]:
+        seed = int_field(body, 'seed', minimum=0)
+        if seed is not None:
+            return seed, 0
+        self._next_index += 1
+        return self._seed, self._next_index - 1
+
+
+    async def _melody(self, body: Dict) -> Melody:
+        if 'notes' in body:
+            return parse_notes(body['notes'])
+        return await self.batcher.generate(*self._melody_key(body))
+
+
+    async def handle_health(self, body: Dict) -> Response:
+        return self._json({'status': 'ok'})
+
+
+    async def handle_stats(self, body: Dict) -> Response:
+        stats = {
+            'uptime_s': time.time() - self.started,
+            'routes': self.latency.summary(),
+            'batching': self.batcher.stats()
+        }
+        q_stats = getattr(self.agent.q_table, 'stats', None)
+        if callable(q_stats):
+            stats['q_table'] = q_stats()
+        return self._json(stats)
+
+
+    async def handle_generate(self, body: Dict) -> Response:
+        count = int_field(body, 'count', 1, minimum=1, maximum=self.max_count)
+
+        # count > 1 returns melodies 0..count-1 of the seed, as generate_melodies
+        seed = int_field(body, 'seed', minimum=0)
+        if seed is not None:
+            keys = [(seed, index) for index in range(count)]
+        else:
+            keys = [self._melody_key(body) for _ in range(count)]
+        melodies = await asyncio.gather(*(self.batcher.generate(*key) for key in keys))
+
+        results = []
+        for (seed, index), melody in zip(keys, melodies):
+            result = {'seed': seed, 'index': index,
+                      'notes': [str(note) for note in melody],
+                      'total_beats': melody.total_beats}
+            if body.get('analyze'):
+                result['analysis'] = analysis_to_json(analyze_melody(melody))
+            results.append(result)
+
+        return self._json({'melodies': results})
+
+
+    async def handle_analyze(self, body: Dict) -> Response:
+        return self._json(analysis_to_json(analyze_melody(await self._melody(body))))
+
+
+    async def handle_midi(self, body: Dict) -> Response:
+        # The tempo's microseconds per beat must fit MIDI's three bytes
+        tempo = int_field(body, 'tempo', 120, minimum=4, maximum=60000000)
+        midi_seed = int_field(body, 'midi_seed', 0)
+        melody = await self._melody(body)
+        data = encode_melody_midi(melody, tempo=tempo, seed=midi_seed)
+        return 200, 'audio/midi', data
+
+
+    def _json(self, payload: Dict, status: int = 200) -> Response:
+        return status, 'application/json', json.dumps(payload).encode()
+
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, 'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Response:
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise HTTPError(405, f"{method} not allowed on {path}")
+            raise HTTPError(404, f"No route for {path}")
+
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, 'Request body must be a JSON object')
+
+        return await handler(payload)
+
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (HTTPError, ValueError) as e:
+                    status = e.status if isinstance(e, HTTPError) else 400
+                    await self._write(writer, *self._json({'error': str(e)}, status), keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                start = time.perf_counter()
+                try:
+                    response = await self._dispatch(method, path, body)
+                except HTTPError as e:
+                    response = self._json({'error': str(e)}, e.status)
+                except Exception as e:
+                    response = self._json({'error': f"{type(e).__name__}: {e}"}, 500)
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write(writer, *response, keep_alive=keep_alive)
+                # Unknown paths share one entry so stats stay bounded
+                route = f"{method} {path}" if (method, path) in self.routes else 'unmatched'
+                self.latency.record(route, time.perf_counter() - start, ok=response[0] == 200)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _write(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                     data: bytes, keep_alive: bool = True):
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Serve melody generation, analysis and MIDI over local HTTP')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--env', default=None, help='MusicEnvironment settings as JSON (env.config())')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', default=None, help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0, help='seed for requests that give none')
+    return parser
+
+
+def make_server(args) -> MelodyServer:
+    # The environment resolves as in the CLI: --env, then the checkpoint's
+    # env.json, then the defaults
+    env = _make_env(args)
+    agent = QLearningAgent.load(args.checkpoint)
+    return MelodyServer(env, agent, host=args.host, port=args.port, unix_socket=args.socket,
+                        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, seed=args.seed)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    server = make_server(args)
+
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Serving {args.checkpoint} on {where}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
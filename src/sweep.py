@@ -0,0 +1,159 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from .environment import MusicEnvironment
+from .agent import QLearningAgent
+from .train import train_agent
+
+# Values are lists to choose from; for random search a (low, high) tuple
+# samples uniformly instead (integers for integer bounds)
+DEFAULT_SPACE = {
+    'learning_rate': [0.05, 0.1, 0.2, 0.3],
+    'gamma': [0.9, 0.95, 0.99],
+    'epsilon_start': [0.1, 0.3, 0.5],
+    'n_episodes': [100]
+}
+
+
+def grid_configs(space: Dict) -> List[Dict]:
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_configs(space: Dict, n_configs: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    configs = []
+
+    for _ in range(n_configs):
+        config = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    config[key] = rng.randint(low, high)
+                else:
+                    config[key] = rng.uniform(low, high)
+            else:
+                config[key] = rng.choice(values)
+        configs.append(config)
+
+    return configs
+
+
+def run_config(config: Dict, seed: int) -> np.ndarray:
+    # Each run seeds both RNGs the agent draws from, so results do not depend
+    # on which worker picks the run up
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = MusicEnvironment()
+    agent = QLearningAgent(
+        n_actions=env.n_actions,
+        n_states=env.n_states,
+        learning_rate=config.get('learning_rate', 0.1),
+        gamma=config.get('gamma', 0.99),
+        epsilon_start=config.get('epsilon_start', 0.3)
+    )
+    rewards = train_agent(env, agent, n_episodes=config.get('n_episodes', 100),
+                          n_envs=config.get('n_envs', 1), verbose=False)
+
+    return np.asarray(rewards, dtype=np.float32)
+
+
+def score_rewards(rewards: np.ndarray, window: float = 0.1) -> float:
+    # Mean reward over the final fraction of episodes
+    tail = max(1, int(len(rewards) * window))
+    return float(np.mean(rewards[-tail:]))
+
+
+def run_sweep(configs: List[Dict], n_workers: Optional[int] = None, seed: int = 0,
+              output: Optional[str] = 'outputs/sweeps/sweep.npz') -> List[Dict]:
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(configs))]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        curves = list(executor.map(run_config, configs, seeds))
+
+    results = [
+        {'config': config, 'seed': run_seed, 'score': score_rewards(curve), 'rewards': curve}
+        for config, run_seed, curve in zip(configs, seeds, curves)
+    ]
+
+    if output:
+        save_sweep(results, output)
+
+    return results
+
+
+def save_sweep(results: List[Dict], filename: str):
+    # Curves are padded with NaN to the longest run
+    length = max(len(r['rewards']) for r in results)
+    rewards = np.full((len(results), length), np.nan, dtype=np.float32)
+    for i, result in enumerate(results):
+        rewards[i, :len(result['rewards'])] = result['rewards']
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    np.savez_compressed(
+        filename,
+        rewards=rewards,
+        scores=np.array([r['score'] for r in results]),
+        seeds=np.array([r['seed'] for r in results], dtype=np.uint64),
+        configs=json.dumps([r['config'] for r in results])
+    )
+
+
+def load_sweep(filename: str) -> List[Dict]:
+    data = np.load(filename)
+    configs = json.loads(str(data['configs']))
+
+    return [
+        {'config': config, 'seed': int(run_seed), 'score': float(score),
+         'rewards': curve[~np.isnan(curve)]}
+        for config, run_seed, score, curve in zip(configs, data['seeds'], data['scores'], data['rewards'])
+    ]
+
+
+def best_result(results: List[Dict]) -> Dict:
+    return max(results, key=lambda r: r['score'])
+
+
+def print_sweep_summary(results: List[Dict], top: int = 5):
+    ranked = sorted(results, key=lambda r: r['score'], reverse=True)
+
+    print(f"\nSweep results ({len(results)} runs):")
+    for result in ranked[:top]:
+        print(f"{result['score']:10.2f}  {result['config']}")
+
+    print(f"\nBest configuration: {ranked[0]['config']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for QLearningAgent')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--n-configs', type=int, default=20, help='runs for random search')
+    parser.add_argument('--episodes', type=int, nargs='+', help='episode counts to sweep')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='outputs/sweeps/sweep.npz')
+    args = parser.parse_args(argv)
+
+    space = dict(DEFAULT_SPACE)
+    if args.episodes:
+        space['n_episodes'] = args.episodes
+
+    if args.search == 'grid':
+        configs = grid_configs(space)
+    else:
+        configs = random_configs(space, args.n_configs, args.seed)
+
+    results = run_sweep(configs, n_workers=args.workers, seed=args.seed, output=args.output)
+    print_sweep_summary(results)
+    print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
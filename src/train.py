@@ -1,63 +1,409 @@
-from typing import List
+import numpy as np
+from time import perf_counter
+from typing import Iterator, List, Optional, Tuple
 from .environment import MusicEnvironment, Note, Duration
+from .melody import Melody
 from .agent import QLearningAgent
+from .vec_environment import VecMusicEnvironment
+from .callbacks import TrainingCallback
+
+# Below this many melodies generate_melody_batch runs sequentially
+MIN_VECTOR_BATCH = 8
+
+
+def _episode_metrics(episode: int, reward: float, epsilon: float, steps: int,
+                     episode_time: float, action_time: float, step_time: float,
+                     update_time: float) -> dict:
+    return {
+        'episode': episode,
+        'reward': float(reward),
+        'epsilon': epsilon,
+        'steps': steps,
+        'episode_time': episode_time,
+        'steps_per_sec': steps / episode_time if episode_time else 0.0,
+        'action_time': action_time,
+        'step_time': step_time,
+        'update_time': update_time
+    }
+
+
+def _check_trainable(agent: QLearningAgent):
+    if isinstance(agent.q_table, np.ndarray) and not agent.q_table.flags.writeable:
+        raise ValueError("Q-table is read-only; resume from QLearningAgent.load(path, mmap_mode=None)")
+
+
+def _should_stop(callbacks: Optional[List[TrainingCallback]]) -> bool:
+    return any(getattr(callback, 'stop_training', False) for callback in callbacks or ())
 
 
 def train_agent(env: MusicEnvironment, agent: QLearningAgent, 
-                n_episodes: int = 2000) -> List[float]:
+                n_episodes: int = 2000, n_envs: int = 1,
+                verbose: bool = True,
+                callbacks: Optional[List[TrainingCallback]] = None) -> List[float]:
+    # Runs up to n_episodes more episodes; a loaded agent continues from its
+    # episodes_trained and schedules. Callbacks may stop the run early.
+    if n_envs > 1:
+        return train_agent_batched(env, agent, n_episodes, n_envs, verbose, callbacks)
+    
+    _check_trainable(agent)
     episode_rewards = []
+    action = None
+    # Timing only runs when a callback asks for it
+    timed = any(getattr(callback, 'timed', True) for callback in callbacks or ())
+    
+    for callback in callbacks or ():
+        callback.on_train_begin(env, agent)
     
-    for episode in range(n_episodes):
+    for _ in range(n_episodes):
+        episode = agent.episodes_trained
         state = env.reset()
         total_reward = 0
         done = False
         
+        steps = 0
+        action_time = step_time = update_time = 0.0
+        if timed:
+            episode_start = perf_counter()
+        
         while not done:
             env_info = {
                 'current_beat': env.current_beat,
                 'current_measure': env.current_measure,
-                'is_valid_duration': lambda action: env._is_valid_duration(env.action_to_note[action].duration),
-                'current_duration': env.action_to_note[action].duration if 'action' in locals() else None,
+                'beats_per_measure': env.beats_per_measure,
+                'valid_actions': env.valid_actions(),
+                'current_duration': env.action_to_note[action].duration if action is not None else None,
                 'measure_complete': env._is_measure_complete()
             }
             
+            if timed:
+                t0 = perf_counter()
             action = agent.get_action(state, env_info)
+            if timed:
+                t1 = perf_counter()
             next_state, reward, done, _ = env.step(action)
+            if timed:
+                t2 = perf_counter()
             
             env_info['measure_complete'] = env._is_measure_complete()
             agent.update(state, action, reward, next_state, done, env_info)
             
+            if timed:
+                t3 = perf_counter()
+                action_time += t1 - t0
+                step_time += t2 - t1
+                update_time += t3 - t2
+            
+            steps += 1
             state = next_state
             total_reward += reward
         
         episode_rewards.append(total_reward)
-        agent.decay_epsilon()
+        agent.end_episode()
         
-        if (episode + 1) % 100 == 0:
+        if callbacks:
+            episode_time = perf_counter() - episode_start if timed else 0.0
+            metrics = _episode_metrics(episode, total_reward, agent.epsilon, steps,
+                                       episode_time, action_time, step_time, update_time)
+            for callback in callbacks:
+                callback.on_episode_end(episode, metrics)
+        
+        if verbose and (episode + 1) % 100 == 0:
             print(f"Episode {episode + 1}, Total Reward: {total_reward:.2f}, "
                   f"Epsilon: {agent.epsilon:.3f}")
+        
+        if _should_stop(callbacks):
+            break
+    
+    for callback in callbacks or ():
+        callback.on_train_end(episode_rewards)
     
     return episode_rewards
 
 
-def generate_melody(env: MusicEnvironment, agent: QLearningAgent) -> List[Note]:
+def train_agent_batched(env: MusicEnvironment, agent: QLearningAgent,
+                        n_episodes: int = 2000, n_envs: int = 64,
+                        verbose: bool = True,
+                        callbacks: Optional[List[TrainingCallback]] = None) -> List[float]:
+    _check_trainable(agent)
+    vec_env = VecMusicEnvironment(env, n_envs)
+    episode_rewards = []
+    timed = any(getattr(callback, 'timed', True) for callback in callbacks or ())
+    
+    for callback in callbacks or ():
+        callback.on_train_begin(env, agent)
+    
+    while len(episode_rewards) < n_episodes and not _should_stop(callbacks):
+        batch = min(n_envs, n_episodes - len(episode_rewards))
+        states = vec_env.reset(batch)
+        total_rewards = np.zeros(batch)
+        done = np.zeros(batch, dtype=bool)
+        
+        steps = np.zeros(batch, dtype=np.int64)
+        action_time = step_time = update_time = 0.0
+        if timed:
+            batch_start = perf_counter()
+        
+        while not done.all():
+            if timed:
+                t0 = perf_counter()
+            actions = agent.get_actions(states, vec_env.valid_action_mask())
+            if timed:
+                t1 = perf_counter()
+            next_states, rewards, done, info = vec_env.step(actions)
+            if timed:
+                t2 = perf_counter()
+            
+            active = info['active']
+            agent.update_batch(states[active], actions[active], rewards[active],
+                               next_states[active], done[active])
+            
+            if timed:
+                t3 = perf_counter()
+                action_time += t1 - t0
+                step_time += t2 - t1
+                update_time += t3 - t2
+            
+            if callbacks:
+                steps += active
+            states = next_states
+            total_rewards += rewards
+        
+        # Batch timings are shared evenly between the batch's episodes
+        batch_time = perf_counter() - batch_start if timed else 0.0
+        
+        # A stop requested mid-batch takes effect after the batch, whose
+        # episodes have all been learned from
+        for i, total_reward in enumerate(total_rewards):
+            episode = agent.episodes_trained
+            episode_rewards.append(float(total_reward))
+            agent.end_episode()
+            
+            if callbacks:
+                metrics = _episode_metrics(episode, total_reward, agent.epsilon,
+                                           int(steps[i]), batch_time / batch, action_time / batch,
+                                           step_time / batch, update_time / batch)
+                for callback in callbacks:
+                    callback.on_episode_end(episode, metrics)
+            
+            if verbose and (episode + 1) % 100 == 0:
+                print(f"Episode {episode + 1}, Total Reward: {total_reward:.2f}, "
+                      f"Epsilon: {agent.epsilon:.3f}")
+    
+    for callback in callbacks or ():
+        callback.on_train_end(episode_rewards)
+    
+    return episode_rewards
+
+
+def generate_melody(env: MusicEnvironment, agent: QLearningAgent,
+                    rng: Optional[np.random.Generator] = None) -> Melody:
+    if rng is not None:
+        previous_rng, agent.rng = agent.rng, rng
+        try:
+            return generate_melody(env, agent)
+        finally:
+            agent.rng = previous_rng
+    
     state = env.reset()
-    melody = []
+    actions = []
     done = False
+    action = None
     
     while not done:
         env_info = {
             'current_beat': env.current_beat,
             'current_measure': env.current_measure,
-            'is_valid_duration': lambda action: env._is_valid_duration(env.action_to_note[action].duration),
-            'current_duration': env.action_to_note[action].duration if 'action' in locals() else None,
+            'beats_per_measure': env.beats_per_measure,
+            'valid_actions': env.valid_actions(),
+            'current_duration': env.action_to_note[action].duration if action is not None else None,
             'measure_complete': env._is_measure_complete()
         }
         
         action = agent.get_action(state, env_info)
-        note = env.action_to_note[action]
-        melody.append(note)
+        actions.append(action)
         
         state, _, done, _ = env.step(action)
     
-    return melody
\ No newline at end of file
+    return Melody.from_actions(env, actions)
+
+
+def generate_melody_batch(env: MusicEnvironment, agent: QLearningAgent,
+                          rngs: List[np.random.Generator]) -> List[Melody]:
+    # One melody per generator, each equal to generate_melody(env, agent, rng);
+    # the episodes step together through VecMusicEnvironment and share the
+    # Q-table gather and greedy argmax. Vectorized steps carry a fixed NumPy
+    # overhead, so small batches run one by one.
+    if len(rngs) < MIN_VECTOR_BATCH:
+        return [generate_melody(env, agent, rng=rng) for rng in rngs]
+    
+    vec_env = VecMusicEnvironment(env, len(rngs))
+    states = vec_env.reset()
+    steps = []
+    
+    while not vec_env.done.all():
+        active = ~vec_env.done
+        masks = vec_env.valid_action_mask()
+        actions = np.where(masks, agent.q_table[states], -np.inf).argmax(axis=1)
+        measure_start = vec_env.current_beat % env.beats_per_measure == 0
+        
+        # Random draws follow get_action's order for each melody's generator
+        for i in np.flatnonzero(active):
+            rng = rngs[i]
+            if measure_start[i] and agent.good_patterns and rng.random() > agent.epsilon:
+                actions[i] = agent.good_patterns.sample(rng)[0][0]
+            elif rng.random() < agent.epsilon:
+                valid_actions = np.flatnonzero(masks[i])
+                actions[i] = rng.choice(valid_actions) if len(valid_actions) else 0
+        
+        steps.append((actions, active))
+        states, _, _, _ = vec_env.step(actions)
+    
+    return [Melody.from_actions(env, [step[i] for step, active in steps if active[i]])
+            for i in range(len(rngs))]
+
+
+def generate_melody_beam(env: MusicEnvironment, agent: QLearningAgent, beam_width: int = 16,
+                         k: int = 1) -> List[Tuple[Melody, float]]:
+    # Deterministic beam search over valid actions. A partial melody's score
+    # is its reward so far, plus the extension's immediate reward, plus the
+    # discounted best Q-value after it; finished melodies are ranked by their
+    # total reward. Returns the top k (melody, reward) pairs, best first.
+    vec_env = VecMusicEnvironment(env, 1)
+    vec_env.reset()
+    n_actions = env.n_actions
+    base = n_actions + 1
+    window_span = base ** (env.window_size - 1)
+    sixteenths = (env.action_beats * 4).astype(np.int64)
+    
+    returns = np.zeros(1)
+    paths = np.zeros((1, 0), dtype=np.int64)
+    finished: List[Tuple[float, np.ndarray]] = []
+    
+    while vec_env.n_envs:
+        states = vec_env.encode_states()
+        window_states = states // env.beat_positions if env.state_includes_beat else states
+        masks = vec_env.valid_action_mask()
+        extended = returns[:, None] + vec_env.action_rewards()
+        
+        # Each extension's next state, and its best valid action value
+        next_states = (window_states[:, None] % window_span) * base + np.arange(n_actions)[None, :]
+        next_positions = (vec_env._beat_positions()[:, None] + sixteenths[None, :]) % env.beat_positions
+        if env.state_includes_beat:
+            next_states = next_states * env.beat_positions + next_positions
+        next_q = np.where(env.valid_action_masks[next_positions],
+                          agent.q_table[next_states.ravel()].reshape(next_states.shape + (n_actions,)),
+                          -np.inf).max(axis=2)
+        done = vec_env.current_beat[:, None] + env.action_beats[None, :] >= env.total_beats
+        scores = np.where(masks, extended + np.where(done, 0.0, agent.gamma * next_q), -np.inf)
+        
+        for beam, action in zip(*np.nonzero(masks & done)):
+            finished.append((extended[beam, action], np.append(paths[beam], action)))
+        
+        # The best unfinished extensions form the next beam
+        scores[done] = -np.inf
+        flat = np.flatnonzero(np.isfinite(scores))
+        if len(flat) > beam_width:
+            flat = flat[np.argpartition(-scores.ravel()[flat], beam_width - 1)[:beam_width]]
+        beams, actions = np.divmod(flat, n_actions)
+        
+        vec_env.select(beams)
+        vec_env.step(actions)
+        returns = extended[beams, actions]
+        paths = np.column_stack([paths[beams], actions])
+    
+    finished.sort(key=lambda candidate: -candidate[0])
+    return [(Melody.from_actions(env, path.tolist()), float(total)) for total, path in finished[:k]]
+
+
+def _rollout_returns(vec_env: VecMusicEnvironment, agent: QLearningAgent, first_actions: np.ndarray,
+                     horizon: Optional[int], epsilon: float, rng: np.random.Generator,
+                     deadline: Optional[float] = None) -> Tuple[np.ndarray, bool]:
+    # Total reward of each episode in vec_env for first_actions and then up to
+    # horizon epsilon-greedy steps under the Q-table (to the end of the
+    # episode when None), plus the best valid Q-value where it is unfinished.
+    # Steps stop once perf_counter() passes deadline; the flag is False then.
+    states, returns, done, _ = vec_env.step(first_actions)
+    steps = 0
+    complete = True
+    while not done.all() and (horizon is None or steps < horizon):
+        if deadline is not None and perf_counter() >= deadline:
+            complete = False
+            break
+        masks = vec_env.valid_action_mask()
+        actions = np.where(masks, agent.q_table[states], -np.inf).argmax(axis=1)
+        if epsilon > 0:
+            explore = rng.random(vec_env.n_envs) < epsilon
+            actions = np.where(explore, np.where(masks, rng.random(masks.shape), -1.0).argmax(axis=1), actions)
+        states, rewards, done, _ = vec_env.step(actions)
+        returns += rewards
+        steps += 1
+    
+    next_q = np.where(vec_env.valid_action_mask(), agent.q_table[states], -np.inf).max(axis=1)
+    return returns + np.where(done, 0.0, next_q), complete
+
+
+def generate_melody_lookahead(env: MusicEnvironment, agent: QLearningAgent,
+                              rng: Optional[np.random.Generator] = None,
+                              budget_ms: Optional[float] = 5.0, n_candidates: int = 4,
+                              n_rollouts: int = 16, horizon: Optional[int] = 2,
+                              rollout_epsilon: float = 0.0) -> Melody:
+    # Monte-Carlo lookahead: at each note, the n_candidates valid actions with
+    # the best Q-values are scored by the mean return of rollouts under the
+    # Q-table, run side by side from env.snapshot(), and the best is played.
+    # Rollouts run for up to horizon steps or until budget_ms has passed for
+    # the note, then fall back to the Q-value, so a note takes at most
+    # budget_ms plus one vectorized step. The environment is deterministic,
+    # so greedy rollouts (rollout_epsilon=0) run once per candidate; exploring
+    # rollouts run n_rollouts times per candidate, repeating while the budget
+    # lasts. With neither budget nor horizon (None), greedy rollouts play to
+    # the end and the melody scores at least as well as the greedy policy's.
+    rng = rng if rng is not None else agent.rng
+    vec_env = VecMusicEnvironment(env, 1)
+    state = env.reset()
+    actions = []
+    done = False
+    
+    while not done:
+        q_row = np.where(env.valid_actions(), agent.q_table[state], -np.inf)
+        candidates = np.flatnonzero(np.isfinite(q_row))
+        if len(candidates) > n_candidates:
+            candidates = candidates[np.argsort(-q_row[candidates], kind='stable')[:n_candidates]]
+        
+        if len(candidates) == 1:
+            action = int(candidates[0])
+        else:
+            snapshot = env.snapshot()
+            deadline = perf_counter() + budget_ms / 1000 if budget_ms is not None else None
+            explore = rollout_epsilon > 0
+            first_actions = np.repeat(candidates, n_rollouts if explore else 1)
+            totals = np.zeros(len(candidates))
+            batches = 0
+            while True:
+                vec_env.load_snapshot(snapshot, len(first_actions))
+                returns, complete = _rollout_returns(vec_env, agent, first_actions, horizon,
+                                                     rollout_epsilon, rng, deadline)
+                # A later batch cut short by the deadline saw less far ahead
+                # than the first, so it is dropped
+                if complete or not batches:
+                    totals += returns.reshape(len(candidates), -1).sum(axis=1)
+                    batches += 1
+                if not (explore and complete and deadline is not None and perf_counter() < deadline):
+                    break
+            action = int(candidates[totals.argmax()])
+        
+        actions.append(action)
+        state, _, done, _ = env.step(action)
+    
+    return Melody.from_actions(env, actions)
+
+
+def melody_rng(seed: int, index: int) -> np.random.Generator:
+    # Independent stream per melody index, equal to SeedSequence(seed).spawn()[index]
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+
+
+def generate_melodies(env: MusicEnvironment, agent: QLearningAgent, n_melodies: int,
+                      seed: int = 0, start: int = 0) -> Iterator[Tuple[int, Melody]]:
+    # Streams (index, melody) pairs; melody i depends only on (seed, i)
+    for index in range(start, start + n_melodies):
+        yield index, generate_melody(env, agent, rng=melody_rng(seed, index))
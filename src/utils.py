@@ -1,97 +1,50 @@
-from midiutil import MIDIFile
-from mido import MidiTrack
-from typing import List
-from .environment import Note, Duration
-import random
-
-drum_to_midi = {
-    "kick": 36,
-    "snare": 38,  
-    "hihat_closed": 42, 
-    "hihat_open": 46    
-}
-
-drum_patt = {
-    "sync": [
-        ("kick", 0), ("hihat_closed", 0.5),
-        ("kick", 1), ("hihat_open", 1.25), ("snare", 1.75),
-        ("kick", 2), ("hihat_closed", 2.5), ("snare", 3.25)
-    ]
-}
-
-
-def duration_to_beats(duration: Duration) -> float:
-    return duration.value
-
-
-def add_crescendo_decrescendo(
-    midi: MIDIFile, 
-    track: int, 
-    pitch: int, 
-    start_time: float, 
-    duration: float, 
-    start_velocity: int, 
-    end_velocity: int
-):
-    num_steps = 8 
-    step_duration = duration / num_steps  
-    velocity_step = (end_velocity - start_velocity) / num_steps  
-
-    current_time = start_time
-    current_velocity = start_velocity
-
-    for i in range(num_steps):
-        midi.addNote(track, 0, pitch, current_time, step_duration, int(current_velocity))
-        current_time += step_duration
-        current_velocity += velocity_step
-
-
-def save_melody_as_midi(melody: List[Note], filename: str, tempo: int = 120):
-    midi = MIDIFile(2)
-    track = 0
-    time = 0
-    
-    midi.addTempo(track, time, tempo)
-    
-    
-    max_time = 0
-    for note in melody:
-        if note.pitch != 'START':
-            note_name = note.pitch[0]
-            octave = int(note.pitch[-1])
-            base_notes = {'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71}
-            pitch = base_notes[note_name] + (octave - 4) * 12
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from .environment import Note, Duration, pitch_to_midi
+from .melody import Melody
+from .midi import drum_to_midi, drum_patt, write_melody_midi
+from .analysis import melodies_to_arrays, arrays_to_analyses
+import os
+
+
+def save_melody_as_midi(melody: Union[Melody, List[Note]], filename, tempo: int = 120,
+                        seed: Optional[int] = None):
+    # filename may be a path or a binary file-like object; seed fixes the
+    # swell choices for whole notes, None uses the global RNG
+    write_melody_midi(melody, filename, tempo, seed)
+
+
+def melody_filename(out_dir: str, index: int, prefix: str = 'melody') -> str:
+    return os.path.join(out_dir, f"{prefix}_{index:06d}.mid")
+
+
+def export_melodies(melodies: Iterable[Tuple[int, Union[Melody, List[Note]]]], out_dir: str,
+                    tempo: int = 120, n_workers: Optional[int] = None, seed: int = 0,
+                    prefix: str = 'melody', max_pending: int = 256) -> Iterator[str]:
+    # Writes (index, melody) pairs across worker processes as they arrive and
+    # yields file paths in submission order. At most max_pending melodies are
+    # held in flight, so arbitrarily long generators stream through.
+    os.makedirs(out_dir, exist_ok=True)
+    
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for index, melody in melodies:
+            filename = melody_filename(out_dir, index, prefix)
+            pending.append((filename, executor.submit(
+                save_melody_as_midi, melody, filename, tempo, seed + index)))
             
-            duration = duration_to_beats(note.duration)
-            if duration >= 4:
-                if random.random() < 0.3:
-                    add_crescendo_decrescendo(midi, 0, pitch, time, duration, 60, 90)
-                    add_crescendo_decrescendo(midi, 0, pitch + 4, time, duration, 60, 90)
-                    add_crescendo_decrescendo(midi, 0, pitch + 7, time, duration, 60, 90)
-                else:
-                    add_crescendo_decrescendo(midi, 0, pitch, time, duration, 90, 30)
-                    add_crescendo_decrescendo(midi, 0, pitch + 4, time, duration, 90, 30)
-                    add_crescendo_decrescendo(midi, 0, pitch + 7, time, duration, 90, 30)
-            else:
-                vel = 50 if duration <= 1 else 100
-                midi.addNote(track, 0, pitch, time, duration, vel)
-                time += duration
-            max_time = time
-    
-    drum_pattern = drum_patt['sync']
-    t = max_time
-    for beat in range((int)(t)):
-        for drum, offset in drum_pattern:
-            drum_note = drum_to_midi[drum]
-            note_time = beat + offset
-            midi.addNote(1, 9, drum_note, note_time, 0.25, 25)
-    
-    
-    with open(filename, "wb") as output_file:
-        midi.writeFile(output_file)
-
-
-def format_melody_for_display(melody: List[Note]) -> str:
+            if len(pending) >= max_pending:
+                filename, future = pending.pop(0)
+                future.result()
+                yield filename
+        
+        for filename, future in pending:
+            future.result()
+            yield filename
+
+
+def format_melody_for_display(melody: Union[Melody, List[Note]],
+                              beats_per_measure: float = 4) -> str:
     formatted = []
     current_measure = []
     current_beats = 0
@@ -102,7 +55,7 @@ def format_melody_for_display(melody: List[Note]) -> str:
             current_measure.append(note_str)
             current_beats += note.duration.value
             
-            if current_beats >= 4:
+            if current_beats >= beats_per_measure:
                 formatted.append(" ".join(current_measure))
                 current_measure = []
                 current_beats = 0
@@ -113,7 +66,11 @@ def format_melody_for_display(melody: List[Note]) -> str:
     return "\n".join(formatted)
 
 
-def analyze_melody(melody: List[Note]) -> dict:
+def analyze_melody(melody: Union[Melody, List[Note]]) -> dict:
+    # Melody arrays go straight to the batch analysis
+    if isinstance(melody, Melody):
+        return arrays_to_analyses(*melodies_to_arrays([melody]))[0]
+    
     analysis = {
         'total_beats': 0,
         'note_count': 0,
@@ -135,10 +92,7 @@ def analyze_melody(melody: List[Note]) -> dict:
                 analysis['pitch_distribution'][note.pitch] = 0
             analysis['pitch_distribution'][note.pitch] += 1
             
-            note_name = note.pitch[0]
-            octave = int(note.pitch[-1])
-            base_notes = {'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71}
-            current_midi = base_notes[note_name] + (octave - 4) * 12
+            current_midi = pitch_to_midi(note.pitch)
             
             if prev_midi is not None:
                 interval = abs(current_midi - prev_midi)
@@ -169,7 +123,8 @@ def print_melody_analysis(analysis: dict):
     print(f"\nAverage interval size: {analysis['avg_interval']:.2f} semitones")
 
 
-def visualize_rhythm_pattern(melody: List[Note], measures_per_line: int = 4):
+def visualize_rhythm_pattern(melody: Union[Melody, List[Note]], measures_per_line: int = 4,
+                             beats_per_measure: float = 4):
     symbols = {
         Duration.WHOLE: 'w',
         Duration.HALF: 'h',
@@ -191,7 +146,7 @@ def visualize_rhythm_pattern(melody: List[Note], measures_per_line: int = 4):
             current_line.append(symbols[note.duration])
             current_beats += note.duration.value
             
-            if current_beats >= 4:
+            if current_beats >= beats_per_measure:
                 measure_count += 1
                 current_beats = 0
                 
@@ -0,0 +1,163 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+from .environment import MusicEnvironment, EnvironmentSnapshot
+
+
+# Steps N MusicEnvironment episodes side by side, scoring with the
+# environment's compiled reward tables. Rewards match
+# MusicEnvironment._calculate_reward exactly, including its bookkeeping (the
+# note that closes a measure seeds the next measure's history, and the
+# phrase-complete flag holds for the whole first measure of a phrase).
+# Finished episodes are frozen with zero reward until the next reset.
+class VecMusicEnvironment:
+    def __init__(self, env: MusicEnvironment, n_envs: int):
+        self.env = env
+        self.n_envs = n_envs
+        self.n_actions = env.n_actions
+        self.n_states = env.n_states
+        self.start_action = env.start_action
+        self.beats_per_measure = env.beats_per_measure
+        self.measures_per_phrase = env.measures_per_phrase
+        self.total_beats = env.total_beats
+
+        self.reset()
+
+
+    def reset(self, n_envs: Optional[int] = None) -> np.ndarray:
+        if n_envs is not None:
+            self.n_envs = n_envs
+        n = self.n_envs
+
+        self.current_beat = np.zeros(n)
+        self.current_measure = np.zeros(n, dtype=np.int64)
+        self.current_phrase = np.zeros(n, dtype=np.int64)
+        self.window = np.full((n, self.env.window_size), self.start_action, dtype=np.int64)
+        self.measure_history = np.full(n, self.env.empty_measure_history, dtype=np.int64)
+        self.phrase_history = np.full(n, self.env.empty_phrase_history, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+
+        return self.encode_states()
+
+
+    def load_snapshot(self, snapshot: EnvironmentSnapshot, n_envs: Optional[int] = None) -> np.ndarray:
+        # Starts every episode from one MusicEnvironment snapshot
+        if n_envs is not None:
+            self.n_envs = n_envs
+        n = self.n_envs
+
+        self.current_beat = np.full(n, snapshot.current_beat, dtype=float)
+        self.current_measure = np.full(n, snapshot.current_measure, dtype=np.int64)
+        self.current_phrase = np.full(n, snapshot.current_phrase, dtype=np.int64)
+        self.window = np.tile(np.array(snapshot.state_actions, dtype=np.int64), (n, 1))
+        self.measure_history = np.full(n, snapshot.measure_history, dtype=np.int64)
+        self.phrase_history = np.full(n, snapshot.phrase_history, dtype=np.int64)
+        self.done = self.current_beat >= self.total_beats
+
+        return self.encode_states()
+
+
+    def encode_states(self) -> np.ndarray:
+        base = self.n_actions + 1
+        index = np.zeros(self.n_envs, dtype=np.int64)
+        for i in range(self.window.shape[1]):
+            index = index * base + self.window[:, i]
+
+        if self.env.state_includes_beat:
+            index = index * self.env.beat_positions + self._beat_positions()
+
+        return index
+
+
+    def _beat_positions(self) -> np.ndarray:
+        return ((self.current_beat % self.beats_per_measure) * 4).astype(np.int64)
+
+
+    def valid_action_mask(self) -> np.ndarray:
+        return self.env.valid_action_masks[self._beat_positions()]
+
+
+    def _phrase_complete(self) -> np.ndarray:
+        return (self.current_measure % self.measures_per_phrase == 0) & (self.current_measure > 0)
+
+
+    def _calculate_rewards(self, actions: np.ndarray) -> np.ndarray:
+        env = self.env
+        reward = (env.timing_rewards[self._beat_positions(), actions]
+                  + env.measure_rewards[self.measure_history, env.action_duration[actions]]
+                  + env.melodic_rewards[self.window[:, -1], actions]
+                  + env.repeat_rewards[self.phrase_history, env.action_pitch[actions]])
+
+        reward += np.where(self._phrase_complete(), env.phrase_end_rewards[actions], 0.0)
+
+        final_measure = self.current_beat >= self.total_beats - self.beats_per_measure
+        reward += np.where(final_measure, env.cadence_rewards[actions], 0.0)
+
+        return reward
+
+
+    def action_rewards(self) -> np.ndarray:
+        # (n_envs, n_actions) reward of every action from each episode's
+        # current position, equal to _calculate_rewards for each column
+        env = self.env
+        reward = (env.timing_rewards[self._beat_positions()]
+                  + env.measure_rewards[self.measure_history][:, env.action_duration]
+                  + env.melodic_rewards[self.window[:, -1]]
+                  + env.repeat_rewards[self.phrase_history][:, env.action_pitch])
+
+        reward += np.where(self._phrase_complete()[:, None], env.phrase_end_rewards[None, :], 0.0)
+
+        final_measure = self.current_beat >= self.total_beats - self.beats_per_measure
+        reward += np.where(final_measure[:, None], env.cadence_rewards[None, :], 0.0)
+
+        return reward
+
+
+    def select(self, indices: np.ndarray):
+        # Keeps the episodes at indices, in that order; repeats copy an
+        # episode, so a search can branch from it
+        indices = np.asarray(indices, dtype=np.int64)
+        self.n_envs = len(indices)
+        self.current_beat = self.current_beat[indices]
+        self.current_measure = self.current_measure[indices]
+        self.current_phrase = self.current_phrase[indices]
+        self.window = self.window[indices]
+        self.measure_history = self.measure_history[indices]
+        self.phrase_history = self.phrase_history[indices]
+        self.done = self.done[indices]
+
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        actions = np.asarray(actions, dtype=np.int64)
+        active = ~self.done
+
+        reward = np.where(active, self._calculate_rewards(actions), 0.0)
+
+        env = self.env
+        self.current_beat = np.where(active, self.current_beat + env.action_beats[actions],
+                                     self.current_beat)
+        measure_complete = active & (self.current_beat % self.beats_per_measure == 0) & (self.current_beat > 0)
+        self.current_measure += measure_complete
+        self.measure_history[measure_complete] = env.empty_measure_history
+
+        phrase_complete = active & self._phrase_complete()
+        self.current_phrase += phrase_complete
+        self.phrase_history[phrase_complete] = env.empty_phrase_history
+
+        self.window[active] = np.column_stack([self.window[active, 1:], actions[active]])
+        self.measure_history = np.where(
+            active, env.rhythm_transitions[self.measure_history, env.action_duration[actions]],
+            self.measure_history)
+        self.phrase_history = np.where(
+            active,
+            (self.phrase_history % env.phrase_history_base) * env.phrase_history_base
+            + env.action_pitch[actions],
+            self.phrase_history)
+
+        self.done = self.current_beat >= self.total_beats
+
+        return self.encode_states(), reward, self.done.copy(), {
+            'current_beat': self.current_beat.copy(),
+            'current_measure': self.current_measure.copy(),
+            'measure_complete': measure_complete,
+            'active': active
+        }
@@ -0,0 +1,50 @@
+import os
+from src.cache import ArtifactCache, fingerprint
+
+
+def test_put_twice_counts_the_artifact_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=10_000)
+    key = fingerprint('melody', 0)
+    cache.put(key, 'npy', b'x' * 100)
+    cache.put(key, 'npy', b'x' * 100)
+    cache.put(key, 'npy', b'y' * 40)
+    assert cache._size == cache.size() == 40
+
+
+class CountingCache(ArtifactCache):
+    evictions = 0
+
+    def evict(self, max_bytes=None):
+        self.evictions += 1
+        return super().evict(max_bytes)
+
+
+def test_racing_writers_do_not_evict_early(tmp_path):
+    first = CountingCache(str(tmp_path), max_bytes=1000)
+    second = CountingCache(str(tmp_path), max_bytes=1000)
+    keys = [fingerprint('melody', i) for i in range(8)]
+    for key in keys:
+        # Both miss on the same key and both write it, first twice
+        first.put(key, 'npy', b'x' * 100)
+        second.put(key, 'npy', b'x' * 100)
+        first.put(key, 'npy', b'x' * 100)
+
+    # Each instance only counts its own writes, and never one twice
+    assert first.evictions == second.evictions == 0
+    assert first._size == first.size() == 800
+    assert second._size <= second.size()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+    keys = [fingerprint('melody', i) for i in range(10)]
+    for i, key in enumerate(keys):
+        cache.put(key, 'npy', b'x' * 100)
+        os.utime(cache._path(key, 'npy'), (i, i))
+    cache.get(keys[0], 'npy')
+
+    cache.put(fingerprint('melody', 10), 'npy', b'x' * 100)
+    assert cache.size() <= 900
+    assert cache.get(keys[0], 'npy') is not None
+    assert cache.get(keys[1], 'npy') is None
+    assert cache.stats()['hits'] == 2
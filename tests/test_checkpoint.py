@@ -0,0 +1,61 @@
+import random
+import numpy as np
+import pytest
+from src.agent import QLearningAgent
+from src.environment import MusicEnvironment
+from src.qtable import SparseQTable
+from src.schedules import CosineDecay, InverseTimeDecay
+from src.train import train_agent
+
+
+def trained_agent(**kwargs) -> QLearningAgent:
+    random.seed(0)
+    np.random.seed(0)
+    env = MusicEnvironment()
+    agent = QLearningAgent(env.n_actions, n_states=env.n_states,
+                           epsilon_schedule=CosineDecay(0.5, 0.05, 100),
+                           lr_schedule=InverseTimeDecay(0.2, rate=0.01), **kwargs)
+    train_agent(env, agent, n_episodes=30, verbose=False)
+    return agent
+
+
+def assert_same_agent(loaded: QLearningAgent, agent: QLearningAgent):
+    assert loaded.episodes_trained == agent.episodes_trained == 30
+    assert (loaded.epsilon, loaded.lr) == (agent.epsilon, agent.lr)
+    assert loaded.epsilon_schedule.config() == agent.epsilon_schedule.config()
+    assert loaded.lr_schedule.config() == agent.lr_schedule.config()
+    assert loaded.good_patterns.to_list() == agent.good_patterns.to_list()
+
+
+@pytest.mark.parametrize('mmap_mode', ['r', None])
+def test_dense_checkpoint_round_trip(tmp_path, mmap_mode):
+    agent = trained_agent(q_dtype=np.float32)
+    agent.save(str(tmp_path))
+    loaded = QLearningAgent.load(str(tmp_path), mmap_mode=mmap_mode)
+    assert_same_agent(loaded, agent)
+    assert loaded.q_table.dtype == np.float32
+    assert np.array_equal(loaded.q_table, agent.q_table)
+    assert loaded.q_table.flags.writeable == (mmap_mode is None)
+
+
+def test_sparse_checkpoint_round_trip(tmp_path):
+    agent = trained_agent(q_dtype=np.float16, max_q_table_bytes=2**20)
+    agent.save(str(tmp_path))
+    loaded = QLearningAgent.load(str(tmp_path))
+    assert_same_agent(loaded, agent)
+
+    assert isinstance(loaded.q_table, SparseQTable)
+    assert (loaded.q_table.dtype, loaded.q_table.max_bytes) == (np.float16, 2**20)
+    states, values = agent.q_table.items()
+    assert sorted(loaded.q_table.items()[0].tolist()) == sorted(states.tolist())
+    assert np.array_equal(loaded.q_table[states], values)
+
+
+def test_resumed_schedules_continue(tmp_path):
+    agent = trained_agent()
+    agent.save(str(tmp_path))
+    loaded = QLearningAgent.load(str(tmp_path), mmap_mode=None)
+    for _ in range(50):
+        agent.end_episode()
+        loaded.end_episode()
+    assert (loaded.epsilon, loaded.lr) == (agent.epsilon, agent.lr)
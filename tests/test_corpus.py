@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from src.agent import QLearningAgent
+from src.corpus import Corpus, load_corpus, midi_file_notes, quantize_notes, warm_start
+from src.environment import MusicEnvironment
+
+mido = pytest.importorskip('mido')
+
+TICKS = 480
+
+# (MIDI note, start beat, beats, channel): a C major line over two measures
+# with a chord (the top note is the melody), a slightly early onset, a
+# note crossing the barline and a drum hit that must be ignored
+LINE = [
+    (60, 0.0, 1.0, 0),    # C4 quarter
+    (64, 1.0, 0.5, 0),    # E4 eighth
+    (65, 1.5, 0.5, 0),    # F4 eighth
+    (67, 2.0, 2.0, 0),    # G4 half, above
+    (48, 2.0, 2.0, 1),    # a C3 accompaniment note
+    (62, 3.98, 3.0, 0),   # D4, quantized to beat 4 and held 3 beats
+    (71, 7.0, 1.0, 0),    # B4 quarter
+    (36, 0.0, 0.25, 9),   # kick drum
+]
+EXPECTED = [('C4', 'QUARTER'), ('E4', 'EIGHTH'), ('F4', 'EIGHTH'), ('G4', 'HALF'),
+            ('D4', 'HALF'), ('D4', 'QUARTER'), ('B4', 'QUARTER')]
+
+
+def write_midi(path, line, transpose: int = 0):
+    events = []
+    for note, start, beats, channel in line:
+        note += transpose if channel != 9 else 0
+        events.append((round(start * TICKS), 1, mido.Message('note_on', note=note, velocity=90, channel=channel)))
+        # A zero-velocity note_on closes the note, as many files do
+        events.append((round((start + beats) * TICKS), 0, mido.Message('note_on', note=note, velocity=0,
+                                                                        channel=channel)))
+    track = mido.MidiTrack()
+    tick = 0
+    for at, _, message in sorted(events, key=lambda event: event[:2]):
+        track.append(message.copy(time=at - tick))
+        tick = at
+    midi = mido.MidiFile(ticks_per_beat=TICKS)
+    midi.tracks.append(track)
+    midi.save(str(path))
+
+
+def actions_of(env: MusicEnvironment, notes):
+    return [env.note_to_action[f"{pitch}_{duration}"] for pitch, duration in notes]
+
+
+def test_midi_file_notes_skips_drums(tmp_path):
+    write_midi(tmp_path / 'line.mid', LINE)
+    pitch, start, duration = midi_file_notes(str(tmp_path / 'line.mid'))
+    order = np.lexsort((pitch, start))
+    melodic = sorted((start, note, beats) for note, start, beats, channel in LINE if channel != 9)
+    assert pitch[order].tolist() == [note for _, note, _ in melodic]
+    assert np.allclose(start[order], [start for start, _, _ in melodic], atol=1e-3)
+    assert np.allclose(duration[order], [beats for _, _, beats in melodic], atol=1e-3)
+
+
+@pytest.mark.parametrize('transpose', [0, 2, -12])
+def test_quantize_takes_the_skyline_in_the_environment_scale(tmp_path, transpose):
+    env = MusicEnvironment()
+    write_midi(tmp_path / 'line.mid', LINE, transpose)
+    [episode] = quantize_notes(env, *midi_file_notes(str(tmp_path / 'line.mid')))
+    # Shifted lines are moved back onto C major between C4 and C5
+    assert episode.tolist() == actions_of(env, EXPECTED)
+    assert env.action_beats[episode].sum() == 2 * env.beats_per_measure
+
+
+def test_quantize_cuts_full_episodes():
+    env = MusicEnvironment(measures_per_phrase=1, num_phrases=2)
+    # Five measures of quarter notes: two full episodes and a one-measure remainder
+    pitch = np.array([60, 62, 64, 65] * 5)
+    start = np.arange(20, dtype=np.float64)
+    episodes = quantize_notes(env, pitch, start, np.ones(20))
+    assert [len(episode) for episode in episodes] == [8, 8, 4]
+    for episode in episodes[:2]:
+        env.reset()
+        done = [env.step(action)[2] for action in episode.tolist()]
+        assert done == [False] * 7 + [True]
+
+
+def test_load_corpus_and_warm_start(tmp_path):
+    env = MusicEnvironment()
+    midi_dir = tmp_path / 'midi'
+    midi_dir.mkdir()
+    write_midi(midi_dir / 'a.mid', LINE)
+    write_midi(midi_dir / 'b.MID', LINE, transpose=2)
+    (midi_dir / 'broken.mid').write_bytes(b'not midi')
+
+    cache = str(tmp_path / 'corpus.npz')
+    corpus = load_corpus(str(midi_dir), env, cache=cache, n_workers=1)
+    assert len(corpus) == 2 and len(corpus.sources) == 3
+    assert [episode.tolist() for episode in corpus] == [actions_of(env, EXPECTED)] * 2
+    assert Corpus.load(cache).key == corpus.key
+
+    agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+    mean_reward = warm_start(env, agent, corpus)
+    assert mean_reward != 0.0
+    assert agent.q_table.any()
+    assert agent.episodes_trained == 0
@@ -0,0 +1,61 @@
+import itertools
+import numpy as np
+import pytest
+from src.agent import QLearningAgent
+from src.environment import MusicEnvironment
+
+SMALL = {'low': 'C4', 'high': 'E4'}
+
+
+@pytest.mark.parametrize('state_includes_beat', [False, True])
+def test_encode_state_is_unique_per_window(state_includes_beat):
+    env = MusicEnvironment(state_includes_beat=state_includes_beat, meter=(3, 4), **SMALL)
+    env.reset()
+    positions = range(env.beat_positions) if state_includes_beat else [0]
+    codes = set()
+    for window in itertools.product(range(env.n_actions + 1), repeat=env.window_size):
+        env.state_actions = window
+        for position in positions:
+            env.current_beat = position / 4
+            codes.add(env.encode_state())
+    assert len(codes) == env.n_states
+    assert min(codes) == 0 and max(codes) == env.n_states - 1
+
+
+def test_states_follow_the_action_window():
+    env = MusicEnvironment(**SMALL)
+    assert env.reset() == env.n_states - 1
+    rng = np.random.default_rng(0)
+    actions, done = [], False
+    while not done:
+        action = int(rng.choice(np.flatnonzero(env.valid_actions())))
+        actions.append(action)
+        state, _, done, _ = env.step(action)
+        # Same window, same state, whatever came before it
+        window = ([env.start_action] * env.window_size + actions)[-env.window_size:]
+        assert state == np.ravel_multi_index(window, (env.n_actions + 1,) * env.window_size)
+
+
+def test_q_table_rows_are_states():
+    env = MusicEnvironment(**SMALL)
+    agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+    assert agent.q_table.shape == (env.n_states, env.n_actions)
+
+    state = env.reset()
+    action = int(np.flatnonzero(env.valid_actions())[0])
+    env_info = {'current_duration': env.action_to_note[action].duration, 'measure_complete': False}
+    next_state, reward, done, _ = env.step(action)
+    agent.update(state, action, reward, next_state, done, env_info)
+    assert np.flatnonzero(agent.q_table.any(axis=1)).tolist() == [state]
+    assert agent.q_values(state)[action] == agent.q_table[state, action] == agent.lr * reward
+
+
+@pytest.mark.parametrize('meter', [(4, 4), (3, 4), (6, 8)])
+def test_valid_action_masks_fit_the_measure(meter):
+    env = MusicEnvironment(meter=meter, **SMALL)
+    env.reset()
+    for position in range(env.beat_positions):
+        env.current_beat = env.beats_per_measure * 2 + position / 4
+        expected = [position / 4 + env.action_to_note[action].duration.value <= env.beats_per_measure
+                    for action in range(env.n_actions)]
+        assert env.valid_actions().tolist() == expected
@@ -0,0 +1,58 @@
+import pickle
+import numpy as np
+from src.environment import MusicEnvironment, Note, Duration
+from src.melody import Melody
+
+
+def random_melody(seed: int) -> Melody:
+    env = MusicEnvironment()
+    rng = np.random.default_rng(seed)
+    env.reset()
+    actions, done = [], False
+    while not done:
+        action = int(rng.choice(np.flatnonzero(env.valid_actions())))
+        actions.append(action)
+        _, _, done, _ = env.step(action)
+    return Melody.from_actions(env, actions)
+
+
+def test_notes_round_trip():
+    melody = random_melody(0)
+    notes = melody.to_notes()
+    assert Melody.from_notes(notes) == melody == notes
+    assert list(melody) == notes
+    assert melody[3] == notes[3]
+    assert pickle.loads(pickle.dumps(melody)) == melody
+    assert melody.total_beats == sum(note.duration.value for note in notes) == MusicEnvironment().total_beats
+
+
+def test_slices_measure_their_own_span():
+    melody = random_melody(1)
+    notes = melody.to_notes()
+    for start, end in ((0, 5), (4, 9), (10, len(melody))):
+        part = melody[start:end]
+        assert part == notes[start:end]
+        assert part.total_beats == sum(note.duration.value for note in notes[start:end])
+        # Slices share memory and keep absolute onsets
+        assert np.shares_memory(part.pitches, melody.pitches)
+        assert part.onsets.tolist() == melody.onsets[start:end].tolist()
+
+
+def test_phrases_and_measures():
+    melody = random_melody(2)
+    phrases = list(melody.phrases(16))
+    assert len(phrases) == MusicEnvironment().num_phrases
+    assert [phrase.total_beats for phrase in phrases] == [16.0] * len(phrases)
+    assert sum(len(phrase) for phrase in phrases) == len(melody)
+    assert list(phrases[2].phrases(16))[2] == phrases[2]
+    assert phrases[2] == melody.phrase(2, 16)
+    assert all(melody.measure(index, 4).total_beats == 4.0 for index in range(16))
+    assert all(2 * 16 <= onset < 3 * 16 for onset in phrases[2].onsets)
+    assert melody[7:7].total_beats == 0.0
+
+
+def test_start_notes_are_dropped():
+    melody = Melody.from_notes([Note('START', Duration.QUARTER), Note('C4', Duration.HALF)])
+    assert melody.without_start() == [Note('C4', Duration.HALF)]
+    assert melody.without_start().total_beats == 2.0
+    assert Melody.from_notes([]).total_beats == 0.0
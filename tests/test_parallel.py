@@ -0,0 +1,44 @@
+import random
+import numpy as np
+from src.agent import QLearningAgent
+from src.callbacks import TrainingCallback
+from src.environment import MusicEnvironment
+from src.parallel import train_parallel
+from src.train import train_agent
+
+
+class Steps(TrainingCallback):
+    def __init__(self, timed: bool):
+        self.timed = timed
+        self.metrics = []
+
+    def on_episode_end(self, episode, metrics):
+        self.metrics.append(metrics)
+
+
+def test_untimed_callbacks_count_the_same_steps():
+    for n_envs in (1, 4):
+        runs = []
+        for timed in (True, False):
+            random.seed(0)
+            np.random.seed(0)
+            env = MusicEnvironment()
+            callback = Steps(timed)
+            train_agent(env, QLearningAgent(env.n_actions, n_states=env.n_states), n_episodes=8,
+                        n_envs=n_envs, verbose=False, callbacks=[callback])
+            runs.append(callback.metrics)
+        timed, untimed = runs
+        assert [m['steps'] for m in untimed] == [m['steps'] for m in timed]
+        assert all(m['episode_time'] == m['step_time'] == 0.0 for m in untimed)
+        assert all(m['episode_time'] > 0.0 for m in timed)
+
+
+def test_workers_follow_their_own_epsilon_curves():
+    env = MusicEnvironment()
+    agent = QLearningAgent(env.n_actions, n_states=env.n_states)
+    seed = agent.epsilon_schedule.seed
+    stats = train_parallel(env, agent, n_episodes=40, n_workers=2, seed=0)
+    assert len(set(stats['worker_epsilons'])) == 2
+    assert stats['steps'] > 40
+    # The caller's schedule is untouched, so a resumed run continues it
+    assert agent.epsilon_schedule.seed == seed
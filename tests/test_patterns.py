@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from src.agent import QLearningAgent
+from src.patterns import PatternStore
+
+
+class ArgminStore:
+    # Brute-force reference: evicts by a linear scan over every slot
+    def __init__(self, capacity: int, eviction: str):
+        self.capacity, self.eviction = capacity, eviction
+        self.patterns, self.rewards, self.last_used = [], [], []
+        self.clock = 0
+
+    def add(self, pattern, reward):
+        self.clock += 1
+        if pattern in self.patterns:
+            self.rewards[self.patterns.index(pattern)] += reward
+            return False
+        if len(self.patterns) >= self.capacity:
+            keys = self.rewards if self.eviction == 'reward' else self.last_used
+            slot = int(np.argmin(keys))
+            self.patterns[slot], self.rewards[slot], self.last_used[slot] = pattern, reward, self.clock
+        else:
+            self.patterns.append(pattern)
+            self.rewards.append(reward)
+            self.last_used.append(self.clock)
+        return True
+
+    def use(self, slot):
+        self.clock += 1
+        self.last_used[slot] = self.clock
+
+
+@pytest.mark.parametrize('eviction', ['reward', 'lru'])
+def test_eviction_matches_argmin(eviction):
+    rng = np.random.default_rng(0)
+    store, reference = PatternStore(capacity=16, eviction=eviction), ArgminStore(16, eviction)
+    for _ in range(3000):
+        if store and rng.random() < 0.3:
+            pattern = store.sample(rng)
+            reference.use(reference.patterns.index(pattern))
+        else:
+            # Few distinct patterns and integer rewards, so repeats and ties are common
+            pattern = ((int(rng.integers(40)), None),)
+            reward = float(rng.integers(1, 4))
+            assert store.add(pattern, reward) == reference.add(pattern, reward)
+        assert list(store) == reference.patterns
+        assert store.rewards().tolist() == reference.rewards
+
+
+@pytest.mark.parametrize('capacity', [0, -1])
+def test_capacity_must_hold_a_pattern(capacity):
+    with pytest.raises(ValueError):
+        PatternStore(capacity=capacity)
+    with pytest.raises(ValueError):
+        QLearningAgent(10, n_states=4, pattern_capacity=capacity)
+
+
+def test_sampling_is_uniform_unless_weighted():
+    rng = np.random.default_rng(1)
+    counts = {}
+    for weighted in (False, True):
+        store = PatternStore(weighted=weighted)
+        store.add(((0, None),), 1.0)
+        store.add(((1, None),), 9.0)
+        draws = [store.sample(rng)[0][0] for _ in range(4000)]
+        counts[weighted] = draws.count(1) / len(draws)
+    assert counts[False] == pytest.approx(0.5, abs=0.05)
+    assert counts[True] == pytest.approx(0.9, abs=0.05)
+
+
+def test_agent_saves_pattern_weighting(tmp_path):
+    for weighted in (False, True):
+        agent = QLearningAgent(10, n_states=4, pattern_weighted=weighted)
+        agent.good_patterns.add(((1, None),), 6.0)
+        agent.save(str(tmp_path / str(weighted)))
+        loaded = QLearningAgent.load(str(tmp_path / str(weighted)), mmap_mode=None)
+        assert loaded.good_patterns.weighted == weighted
+        assert loaded.good_patterns.to_list() == agent.good_patterns.to_list()
@@ -0,0 +1,54 @@
+import numpy as np
+from src.planning import PlanningAgent, TransitionModel, episodes_to_threshold
+
+
+def test_transition_model_keeps_means_and_predecessors():
+    model = TransitionModel(n_actions=3, initial_capacity=2)
+    first = model.observe(0, 1, 2.0, 5, False)
+    assert model.observe(0, 1, 4.0, 5, True) == first
+    assert model.expected_rewards(first) == 3.0
+    assert model.continue_probs(first) == 0.5
+
+    # A new next state moves the pair to that state's predecessors
+    model.observe(0, 1, 0.0, 6, False)
+    assert model.predecessors(5).tolist() == []
+    assert model.predecessors(6).tolist() == [first]
+
+    # Growing past the initial capacity keeps earlier transitions
+    others = [model.observe(state, 0, 1.0, 6, False) for state in range(1, 4)]
+    assert len(model) == 4 and model.states[others].tolist() == [1, 2, 3]
+    assert model.predecessors(6).tolist() == [first] + others
+
+
+def test_prioritized_queue_pops_largest_errors_first():
+    agent = PlanningAgent(3, n_states=8, theta=0.5)
+    model = agent.model
+    # With a zero Q-table each pair's TD error is its mean reward
+    slots = np.array([model.observe(state, 0, reward, 7, True)
+                      for state, reward in enumerate([1.0, 3.0, 0.1, 2.0])])
+    agent._push(slots)
+    # Below theta is never queued
+    assert slots[2] not in agent._queued_priority
+
+    # Raising a queued priority leaves a stale entry behind, which is skipped
+    model.observe(0, 0, 9.0, 7, True)
+    agent._push(slots[:1])
+    assert [agent._pop() for _ in range(4)] == [slots[0], slots[1], slots[3], None]
+
+
+def test_prioritized_sweeping_backs_up_predecessors():
+    agent = PlanningAgent(2, n_states=4, planning_steps=5, learning_rate=1.0, gamma=0.5)
+    model = agent.model
+    model.observe(0, 0, 0.0, 1, False)
+    agent.plan(model.observe(1, 1, 4.0, 2, True))
+    assert agent.q_table[1, 1] == 4.0
+    # The predecessor of state 1 sees the new value through the model
+    assert agent.q_table[0, 0] == 2.0
+    assert agent.planning_backups == 2
+
+
+def test_episodes_to_threshold():
+    rewards = [0.0] * 10 + [10.0] * 10
+    assert episodes_to_threshold(rewards, 5.0, window=4) == 12
+    assert episodes_to_threshold(rewards, 11.0, window=4) is None
+    assert episodes_to_threshold(rewards[:3], 0.0, window=4) is None
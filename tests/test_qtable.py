@@ -0,0 +1,85 @@
+import random
+import numpy as np
+import pytest
+from src.agent import QLearningAgent
+from src.cli import main as cli_main
+from src.environment import MusicEnvironment
+from src.qtable import ROW_OVERHEAD_BYTES, SparseQTable
+from src.train import train_agent
+
+
+def test_cli_trains_a_bounded_q_table(tmp_path):
+    checkpoint = str(tmp_path / 'agent')
+    cli_main(['train', '--episodes', '20', '--seed', '0', '--quiet', '--checkpoint', checkpoint,
+              '--env', '{"state_includes_beat": true}', '--q-dtype', 'float16',
+              '--max-q-table-mb', '1'])
+
+    agent = QLearningAgent.load(checkpoint)
+    assert isinstance(agent.q_table, SparseQTable)
+    assert agent.q_table.dtype == np.float16
+    assert agent.q_table.nbytes <= 2**20
+    assert len(agent.q_table) > 0
+
+
+def test_load_keeps_the_dense_dtype(tmp_path):
+    agent = QLearningAgent(10, n_states=8, q_dtype=np.float32)
+    agent.q_table[3, 4] = 1.5
+    agent.save(str(tmp_path / 'agent'))
+    loaded = QLearningAgent.load(str(tmp_path / 'agent'), mmap_mode=None)
+    assert loaded.q_table.dtype == np.float32
+    assert np.array_equal(loaded.q_table, agent.q_table)
+
+
+def train(max_q_table_bytes, n_envs: int):
+    random.seed(0)
+    np.random.seed(0)
+    env = MusicEnvironment()
+    agent = QLearningAgent(env.n_actions, n_states=env.n_states, q_dtype=np.float32,
+                           max_q_table_bytes=max_q_table_bytes)
+    return agent, train_agent(env, agent, n_episodes=30, n_envs=n_envs, verbose=False)
+
+
+@pytest.mark.parametrize('n_envs', [1, 8])
+def test_sparse_matches_dense_below_capacity(n_envs):
+    dense, dense_rewards = train(None, n_envs)
+    sparse, sparse_rewards = train(64 * 2**20, n_envs)
+    assert sparse_rewards == dense_rewards
+    assert sparse.q_table.evictions == 0
+
+    states, values = sparse.q_table.items()
+    visited = np.flatnonzero(dense.q_table.any(axis=1))
+    assert set(visited.tolist()) <= set(states.tolist())
+    assert np.array_equal(values, dense.q_table[states])
+
+
+def test_sparse_evicts_over_capacity():
+    n_actions = 4
+    row_bytes = n_actions * 4 + ROW_OVERHEAD_BYTES
+    table = SparseQTable(1000, n_actions, max_bytes=10 * row_bytes, dtype=np.float32)
+    assert table.capacity == 10
+
+    # Reading an unseen state is a miss that stores nothing
+    assert table[5].tolist() == [0.0] * n_actions
+    assert (len(table), table.misses, table.hits) == (0, 1, 0)
+
+    for state in range(10):
+        table[state] = state
+    assert table.evictions == 0
+    # Keep 0..4 popular so they survive the sampled least-frequently-used eviction
+    for _ in range(50):
+        table[np.arange(5)]
+    table.reset_stats()
+
+    for state in range(100, 120):
+        table[state, 1] = 1.0
+    stats = table.stats()
+    assert stats['states'] == 10 and stats['evictions'] == 20
+    assert stats['misses'] == 20 and stats['hits'] == 0
+    assert table.nbytes <= table.max_bytes
+    assert all(state in table for state in range(5))
+    assert table[np.arange(5)][:, 0].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert table.hits == 5 and table.hit_rate == 5 / 25
+
+    # Evicted states read as zeros again
+    evicted = [state for state in range(5, 10) if state not in table]
+    assert evicted and table[evicted].sum() == 0.0
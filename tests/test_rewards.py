@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from src.environment import MusicEnvironment
+from src.vec_environment import VecMusicEnvironment
+
+CONFIGS = [
+    {},
+    {'state_includes_beat': True},
+    {'scale': 'chromatic', 'low': 'C4', 'high': 'C5'},
+    {'meter': (3, 4), 'measures_per_phrase': 3},
+    {'meter': (6, 8), 'scale': 'minor_pentatonic', 'tonic': 'A', 'low': 'A3', 'high': 'A5'},
+    {'rhythm_patterns': {'dotted': ['EIGHTH', 'SIXTEENTH', 'SIXTEENTH'], 'run': ['SIXTEENTH'] * 4,
+                         'half': ['HALF']}},
+]
+
+
+def random_traces(env: MusicEnvironment, seed: int, n_traces: int = 12,
+                  invalid_rate: float = 0.2):
+    # Whole episodes of mostly valid actions; one in five is drawn from every
+    # action, so durations that overrun the measure are covered too
+    rng = np.random.default_rng(seed)
+    traces = []
+    for _ in range(n_traces):
+        env.reset()
+        actions, done = [], False
+        while not done:
+            if rng.random() < invalid_rate:
+                action = int(rng.integers(env.n_actions))
+            else:
+                action = int(rng.choice(np.flatnonzero(env.valid_actions())))
+            actions.append(action)
+            _, _, done, _ = env.step(action)
+        traces.append(actions)
+    return traces
+
+
+def play(env: MusicEnvironment, actions):
+    steps = [(env.reset(), 0.0, False)]
+    for action in actions:
+        state, reward, done, _ = env.step(action)
+        steps.append((state, reward, done))
+    return steps
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_compiled_rewards_match_reference(config):
+    compiled = MusicEnvironment(compiled_rewards=True, **config)
+    reference = MusicEnvironment(compiled_rewards=False, **config)
+
+    for actions in random_traces(reference, seed=len(str(config))):
+        assert play(compiled, actions) == play(reference, actions)
+        assert compiled.state_key() == reference.state_key()
+        assert compiled.current_measure == reference.current_measure
+        assert compiled.current_phrase == reference.current_phrase
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_vec_environment_matches_reference(config):
+    reference = MusicEnvironment(compiled_rewards=False, **config)
+    traces = random_traces(reference, seed=1 + len(str(config)))
+    expected = [play(reference, actions) for actions in traces]
+
+    vec_env = VecMusicEnvironment(MusicEnvironment(**config), len(traces))
+    states = vec_env.reset()
+    assert states.tolist() == [steps[0][0] for steps in expected]
+
+    for t in range(max(map(len, traces))):
+        actions = np.array([trace[t] if t < len(trace) else 0 for trace in traces])
+        states, rewards, dones, info = vec_env.step(actions)
+        for i, steps in enumerate(expected):
+            if t < len(traces[i]):
+                assert info['active'][i]
+                assert (states[i], rewards[i], dones[i]) == steps[t + 1]
+            else:
+                assert not info['active'][i] and rewards[i] == 0.0
+
+
+def test_snapshot_restore_replays_exactly():
+    env = MusicEnvironment(compiled_rewards=False)
+    actions = random_traces(env, seed=3, n_traces=1)[0]
+    expected = play(env, actions)
+
+    env.reset()
+    snapshots = []
+    for action in actions:
+        snapshots.append(env.snapshot())
+        env.step(action)
+
+    for start in (0, len(actions) // 3, len(actions) - 1):
+        assert env.restore(snapshots[start]) == expected[start][0]
+        assert play_from(env, actions[start:]) == expected[start + 1:]
+
+        vec_env = VecMusicEnvironment(env, 2)
+        vec_env.load_snapshot(snapshots[start])
+        for action, (state, reward, done) in zip(actions[start:], expected[start + 1:]):
+            states, rewards, dones, _ = vec_env.step(np.array([action, action]))
+            assert states.tolist() == [state] * 2 and rewards.tolist() == [reward] * 2
+
+
+def play_from(env: MusicEnvironment, actions):
+    return [env.step(action)[:3] for action in actions]
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_action_rewards_match_step_rewards(config):
+    env = MusicEnvironment(**config)
+    vec_env = VecMusicEnvironment(env, 1)
+    for actions in random_traces(env, seed=2, n_traces=3):
+        vec_env.reset()
+        for action in actions:
+            # Branch the episode once per action, then follow the trace
+            table = vec_env.action_rewards()
+            vec_env.select(np.zeros(env.n_actions, dtype=np.int64))
+            _, rewards, _, _ = vec_env.step(np.arange(env.n_actions))
+            assert rewards.tolist() == table[0].tolist()
+            vec_env.select(np.array([action]))
@@ -0,0 +1,50 @@
+import random
+import pytest
+from src.agent import QLearningAgent
+from src.schedules import SCHEDULES, Schedule, RandomDecay, schedule_from_config
+
+
+def test_schedule_is_abstract():
+    with pytest.raises(TypeError):
+        Schedule()
+
+
+def test_random_decay_resumes_the_same_curve(tmp_path):
+    continuous = QLearningAgent(10, n_states=4, epsilon_start=0.5)
+    for _ in range(300):
+        continuous.end_episode()
+
+    resumed = QLearningAgent(10, n_states=4, epsilon_start=0.5,
+                             epsilon_schedule=RandomDecay(seed=continuous.epsilon_schedule.seed))
+    for _ in range(120):
+        resumed.end_episode()
+    resumed.save(str(tmp_path / 'agent'))
+
+    # Draws from the global random state in between must not matter
+    random.seed(1234)
+    random.random()
+    resumed = QLearningAgent.load(str(tmp_path / 'agent'), mmap_mode=None)
+    for _ in range(180):
+        resumed.end_episode()
+
+    assert resumed.episodes_trained == continuous.episodes_trained
+    assert resumed.epsilon == continuous.epsilon
+
+
+def test_unseeded_random_decay_follows_the_global_seed():
+    random.seed(7)
+    first = RandomDecay()
+    random.seed(7)
+    assert RandomDecay().seed == first.seed
+    assert [first(episode, 1.0) for episode in range(5)] == [first(episode, 1.0) for episode in range(5)]
+
+
+@pytest.mark.parametrize('name', sorted(SCHEDULES))
+def test_config_round_trip(name):
+    arguments = {'linear_decay': (1.0, 0.1, 100), 'cosine_decay': (1.0, 0.1, 100),
+                 'inverse_time_decay': (0.5,)}.get(name, ())
+    schedule = SCHEDULES[name](*arguments)
+    rebuilt = schedule_from_config(schedule.config())
+    assert rebuilt.config() == schedule.config()
+    assert [rebuilt(episode, 0.5) for episode in range(0, 500, 50)] == \
+        [schedule(episode, 0.5) for episode in range(0, 500, 50)]
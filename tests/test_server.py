@@ -0,0 +1,96 @@
+import asyncio
+import json
+import pytest
+from src.environment import MusicEnvironment
+from src.agent import QLearningAgent
+from src.cli import main as cli_main
+from src.server import GenerationBatcher, MelodyServer, build_parser, make_server
+
+
+async def request(port: int, method: str, path: str, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response = await reader.read()
+    writer.close()
+    return status, response.split(b'\r\n\r\n', 1)[1]
+
+
+def serve(*requests, server=None):
+    async def run():
+        nonlocal server
+        if server is None:
+            env = MusicEnvironment()
+            server = MelodyServer(env, QLearningAgent(env.n_actions, n_states=env.n_states),
+                                  host='127.0.0.1', port=0, max_count=8)
+        await server.start()
+        try:
+            return [await asyncio.wait_for(request(server.port, *args), 30) for args in requests]
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/generate', {'count': 'three'}),
+    ('/generate', {'count': 2.5}),
+    ('/generate', {'count': [1]}),
+    ('/generate', {'count': True}),
+    ('/generate', {'count': 0}),
+    ('/generate', {'count': 9}),
+    ('/generate', {'seed': 'x'}),
+    ('/generate', {'seed': -1}),
+    ('/analyze', {'seed': {'a': 1}}),
+    ('/analyze', {'notes': 5}),
+    ('/analyze', {'notes': ['C99_QUARTER']}),
+    ('/analyze', {'notes': ['C-2_QUARTER']}),
+    ('/midi', {'seed': 1, 'tempo': 'fast'}),
+    ('/midi', {'seed': 1, 'tempo': 0}),
+    ('/midi', {'seed': 1, 'midi_seed': 1.5}),
+])
+def test_invalid_fields_are_client_errors(path, body):
+    [(status, response)] = serve(('POST', path, body))
+    assert status == 400
+    assert 'error' in json.loads(response)
+
+
+def test_failed_batch_does_not_stop_the_batcher():
+    async def run():
+        env = MusicEnvironment()
+        batcher = GenerationBatcher(env, QLearningAgent(env.n_actions, n_states=env.n_states))
+        batcher.start()
+        try:
+            with pytest.raises(ValueError):
+                await asyncio.wait_for(batcher.generate(-1), 30)
+            return await asyncio.wait_for(batcher.generate(1), 30)
+        finally:
+            await batcher.close()
+    assert len(asyncio.run(run())) > 0
+
+
+def test_valid_fields_are_accepted():
+    responses = serve(('POST', '/generate', {'count': '2', 'seed': 3.0}),
+                      ('POST', '/midi', {'seed': 3, 'tempo': 90, 'midi_seed': 4}))
+    (status, body), (midi_status, midi) = responses
+    assert status == 200 and len(json.loads(body)['melodies']) == 2
+    assert midi_status == 200 and midi.startswith(b'MThd')
+
+
+def test_checkpoint_environment_is_served(tmp_path):
+    config = {'scale': 'minor_pentatonic', 'tonic': 'A', 'low': 'A3', 'high': 'A5', 'meter': [3, 4]}
+    checkpoint = str(tmp_path / 'agent')
+    cli_main(['train', '--episodes', '5', '--seed', '0', '--quiet', '--checkpoint', checkpoint,
+              '--env', json.dumps(config)])
+
+    server = make_server(build_parser().parse_args(['--checkpoint', checkpoint, '--port', '0']))
+    assert server.env.config() == MusicEnvironment(**config).config()
+
+    [(status, body)] = serve(('POST', '/generate', {'count': 4, 'seed': 1}), server=server)
+    assert status == 200
+    scale = set(server.env.notes)
+    for melody in json.loads(body)['melodies']:
+        assert {note.rsplit('_', 1)[0] for note in melody['notes']} <= scale
+        assert melody['total_beats'] % 3 == 0